@@ -1,21 +1,56 @@
 import re
+from functools import lru_cache
+from typing import Iterable
 
-import pyarabic.araby as araby
+# Single-character normalizations, applied in one pass:
+# teh marbuta "ة" to heh "ه", and alef with hamza above "أ" or below "إ" to bare alef "ا"
+_TRANSLATION = str.maketrans({"ة": "ه", "أ": "ا", "إ": "ا"})
+# Final "ي" becomes "ى" at the end of words
+_FINAL_YEH = re.compile(r"ي\b")
+# Joins a batch into one string for a single regex pass; not a word character, so word ends are kept
+_SEPARATOR = "\x00"
+
+# Arabic-script blocks: Arabic, Arabic Supplement, Arabic Extended-A
+_ARABIC_RANGES = (("\u0600", "\u06FF"), ("\u0750", "\u077F"), ("\u08A0", "\u08FF"))
+# Share of the letters in Arabic script from which a text counts as Arabic; mixed queries often carry
+# Latin brand or model names, so a minority of Arabic letters is enough
+ARABIC_RATIO = 0.3
+# Distinct hot query strings memoized by `normalize_query` and `detect_language`
+QUERY_CACHE_SIZE = 4096
 
 
 def clean_arabic_text(text: str) -> str:
-    # Normalize the text (handling variations like "ه" and "ة", "ى" and "ي")
-    text = araby.normalize_teh(text)
-    # text = araby.normalize_alef(text)
-    # text = araby.normalize_hamza(text)
+    return _FINAL_YEH.sub("ى", text.translate(_TRANSLATION))
+
+
+def clean_texts(texts: Iterable[str]) -> list[str]:
+    """Normalize a batch of texts, e.g. an ingestion chunk, with one translate and one regex pass."""
+    texts = list(texts)
+    if any(_SEPARATOR in text for text in texts):
+        return [clean_arabic_text(text) for text in texts]
+    return clean_arabic_text(_SEPARATOR.join(texts)).split(_SEPARATOR) if texts else []
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def normalize_query(text: str) -> str:
+    """`clean_arabic_text` memoized for search queries, which repeat."""
+    return clean_arabic_text(text)
 
-    # Convert final "ي" to "ى" at the end of words
-    text = re.sub(r'ي\b', 'ى', text)
 
-    # Convert "أ" to "ا"
-    text = re.sub(r'أ', 'ا', text)
+def _is_arabic_letter(char: str) -> bool:
+    return any(low <= char <= high for low, high in _ARABIC_RANGES)
 
-    # Convert "إ" (Hamza above ا) to "ا"
-    text = re.sub(r'إ', 'ا', text)
 
-    return text
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def detect_language(text: str) -> str:
+    """
+    Detect whether a text is Arabic or English from the script of its letters.
+    :param text: The text, usually a search query or chat question.
+    :return: "ar" when at least `ARABIC_RATIO` of the letters are Arabic script, otherwise "en".
+    """
+    letters = arabic = 0
+    for char in text:
+        if char.isalpha():
+            letters += 1
+            arabic += _is_arabic_letter(char)
+    return "ar" if letters and arabic / letters >= ARABIC_RATIO else "en"
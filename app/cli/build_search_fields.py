@@ -0,0 +1,35 @@
+"""
+Store the normalized search fields on existing items and index them for full-text search.
+
+Usage:
+    python -m app.cli.build_search_fields --replace-text-index
+"""
+import argparse
+import asyncio
+import time
+
+from app.dependencies import close_container, get_container
+
+
+async def build(batch_size: int, replace_text_index: bool):
+    try:
+        service = get_container().item_service
+        started = time.perf_counter()
+        updated = await service.backfill_search_fields(batch_size=batch_size)
+        print(f"Search fields stored on {updated} items in {time.perf_counter() - started:.1f}s")
+        print(f"Text index: {await service.ensure_text_index(replace=replace_text_index)}")
+    finally:
+        await close_container()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the item search fields and their text index.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Items updated per bulk write.")
+    parser.add_argument("--replace-text-index", action="store_true",
+                        help="Drop an existing text index on other fields before creating the new one.")
+    args = parser.parse_args()
+    asyncio.run(build(args.batch_size, args.replace_text_index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Create the item vector collections of the configured layout with the configured HNSW, quantization and
+payload index settings.
+
+Usage:
+    python -m app.cli.create_collections
+"""
+import asyncio
+
+from app.database.vector_store import LANGUAGES
+from app.dependencies import close_container, get_container
+
+
+def main():
+    container = get_container()
+    vectordb = container.ingest_service.vectordb
+    layout = container.vector_layout
+    try:
+        for collection_name in layout.collections():
+            if vectordb.collection_exists(collection_name):
+                print(f"{collection_name}: already exists, skipped")
+                continue
+            vectordb.create_collection(collection_name=collection_name,
+                                       vector_names=LANGUAGES if layout.named else ())
+            print(f"{collection_name}: created")
+    finally:
+        asyncio.run(close_container())
+
+
+if __name__ == "__main__":
+    main()
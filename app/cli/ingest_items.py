@@ -0,0 +1,39 @@
+"""
+Bulk-load catalog items from a JSONL or CSV file.
+
+Usage:
+    python -m app.cli.ingest_items data/sample_products.jsonl --checkpoint .cache/items.checkpoint
+"""
+import argparse
+import asyncio
+import json
+
+from app.dependencies import close_container, get_container
+from app.services.ingest_service import CheckpointMismatch, read_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load catalog items into MongoDB and Qdrant.")
+    parser.add_argument("path", help="The JSONL or CSV file to load.")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="The input format (default: inferred from the file extension).")
+    parser.add_argument("--chunk-size", type=int, default=None, help="The number of items per batch.")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file used to resume an interrupted load.")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    service = get_container().ingest_service
+    if args.chunk_size:
+        service.chunk_size = args.chunk_size
+    try:
+        with open(args.path, "rb") as f:
+            report = service.ingest(read_records(f, fmt), checkpoint_path=args.checkpoint)
+    except CheckpointMismatch as e:
+        raise SystemExit(str(e))
+    finally:
+        asyncio.run(close_container())
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Backfill transactions from an NDJSON file or a file holding a JSON array.
+
+Usage:
+    python -m app.cli.ingest_transactions transactions.ndjson --chunk-size 5000
+"""
+import argparse
+import asyncio
+import json
+from typing import AsyncIterator
+
+from app.dependencies import close_container, get_container
+from app.services.transaction_service import read_json_records
+
+READ_SIZE = 1024 * 1024
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, READ_SIZE):
+            yield chunk
+
+
+async def run(args) -> dict:
+    fmt = args.format or ("json" if args.path.lower().endswith(".json") else "ndjson")
+    try:
+        container = get_container()
+        await container.co_purchase.ensure_indexes()
+        return await container.transaction_service.bulk_create(read_json_records(read_file(args.path), fmt),
+                                                               chunk_size=args.chunk_size)
+    finally:
+        await close_container()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load transactions into MongoDB and the co-purchase index.")
+    parser.add_argument("path", help="The NDJSON or JSON file to load.")
+    parser.add_argument("--format", choices=["ndjson", "json"], default=None,
+                        help="The input format (default: json for .json files, ndjson otherwise).")
+    parser.add_argument("--chunk-size", type=int, default=None, help="The number of transactions per write.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
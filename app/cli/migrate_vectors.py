@@ -0,0 +1,86 @@
+"""
+Copy the items_ar and items_en collections into one collection with an "ar" and an "en" named vector
+per item and point ids derived from the Mongo ids. Re-running the migration overwrites the same points.
+Switch to the new layout with VECTOR_LAYOUT="named" once it is done. Only the item ids are copied into the
+payloads; run `python -m app.cli.sync_vectors --catch-up` afterwards to add the filterable fields.
+
+Usage:
+    python -m app.cli.migrate_vectors --target items --batch-size 512
+"""
+import argparse
+import asyncio
+import time
+
+from app.database.vector_store import LANGUAGES, VectorStore, point_id_for
+from app.dependencies import close_container, get_container
+
+
+def migrate(vectordb: VectorStore, target: str, batch_size: int, size: int) -> dict[str, int]:
+    """
+    Copy the vectors of every language collection into the named vectors of `target`.
+    Points are read and written in batches, so memory stays bounded by `batch_size`.
+    The first collection is copied as whole points, with the vectors of the other languages read by
+    their deterministic point ids; a second pass only adds the vectors that lookup missed, i.e. points
+    written with random ids.
+    :return: The number of vectors copied per language.
+    """
+    if not vectordb.collection_exists(target):
+        vectordb.create_collection(collection_name=target, size=size, vector_names=LANGUAGES)
+    languages = [lang for lang in LANGUAGES if vectordb.collection_exists(f"items_{lang}")]
+    if not languages:
+        print("No items_* collection found, nothing to migrate")
+        return {}
+    first, *others = languages
+    copied = dict.fromkeys(languages, 0)
+
+    for mongo_ids, vectors in vectordb.scroll_vectors(f"items_{first}", batch_size=batch_size):
+        points = [{first: vector.tolist()} for vector in vectors]
+        for lang in others:
+            found = vectordb.get_vectors(mongo_ids, f"items_{lang}")
+            for mongo_id, point in zip(mongo_ids, points):
+                if mongo_id in found:
+                    point[lang] = found[mongo_id].tolist()
+                    copied[lang] += 1
+        vectordb.insert_vectors(vectors=points,
+                                payloads=[{"id": mongo_id} for mongo_id in mongo_ids],
+                                collection_name=target,
+                                point_ids=[point_id_for(mongo_id) for mongo_id in mongo_ids])
+        copied[first] += len(mongo_ids)
+
+    for lang in others:
+        for mongo_ids, vectors in vectordb.scroll_vectors(f"items_{lang}", batch_size=batch_size):
+            present = vectordb.get_vectors(mongo_ids, target, vector_name=lang)
+            missing = [(mongo_id, vector) for mongo_id, vector in zip(mongo_ids, vectors) if mongo_id not in present]
+            if not missing:
+                continue
+            # Only this language is written, so the vectors already copied are kept
+            vectordb.update_vectors(vectors=[{lang: vector.tolist()} for _, vector in missing],
+                                    payloads=[{"id": mongo_id} for mongo_id, _ in missing],
+                                    collection_name=target,
+                                    point_ids=[point_id_for(mongo_id) for mongo_id, _ in missing])
+            copied[lang] += len(missing)
+
+    for lang in languages:
+        print(f"items_{lang}: {copied[lang]} vectors copied into {target}")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the per-language vector collections to named vectors.")
+    parser.add_argument("--target", default=None, help="The new collection (default: VECTOR_COLLECTION).")
+    parser.add_argument("--batch-size", type=int, default=512, help="Points read and written per request.")
+    parser.add_argument("--size", type=int, default=384, help="The vector size, used to create the target.")
+    args = parser.parse_args()
+
+    container = get_container()
+    try:
+        started = time.perf_counter()
+        migrate(container.ingest_service.vectordb, args.target or container.config.VECTOR_COLLECTION,
+                args.batch_size, args.size)
+        print(f"Migrated in {time.perf_counter() - started:.1f}s")
+    finally:
+        asyncio.run(close_container())
+
+
+if __name__ == "__main__":
+    main()
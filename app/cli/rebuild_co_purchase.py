@@ -0,0 +1,23 @@
+"""
+Rebuild the co-purchase index from the whole transactions collection.
+
+Usage:
+    python -m app.cli.rebuild_co_purchase
+"""
+import asyncio
+import time
+
+from app.dependencies import close_container, get_container
+
+
+async def rebuild():
+    try:
+        started = time.perf_counter()
+        await get_container().co_purchase.rebuild()
+        print(f"Co-purchase index rebuilt in {time.perf_counter() - started:.1f}s")
+    finally:
+        await close_container()
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
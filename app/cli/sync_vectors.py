@@ -0,0 +1,37 @@
+"""
+Keep the item vectors in sync with the items collection, or re-embed every item whose text changed.
+
+Usage:
+    python -m app.cli.sync_vectors
+    python -m app.cli.sync_vectors --catch-up
+"""
+import argparse
+import asyncio
+import time
+
+from app.dependencies import close_container, get_container
+
+
+async def sync(catch_up: bool):
+    try:
+        worker = get_container().vector_sync
+        if not catch_up:
+            await worker.run()
+            return
+        started = time.perf_counter()
+        embedded = await worker.catch_up()
+        print(f"Re-embedded {embedded} items in {time.perf_counter() - started:.1f}s")
+    finally:
+        await close_container()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the item vectors with the items collection.")
+    parser.add_argument("--catch-up", action="store_true",
+                        help="Scan every item once instead of following the change stream.")
+    args = parser.parse_args()
+    asyncio.run(sync(args.catch_up))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from dotenv import load_dotenv
 from pydantic.v1 import BaseSettings
 
@@ -14,6 +16,107 @@ class Config(BaseSettings):
     TAVILYAPI_KEY: str
     OPEN_AI_API: str
 
+    # Connection pools and timeouts of the process-wide clients
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_TIMEOUT_MS: int = 5000
+    QDRANT_TIMEOUT: int = 10
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_TIMEOUT: float = 60.0
+
+    # Vector backend: "qdrant", or "numpy" for the in-process engine storing its files in VECTOR_ENGINE_DIR
+    VECTOR_BACKEND: str = "qdrant"
+    VECTOR_ENGINE_DIR: str = ".cache/vectors"
+    VECTOR_ENGINE_DTYPE: str = "float32"
+    # Vector layout: "split" keeps the items_ar and items_en collections, "named" stores every item as one
+    # point of VECTOR_COLLECTION with an "ar" and an "en" named vector
+    VECTOR_LAYOUT: str = "split"
+    VECTOR_COLLECTION: str = "items"
+    # Vector sync: tail the items change stream and re-embed changed items, in batches of at most
+    # VECTOR_SYNC_BATCH_SIZE items flushed at least every VECTOR_SYNC_FLUSH_INTERVAL seconds
+    VECTOR_SYNC_ENABLED: bool = False
+    VECTOR_SYNC_BATCH_SIZE: int = 256
+    VECTOR_SYNC_FLUSH_INTERVAL: float = 1.0
+
+    # Vector search: exact scan or HNSW, index build parameters, optional int8 quantization
+    # and payload indexes given as "field:type,field:type"
+    VECTOR_SEARCH_EXACT: bool = True
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCT: int = 100
+    VECTOR_HNSW_EF: int = 128
+    VECTOR_QUANTIZATION: Optional[str] = None
+    VECTOR_QUANTIZATION_RESCORE: bool = True
+    VECTOR_QUANTIZATION_OVERSAMPLING: float = 2.0
+    VECTOR_PAYLOAD_INDEXES: str = ""
+
+    # Hybrid search: RRF rank constant and candidates fetched per retriever, as a multiple of the limit
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATE_FACTOR: int = 2
+
+    # Catalog images: directory, public URL of an item's image, thumbnail widths and HTTP cache lifetime
+    IMAGE_DIR: str = "static"
+    IMAGE_URL_TEMPLATE: str = "/api/items/{item_id}/image"
+    IMAGE_THUMBNAIL_SIZES: str = ""
+    IMAGE_PREGENERATE_THUMBNAILS: bool = False
+    IMAGE_CACHE_MAX_AGE: int = 86400
+
+    # Half-life in days of a purchase in the co-purchase index; unset disables time decay
+    CO_PURCHASE_HALF_LIFE_DAYS: Optional[float] = None
+    # Build the co-purchase index from the transactions at startup when it is empty
+    CO_PURCHASE_BUILD_IF_EMPTY: bool = True
+
+    # Chat prompt: default prompt name (or legacy _id), reload interval and optional change stream invalidation
+    PROMPT_DEFAULT: str = "67c045cf1eb68369147527c0"
+    PROMPT_CACHE_TTL: float = 60.0
+    PROMPT_WATCH: bool = False
+
+    # Web search cache: seconds a result is fresh (0 disables), cached queries, and how many of the most
+    # co-purchased items are searched at startup (0 disables the pre-warm job)
+    WEB_SEARCH_CACHE_TTL: float = 86400.0
+    WEB_SEARCH_CACHE_SIZE: int = 1000
+    WEB_SEARCH_PREWARM_ITEMS: int = 0
+    WEB_SEARCH_PREWARM_CONCURRENCY: int = 4
+
+    # Semantic answer cache for /chat: reuse an answer for a question at least this similar with the same items
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_TTL: float = 3600.0
+    SEMANTIC_CACHE_SIZE: int = 1000
+
+    # Chat history: token budget of the history in the prompt, messages read when a conversation is loaded,
+    # and the per-process cache of conversation sessions (entries and seconds before a reload)
+    TOKENIZER_ENCODING: str = "o200k_base"
+    CHAT_HISTORY_TOKENS: int = 1500
+    CHAT_HISTORY_TURNS: int = 10
+    CONVERSATION_CACHE_SIZE: int = 1000
+    CONVERSATION_CACHE_TTL: float = 300.0
+
+    # Chat prompt context: token budget shared by the history, search results and web results, and the
+    # maximum tokens of one text field (e.g. an item description)
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_FIELD_TOKENS: int = 100
+
+    # Tracing: per-stage latency histograms on /metrics and an opt-in Server-Timing response header, which
+    # exposes the backend stages to clients. A sampled fraction of the requests slower than
+    # TRACE_SLOW_REQUEST_MS is logged with its stage breakdown
+    TRACE_ENABLED: bool = True
+    TRACE_SERVER_TIMING: bool = False
+    TRACE_SLOW_REQUEST_MS: float = 2000.0
+    TRACE_SLOW_SAMPLE_RATE: float = 0.0
+
+    # Embedding cache: in-memory LRU size and optional persistent SQLite store
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_PATH: Optional[str] = ".cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500000
+
+    # Number of items written, embedded and upserted together during bulk ingestion
+    INGEST_CHUNK_SIZE: int = 500
+    INGEST_CHECKPOINT_DIR: str = ".cache/checkpoints"
+
+    # Transactions written per insert_many by POST /transactions/bulk
+    TRANSACTIONS_BULK_CHUNK_SIZE: int = 1000
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,212 @@
+import threading
+
+import httpx
+
+from app.config import Config
+from app.core.context import ContextBuilder
+from app.core.embed import AsyncCohereClient, CohereClient
+from app.core.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+from app.core.images import ImageStore
+from app.core.llm import LLM
+from app.core.semantic_cache import SemanticCache
+from app.core.tokens import TokenCounter
+from app.core.web_search import WebSearch
+from app.database.local_vector_db import AsyncLocalVectorDBClient, LocalVectorDBClient
+from app.database.mongo import AsyncMongo, Mongo
+from app.database.qdrant import AsyncVectorDBClient, VectorDBClient, VectorIndexSettings
+from app.database.vector_engine import NumpyVectorEngine
+from app.database.vector_store import VectorLayout, VectorStore
+from app.services.conversation_service import ConversationService
+from app.services.ingest_service import IngestService
+from app.services.item_service import ItemService
+from app.services.llm_service import LLMService
+from app.services.prompt_registry import PromptRegistry
+from app.services.co_purchase_index import CoPurchaseIndex
+from app.services.similar import SimilarService
+from app.services.vector_sync import VectorSyncWorker
+from app.services.transaction_service import TransactionService
+
+
+def vector_index_settings(config: Config) -> VectorIndexSettings:
+    payload_indexes = {}
+    for entry in config.VECTOR_PAYLOAD_INDEXES.split(","):
+        if entry.strip():
+            field_name, field_schema = entry.split(":")
+            payload_indexes[field_name.strip()] = field_schema.strip()
+    return VectorIndexSettings(exact=config.VECTOR_SEARCH_EXACT,
+                               hnsw_m=config.VECTOR_HNSW_M,
+                               hnsw_ef_construct=config.VECTOR_HNSW_EF_CONSTRUCT,
+                               hnsw_ef=config.VECTOR_HNSW_EF,
+                               quantization=config.VECTOR_QUANTIZATION,
+                               quantization_rescore=config.VECTOR_QUANTIZATION_RESCORE,
+                               quantization_oversampling=config.VECTOR_QUANTIZATION_OVERSAMPLING,
+                               payload_indexes=payload_indexes)
+
+
+def vector_layout(config: Config) -> VectorLayout:
+    if config.VECTOR_LAYOUT == "named":
+        return VectorLayout(collection=config.VECTOR_COLLECTION)
+    if config.VECTOR_LAYOUT != "split":
+        raise ValueError(f"Unsupported vector layout: {config.VECTOR_LAYOUT}")
+    return VectorLayout()
+
+
+class Container:
+    def __init__(self, config: Config):
+        """
+        Build every client once per process and wire the services on top of them.
+        Each client owns a connection pool that is shared by all requests.
+        The request path uses the asyncio clients; bulk ingestion runs in worker
+        threads and uses the blocking ones, which are only created on first use.
+        :param config: The application settings.
+        """
+        self.config = config
+        self._lock = threading.Lock()
+        self._ingest_service = None
+        self._mongo_options = dict(maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                                   minPoolSize=config.MONGO_MIN_POOL_SIZE,
+                                   connectTimeoutMS=config.MONGO_TIMEOUT_MS,
+                                   serverSelectionTimeoutMS=config.MONGO_TIMEOUT_MS)
+        self.async_mongo = AsyncMongo(uri=config.MONGO_URI, db_name=config.MONGO_DB_NAME, **self._mongo_options)
+        self.vector_index_settings = vector_index_settings(config)
+        self.vector_layout = vector_layout(config)
+        self.vector_engine = None
+        if config.VECTOR_BACKEND == "numpy":
+            self.vector_engine = NumpyVectorEngine(directory=config.VECTOR_ENGINE_DIR,
+                                                   dtype=config.VECTOR_ENGINE_DTYPE)
+            self.async_vectordb = AsyncLocalVectorDBClient(self.vector_engine)
+        elif config.VECTOR_BACKEND == "qdrant":
+            self.async_vectordb = AsyncVectorDBClient(host=config.VECTOR_DB_URI,
+                                                      port=config.VECTOR_DB_PORT,
+                                                      timeout=config.QDRANT_TIMEOUT,
+                                                      index_settings=self.vector_index_settings)
+        else:
+            raise ValueError(f"Unsupported vector backend: {config.VECTOR_BACKEND}")
+
+        store = None
+        if config.EMBEDDING_CACHE_PATH:
+            store = SQLiteEmbeddingStore(path=config.EMBEDDING_CACHE_PATH,
+                                         max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES)
+        self.embedding_cache = EmbeddingCache(memory_size=config.EMBEDDING_CACHE_SIZE, store=store)
+
+        self._http_limits = httpx.Limits(max_connections=config.HTTP_MAX_CONNECTIONS,
+                                         max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS)
+        limits = self._http_limits
+        self.async_cohere = AsyncCohereClient(api_key=config.COHERE_API_KEY,
+                                              cache=self.embedding_cache,
+                                              httpx_client=httpx.AsyncClient(limits=limits,
+                                                                             timeout=config.HTTP_TIMEOUT))
+        self.llm = LLM(api_key=config.OPEN_AI_API,
+                       http_client=httpx.AsyncClient(limits=limits, timeout=config.HTTP_TIMEOUT),
+                       timeout=config.HTTP_TIMEOUT)
+        self.web_search = WebSearch(api_key=config.TAVILYAPI_KEY,
+                                    ttl=config.WEB_SEARCH_CACHE_TTL,
+                                    max_entries=config.WEB_SEARCH_CACHE_SIZE)
+
+        thumbnail_sizes = [int(size) for size in config.IMAGE_THUMBNAIL_SIZES.split(",") if size.strip()]
+        self.images = ImageStore(directory=config.IMAGE_DIR, thumbnail_sizes=thumbnail_sizes)
+
+        self.item_service = ItemService(mongo=self.async_mongo, cohere=self.async_cohere,
+                                        vectordb=self.async_vectordb, images=self.images,
+                                        image_url_template=config.IMAGE_URL_TEMPLATE,
+                                        layout=self.vector_layout)
+        self.co_purchase = CoPurchaseIndex(mongo=self.async_mongo,
+                                           half_life_days=config.CO_PURCHASE_HALF_LIFE_DAYS)
+        self.transaction_service = TransactionService(mongo=self.async_mongo, co_purchase=self.co_purchase,
+                                                      chunk_size=config.TRANSACTIONS_BULK_CHUNK_SIZE)
+        self.similar_service = SimilarService(mongo=self.async_mongo,
+                                              cohere=self.async_cohere,
+                                              vectordb=self.async_vectordb,
+                                              web_search_service=self.web_search,
+                                              item_service=self.item_service,
+                                              co_purchase=self.co_purchase,
+                                              rrf_k=config.HYBRID_RRF_K,
+                                              candidate_factor=config.HYBRID_CANDIDATE_FACTOR,
+                                              layout=self.vector_layout)
+        self.vector_sync = VectorSyncWorker(mongo=self.async_mongo, cohere=self.async_cohere,
+                                            vectordb=self.async_vectordb, layout=self.vector_layout,
+                                            batch_size=config.VECTOR_SYNC_BATCH_SIZE,
+                                            flush_interval=config.VECTOR_SYNC_FLUSH_INTERVAL)
+        self.prompts = PromptRegistry(mongo=self.async_mongo, default_name=config.PROMPT_DEFAULT,
+                                      ttl=config.PROMPT_CACHE_TTL)
+        self.semantic_cache = None
+        if config.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                                                ttl=config.SEMANTIC_CACHE_TTL,
+                                                max_entries=config.SEMANTIC_CACHE_SIZE)
+        self.tokens = TokenCounter(config.TOKENIZER_ENCODING)
+        self.conversations = ConversationService(self.async_mongo,
+                                                 tokens=self.tokens,
+                                                 token_budget=config.CHAT_HISTORY_TOKENS,
+                                                 history_limit=config.CHAT_HISTORY_TURNS,
+                                                 max_sessions=config.CONVERSATION_CACHE_SIZE,
+                                                 ttl=config.CONVERSATION_CACHE_TTL)
+        self.context = ContextBuilder(self.tokens, budget=config.CONTEXT_TOKEN_BUDGET,
+                                      field_tokens=config.CONTEXT_FIELD_TOKENS)
+        self.llm_service = LLMService(llm=self.llm,
+                                      search_service=self.similar_service,
+                                      web_search_service=self.web_search,
+                                      item_service=self.item_service,
+                                      prompts=self.prompts,
+                                      conversations=self.conversations,
+                                      context=self.context,
+                                      semantic_cache=self.semantic_cache)
+
+    def cache_stats(self) -> dict[str, dict]:
+        """Hit and miss counters of every cache, for the metrics page."""
+        embedding = self.embedding_cache.stats()
+        web_search = self.web_search.stats()
+        caches = {
+            "embedding_memory": embedding["memory"],
+            # Stale hits are answered from the cache too
+            "web_search": {"hits": web_search["hits"] + web_search["stale_hits"], "misses": web_search["misses"],
+                           "size": web_search["size"]},
+        }
+        if "store" in embedding:
+            caches["embedding_store"] = embedding["store"]
+        if self.semantic_cache is not None:
+            semantic = self.semantic_cache.stats()
+            caches["semantic_answer"] = {"hits": semantic["hits"], "misses": semantic["misses"],
+                                         "size": sum(semantic["partitions"].values())}
+        return caches
+
+    @property
+    def ingest_service(self) -> IngestService:
+        """The ingestion service and its blocking clients, created on first use."""
+        if self._ingest_service is None:
+            with self._lock:
+                if self._ingest_service is None:
+                    config = self.config
+                    mongo = Mongo(uri=config.MONGO_URI, db_name=config.MONGO_DB_NAME, **self._mongo_options)
+                    vectordb = self._sync_vectordb()
+                    cohere = CohereClient(api_key=config.COHERE_API_KEY,
+                                          cache=self.embedding_cache,
+                                          httpx_client=httpx.Client(limits=self._http_limits,
+                                                                    timeout=config.HTTP_TIMEOUT))
+                    self._ingest_service = IngestService(mongo=mongo,
+                                                         cohere=cohere,
+                                                         vectordb=vectordb,
+                                                         chunk_size=config.INGEST_CHUNK_SIZE,
+                                                         layout=self.vector_layout)
+        return self._ingest_service
+
+    def _sync_vectordb(self) -> VectorStore:
+        if self.vector_engine is not None:
+            return LocalVectorDBClient(self.vector_engine)
+        return VectorDBClient(host=self.config.VECTOR_DB_URI,
+                              port=self.config.VECTOR_DB_PORT,
+                              timeout=self.config.QDRANT_TIMEOUT,
+                              index_settings=self.vector_index_settings)
+
+    async def close(self):
+        """Close every client and release its connections."""
+        await self.llm.close()
+        await self.async_cohere.close()
+        await self.async_vectordb.close()
+        await self.async_mongo.close()
+        if self._ingest_service is not None:
+            self._ingest_service.cohere.close()
+            self._ingest_service.vectordb.close()
+            self._ingest_service.mongo.close()
+        if self.embedding_cache.store is not None:
+            self.embedding_cache.store.close()
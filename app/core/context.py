@@ -0,0 +1,117 @@
+from typing import Iterable, Optional
+
+from app.core.tokens import TokenCounter
+
+# Item columns in the prompt, per language; the id lets the model answer with an item_id
+ITEM_COLUMNS = {
+    "ar": (("id", "id"), ("name", "name_ar"), ("description", "description_ar"), ("color", "color_ar"),
+           ("material", "material"), ("price", "price")),
+    "en": (("id", "id"), ("name", "name_en"), ("description", "description_en"), ("color", "color_en"),
+           ("material", "material"), ("price", "price")),
+}
+WEB_COLUMNS = (("title", "title"), ("url", "url"), ("content", "content"))
+# Written for a section with no rows, so the prompt still says it was searched
+EMPTY = "(none)"
+
+
+class Section:
+    def __init__(self, name: str, header: Optional[str], rows: list[str], newest_first: bool = False):
+        """
+        Rows of one prompt section, most important first.
+        :param name: The prompt placeholder the section fills.
+        :param header: A column header line, written before the rows.
+        :param rows: The rendered rows, in priority order.
+        :param newest_first: Whether the rows are written back in reverse, e.g. chat turns oldest first.
+        """
+        self.name = name
+        self.header = header
+        self.rows = rows
+        self.newest_first = newest_first
+
+    def render(self, count: int) -> str:
+        rows = self.rows[:count]
+        if self.newest_first:
+            rows.reverse()
+        if not rows:
+            return EMPTY
+        return "\n".join([self.header, *rows] if self.header else rows)
+
+
+class ContextBuilder:
+    def __init__(self, tokens: TokenCounter, budget: int = 3000, field_tokens: int = 100):
+        """
+        Compact, token-budgeted prompt context.
+        Items are deduplicated by id across the sections and written as one table row each, with
+        only the columns of the question language; long text fields are cut to `field_tokens`.
+        Sections take turns adding their next most important row until `budget` is spent, so
+        every section keeps its best rows and the budget is never exceeded.
+        :param tokens: The token counter.
+        :param budget: The maximum number of tokens of all the sections together.
+        :param field_tokens: The maximum number of tokens of a single text field.
+        """
+        self.tokens = tokens
+        self.budget = budget
+        self.field_tokens = field_tokens
+
+    def build(self, lang: str, results: list[dict], related: list[dict], web_results: list[dict],
+              history: Iterable[str] = ()) -> dict[str, str]:
+        """
+        Render the context sections of a chat prompt.
+        :param lang: The question language, "ar" or "en".
+        :param results: The full-text search results, best first.
+        :param related: The similar items, best first.
+        :param web_results: The web search results, best first.
+        :param history: The chat history lines, oldest first.
+        :return: The rendered sections by prompt placeholder.
+        """
+        columns = ITEM_COLUMNS[lang]
+        seen: set[str] = set()
+        sections = [
+            self._table("full_text_search_result", columns, self._dedup(results, seen)),
+            Section("chat_history", None, list(reversed(list(history))), newest_first=True),
+            self._table("similar_items", columns, self._dedup(related, seen)),
+            self._table("web_search_result", WEB_COLUMNS, web_results),
+        ]
+        counts = self._fit(sections)
+        return {section.name: section.render(count) for section, count in zip(sections, counts)}
+
+    @staticmethod
+    def _dedup(items: list[dict], seen: set[str]) -> list[dict]:
+        unique = []
+        for item in items:
+            item_id = str(item["id"])
+            if item_id not in seen:
+                seen.add(item_id)
+                unique.append(item)
+        return unique
+
+    def _table(self, name: str, columns: tuple, rows: list[dict]) -> Section:
+        header = " | ".join(column for column, _ in columns)
+        return Section(name, header, [" | ".join(self._cell(row.get(key)) for _, key in columns) for row in rows])
+
+    def _cell(self, value) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, float):
+            return f"{value:.2f}".rstrip("0").rstrip(".")
+        text = " ".join(str(value).replace("|", "/").split())
+        return self.tokens.truncate(text, self.field_tokens)
+
+    def _fit(self, sections: list[Section]) -> list[int]:
+        # Round-robin over the sections by row rank; a section stops at its first row that does not fit
+        remaining = self.budget - sum(self.tokens.count(section.header) + 1
+                                      for section in sections if section.header and section.rows)
+        counts = [0] * len(sections)
+        open_sections = [i for i, section in enumerate(sections) if section.rows]
+        while open_sections and remaining > 0:
+            for i in list(open_sections):
+                section = sections[i]
+                cost = self.tokens.count(section.rows[counts[i]]) + 1
+                if cost > remaining:
+                    open_sections.remove(i)
+                    continue
+                remaining -= cost
+                counts[i] += 1
+                if counts[i] == len(section.rows):
+                    open_sections.remove(i)
+        return counts
@@ -1,15 +1,80 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import cohere
+import httpx
+import numpy as np
+
+from app.core.embedding_cache import EmbeddingCache, make_key
+from app.core.tracing import span
+
+# Maximum number of texts the Cohere embed endpoint accepts per request
+MAX_BATCH_SIZE = 96
+
+
+class _BaseCohereClient:
+    def __init__(self, batch_size: int, max_concurrency: int, cache: Optional[EmbeddingCache]):
+        self.cache = cache
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_concurrency = max(1, max_concurrency)
+
+    def _chunks(self, texts: list[str]) -> list[list[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _lookup(self, texts: list[str], model: str, input_type: str) -> tuple[list[str], dict, dict]:
+        """
+        Split the texts into cached vectors and texts that still have to be embedded.
+        Each missing text appears once, even if it is repeated in the input.
+        """
+        keys = [make_key(model, input_type, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        return keys, vectors, self._missing(keys, texts, vectors)
+
+    @staticmethod
+    def _missing(keys: list[str], texts: list[str], vectors: dict) -> dict:
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        return missing
+
+    def _store(self, vectors: dict, missing: dict, embedded: list[list[float]]):
+        new_vectors = dict(zip(missing.keys(), embedded))
+        self.cache.put_many(new_vectors)
+        vectors.update(new_vectors)
 
+    @staticmethod
+    def _result(keys: list[str], vectors: dict) -> list[list[float]]:
+        # Cached vectors are float32 arrays; callers get lists like the embed endpoint returns
+        return [vector.tolist() if isinstance(vector, np.ndarray) else vector for vector in map(vectors.get, keys)]
 
-class CohereClient:
-    def __init__(self, api_key: str):
+    @staticmethod
+    def _parse(embed, texts: list[str]) -> list[list[float]]:
+        vectors = embed.embeddings.model_dump()['float_']
+        if len(vectors) != len(texts):
+            raise ValueError(f"Failed to embed text: expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+
+class CohereClient(_BaseCohereClient):
+    def __init__(self, api_key: str, batch_size: int = MAX_BATCH_SIZE, max_concurrency: int = 4,
+                 cache: Optional[EmbeddingCache] = None, httpx_client: Optional[httpx.Client] = None):
         """
         Initialize the Cohere client with the provided API key.
         :param api_key: The API key to use for authentication.
+        :param batch_size: The maximum number of texts sent in a single embed request.
+        :param max_concurrency: The maximum number of embed requests in flight at once.
+        :param cache: Optional cache consulted before calling the embed endpoint.
+        :param httpx_client: Optional pooled HTTP client shared by all requests.
         """
-        self.client = cohere.Client(api_key=api_key)
-
+        super().__init__(batch_size, max_concurrency, cache)
+        self.httpx_client = httpx_client
+        self.client = cohere.Client(api_key=api_key, httpx_client=httpx_client)
 
+    def close(self):
+        if self.httpx_client is not None:
+            self.httpx_client.close()
 
     def embed_text(self, texts, model, input_type, embedding_types) -> list:
         """
@@ -22,16 +87,164 @@ class CohereClient:
         :param embedding_types: The types of embeddings to return.
         :return: The embeddings for the input texts.
         """
+        return self.embed_texts(texts=texts[:1],
+                                model=model,
+                                input_type=input_type,
+                                embedding_types=embedding_types)[0]
+
+    def embed_texts(self, texts: list[str], model: str, input_type: str,
+                    embedding_types: list[str]) -> list[list[float]]:
+        """
+        Embed many texts, returning one vector per input text in the same order.
+        Texts already in the cache are served from it. The remaining texts are split
+        into chunks of at most `batch_size` and the chunks are sent concurrently,
+        with at most `max_concurrency` requests in flight.
+        :param texts: The list of texts to embed.
+        :param model: The model to use for embedding.
+        :param input_type: The input type for the texts.
+        :param embedding_types: The types of embeddings to return.
+        :return: A list of embeddings, one per input text.
+        """
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._embed_batched(texts, model, input_type, embedding_types)
+
+        keys, vectors, missing = self._lookup(texts, model, input_type)
+        if missing:
+            embedded = self._embed_batched(list(missing.values()), model, input_type, embedding_types)
+            self._store(vectors, missing, embedded)
+        return self._result(keys, vectors)
+
+    def _embed_batched(self, texts: list[str], model: str, input_type: str,
+                       embedding_types: list[str]) -> list[list[float]]:
+        chunks = self._chunks(texts)
+        if len(chunks) == 1:
+            return self._embed_chunk(chunks[0], model, input_type, embedding_types)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks))) as executor:
+            results = executor.map(
+                lambda chunk: self._embed_chunk(chunk, model, input_type, embedding_types),
+                chunks
+            )
+            vectors = []
+            for chunk_vectors in results:
+                vectors.extend(chunk_vectors)
+        return vectors
+
+    def _embed_chunk(self, texts: list[str], model: str, input_type: str,
+                     embedding_types: list[str]) -> list[list[float]]:
         try:
             # Embed the provided texts
-            embed = self.client.embed(
-                texts=texts,
-                model=model,
-                input_type=input_type,
-                embedding_types=embedding_types,
-            )
-            vector = embed.embeddings.model_dump()['float_'][0]
-            # Return the vector
-            return vector
+            with span("cohere.embed", service="cohere"):
+                embed = self.client.embed(
+                    texts=texts,
+                    model=model,
+                    input_type=input_type,
+                    embedding_types=embedding_types,
+                )
+        except Exception as e:
+            raise ValueError(f"Failed to embed text: {e}")
+        return self._parse(embed, texts)
+
+
+class AsyncCohereClient(_BaseCohereClient):
+    def __init__(self, api_key: str, batch_size: int = MAX_BATCH_SIZE, max_concurrency: int = 4,
+                 cache: Optional[EmbeddingCache] = None, httpx_client: Optional[httpx.AsyncClient] = None):
+        """
+        Asyncio counterpart of `CohereClient`, used on the request path.
+        :param api_key: The API key to use for authentication.
+        :param batch_size: The maximum number of texts sent in a single embed request.
+        :param max_concurrency: The maximum number of embed requests in flight at once.
+        :param cache: Optional cache consulted before calling the embed endpoint.
+        :param httpx_client: Optional pooled HTTP client shared by all requests.
+        """
+        super().__init__(batch_size, max_concurrency, cache)
+        self.httpx_client = httpx_client
+        self.client = cohere.AsyncClient(api_key=api_key, httpx_client=httpx_client)
+
+    async def close(self):
+        if self.httpx_client is not None:
+            await self.httpx_client.aclose()
+
+    async def embed_text(self, texts, model, input_type, embedding_types) -> list:
+        """
+        Embed the first text of the list and return its vector.
+        :param texts: The list of texts to embed.
+        :param model: The model to use for embedding.
+        :param input_type: The input type for the texts.
+        :param embedding_types: The types of embeddings to return.
+        :return: The embedding of the first text.
+        """
+        vectors = await self.embed_texts(texts=texts[:1],
+                                         model=model,
+                                         input_type=input_type,
+                                         embedding_types=embedding_types)
+        return vectors[0]
+
+    async def embed_texts(self, texts: list[str], model: str, input_type: str,
+                          embedding_types: list[str]) -> list[list[float]]:
+        """
+        Embed many texts, returning one vector per input text in the same order.
+        Behaves like `CohereClient.embed_texts`, with chunks sent as concurrent tasks.
+        :param texts: The list of texts to embed.
+        :param model: The model to use for embedding.
+        :param input_type: The input type for the texts.
+        :param embedding_types: The types of embeddings to return.
+        :return: A list of embeddings, one per input text.
+        """
+        if not texts:
+            return []
+        if self.cache is None:
+            return await self._embed_batched(texts, model, input_type, embedding_types)
+
+        keys, vectors, missing = await self._lookup_async(texts, model, input_type)
+        if missing:
+            embedded = await self._embed_batched(list(missing.values()), model, input_type, embedding_types)
+            await self._store_async(vectors, missing, embedded)
+        return self._result(keys, vectors)
+
+    async def _lookup_async(self, texts: list[str], model: str, input_type: str) -> tuple[list[str], dict, dict]:
+        """`_lookup` with the persistent store read in a worker thread, off the event loop."""
+        keys = [make_key(model, input_type, text) for text in texts]
+        vectors, missing_keys = self.cache.get_memory(keys)
+        if missing_keys and self.cache.store is not None:
+            vectors.update(await asyncio.to_thread(self.cache.get_stored, missing_keys))
+        return keys, vectors, self._missing(keys, texts, vectors)
+
+    async def _store_async(self, vectors: dict, missing: dict, embedded: list[list[float]]):
+        new_vectors = dict(zip(missing.keys(), embedded))
+        self.cache.put_memory(new_vectors)
+        if self.cache.store is not None:
+            await asyncio.to_thread(self.cache.store.put_many, new_vectors)
+        vectors.update(new_vectors)
+
+    async def _embed_batched(self, texts: list[str], model: str, input_type: str,
+                             embedding_types: list[str]) -> list[list[float]]:
+        chunks = self._chunks(texts)
+        if len(chunks) == 1:
+            return await self._embed_chunk(chunks[0], model, input_type, embedding_types)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_bounded(chunk: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await self._embed_chunk(chunk, model, input_type, embedding_types)
+
+        results = await asyncio.gather(*(embed_bounded(chunk) for chunk in chunks))
+        return [vector for chunk_vectors in results for vector in chunk_vectors]
+
+    async def _embed_chunk(self, texts: list[str], model: str, input_type: str,
+                           embedding_types: list[str]) -> list[list[float]]:
+        try:
+            # Embed the provided texts
+            with span("cohere.embed", service="cohere"):
+                embed = await self.client.embed(
+                    texts=texts,
+                    model=model,
+                    input_type=input_type,
+                    embedding_types=embedding_types,
+                )
         except Exception as e:
             raise ValueError(f"Failed to embed text: {e}")
+        return self._parse(embed, texts)
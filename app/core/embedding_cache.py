@@ -0,0 +1,225 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share one cache entry."""
+    return " ".join(text.split())
+
+
+def make_key(model: str, input_type: str, text: str) -> str:
+    """Build the cache key for a (model, input_type, normalized text) triple."""
+    raw = f"{model}\x1f{input_type}\x1f{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        """
+        Bounded in-process cache that evicts the least recently used entry.
+        :param max_size: The maximum number of entries to keep.
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: np.ndarray):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteEmbeddingStore:
+    # Run the eviction check once every this many writes instead of on each one
+    EVICTION_INTERVAL = 256
+    # Seconds between two writes of the buffered access times when nothing is stored meanwhile
+    ACCESS_FLUSH_INTERVAL = 60.0
+
+    def __init__(self, path: str, max_entries: int):
+        """
+        Persistent embedding store backed by a SQLite file.
+        The database runs in WAL mode so several worker processes can share one file.
+        Vectors are stored as float32 blobs and the least recently used rows are
+        evicted once the store grows past `max_entries`. Reads only buffer their access
+        times, which are written with the next `put_many` or at most every
+        `ACCESS_FLUSH_INTERVAL` seconds, so the read path rarely takes the write lock.
+        :param path: The path of the SQLite database file.
+        :param max_entries: The maximum number of rows to keep.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._accessed: dict[str, float] = {}
+        self._accessed_flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)")
+        self.conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            now = time.time()
+            for key, _ in rows:
+                self._accessed[key] = now
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+            if self._accessed and time.monotonic() - self._accessed_flushed_at > self.ACCESS_FLUSH_INTERVAL:
+                self._flush_accessed()
+                self.conn.commit()
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def _flush_accessed(self):
+        # Called with the lock held; the caller commits
+        if self._accessed:
+            self.conn.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                                  [(accessed_at, key) for key, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+        self._accessed_flushed_at = time.monotonic()
+
+    def put_many(self, items: dict[str, list]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, accessed_at) VALUES (?, ?, ?)",
+                                  rows)
+            self._flush_accessed()
+            self.conn.commit()
+            self._writes += len(rows)
+            if self._writes >= self.EVICTION_INTERVAL:
+                self._writes = 0
+                self._evict()
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)", (overflow,)
+            )
+            self.conn.commit()
+            self.evictions += overflow
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self.conn.commit()
+            self.conn.close()
+
+
+class EmbeddingCache:
+    def __init__(self, memory_size: int = 10000, store: Optional[SQLiteEmbeddingStore] = None):
+        """
+        Two-tier embedding cache: a bounded in-memory LRU in front of an optional persistent store.
+        Vectors are kept as float32 arrays, a quarter of the size of lists of Python floats.
+        :param memory_size: The maximum number of vectors kept in memory.
+        :param store: The persistent store used as the second tier.
+        """
+        self.memory = LRUCache(memory_size)
+        self.store = store
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """
+        Look up many keys, checking memory first and the persistent store second.
+        Vectors found in the store are promoted into memory.
+        :param keys: The cache keys to look up.
+        :return: A mapping of the keys that were found to their vectors.
+        """
+        found, missing = self.get_memory(keys)
+        if missing:
+            found.update(self.get_stored(missing))
+        return found
+
+    def get_memory(self, keys: list[str]) -> tuple[dict[str, np.ndarray], list[str]]:
+        """Look up keys in memory only; never blocks on I/O. Returns the found vectors and the missing keys."""
+        found = {}
+        missing = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                found[key] = vector
+        return found, missing
+
+    def get_stored(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Look up keys in the persistent store and promote the vectors found into memory."""
+        if self.store is None:
+            return {}
+        stored = self.store.get_many(keys)
+        for key, vector in stored.items():
+            self.memory.put(key, vector)
+        return stored
+
+    def put_many(self, items: dict[str, list]):
+        self.put_memory(items)
+        if self.store is not None:
+            self.store.put_many(items)
+
+    def put_memory(self, items: dict[str, list]):
+        for key, vector in items.items():
+            self.memory.put(key, np.asarray(vector, dtype=np.float32))
+
+    def stats(self) -> dict:
+        stats = {
+            "memory": {
+                "size": len(self.memory),
+                "hits": self.memory.hits,
+                "misses": self.memory.misses,
+                "evictions": self.memory.evictions,
+            }
+        }
+        if self.store is not None:
+            stats["store"] = {
+                "hits": self.store.hits,
+                "misses": self.store.misses,
+                "evictions": self.store.evictions,
+            }
+        return stats
@@ -0,0 +1,74 @@
+from typing import Optional
+
+# Rank constant of reciprocal-rank fusion; larger values flatten the gap between top ranks
+RRF_K = 60
+
+
+class FusedResult:
+    def __init__(self, item_id: str):
+        """
+        One candidate of a fused ranking.
+        :param item_id: The Mongo id of the item.
+        """
+        self.item_id = item_id
+        self.score = 0.0
+        self.scores: dict[str, float] = {}
+        self.ranks: dict[str, int] = {}
+
+
+def _collect(ranked_lists: dict[str, list[tuple[str, float]]]) -> dict[str, FusedResult]:
+    results: dict[str, FusedResult] = {}
+    for source, ranked in ranked_lists.items():
+        for rank, (item_id, score) in enumerate(ranked, start=1):
+            result = results.get(item_id)
+            if result is None:
+                result = results[item_id] = FusedResult(item_id)
+            # Keep the best position if a source returns the same id twice
+            if source not in result.ranks:
+                result.ranks[source] = rank
+                result.scores[source] = score
+    return results
+
+
+def reciprocal_rank_fusion(ranked_lists: dict[str, list[tuple[str, float]]],
+                           weights: Optional[dict[str, float]] = None, k: int = RRF_K) -> list[FusedResult]:
+    """
+    Fuse several rankings with reciprocal-rank fusion: every source adds
+    `weight / (k + rank)` to the items it returned. Only ranks matter, so sources
+    with incomparable scores (Mongo textScore, cosine similarity) mix safely.
+    :param ranked_lists: Source name -> (item id, score) pairs, best first.
+    :param weights: Optional source name -> weight, 1.0 when missing.
+    :param k: The rank constant.
+    :return: The fused results, best first.
+    """
+    weights = weights or {}
+    results = _collect(ranked_lists)
+    for result in results.values():
+        result.score = sum(weights.get(source, 1.0) / (k + rank) for source, rank in result.ranks.items())
+    return sorted(results.values(), key=lambda result: result.score, reverse=True)
+
+
+def weighted_score_fusion(ranked_lists: dict[str, list[tuple[str, float]]],
+                          weights: Optional[dict[str, float]] = None) -> list[FusedResult]:
+    """
+    Fuse several rankings by a weighted sum of their min-max normalized scores.
+    An item missing from a source gets 0 for that source.
+    :param ranked_lists: Source name -> (item id, score) pairs, best first.
+    :param weights: Optional source name -> weight, 1.0 when missing.
+    :return: The fused results, best first.
+    """
+    weights = weights or {}
+    bounds = {}
+    for source, ranked in ranked_lists.items():
+        if ranked:
+            scores = [score for _, score in ranked]
+            bounds[source] = (min(scores), max(scores))
+    results = _collect(ranked_lists)
+    for result in results.values():
+        total = 0.0
+        for source, score in result.scores.items():
+            low, high = bounds[source]
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            total += weights.get(source, 1.0) * normalized
+        result.score = total
+    return sorted(results.values(), key=lambda result: result.score, reverse=True)
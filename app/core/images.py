@@ -0,0 +1,105 @@
+import base64
+import os
+import threading
+import time
+from typing import Optional
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it thumbnails are disabled
+    Image = None
+
+from app.core.tracing import span
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+THUMBNAIL_DIR = ".thumbnails"
+
+
+class ImageStore:
+    def __init__(self, directory: str, thumbnail_sizes: list[int] = None, refresh_interval: float = 5.0):
+        """
+        In-memory index of the catalog images, keyed by the file name without its extension.
+        The index is built once and rebuilt when the directory's modification time changes,
+        checked at most once every `refresh_interval` seconds.
+        :param directory: The directory holding the images.
+        :param thumbnail_sizes: Optional widths of the thumbnails that may be generated.
+        :param refresh_interval: The minimum number of seconds between two change checks.
+        """
+        self.directory = directory
+        self.thumbnail_sizes = sorted(thumbnail_sizes or []) if Image is not None else []
+        self.refresh_interval = refresh_interval
+        self._index: dict[str, str] = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self, force: bool = False):
+        """Rebuild the index if the directory changed since the last build."""
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not force and mtime == self._mtime and self._mtime is not None:
+                return
+            index = {}
+            if mtime is not None:
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        name, extension = os.path.splitext(entry.name)
+                        if extension.lower() in IMAGE_EXTENSIONS and entry.is_file():
+                            index[name] = entry.path
+            self._index = index
+            self._mtime = mtime
+
+    @property
+    def stale(self) -> bool:
+        """Whether the directory is due for a change check."""
+        return time.monotonic() - self._checked_at > self.refresh_interval
+
+    def path(self, name: str) -> Optional[str]:
+        """Return the path of the image with the given name, or None if there is none."""
+        if self.stale:
+            self.refresh()
+        return self._index.get(name)
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Like `path`, from the index as it is; it never touches the disk, so it is safe on the event loop."""
+        return self._index.get(name)
+
+    def read_base64(self, name: str) -> Optional[str]:
+        """Read an image and return it base64 encoded, for the legacy inline mode."""
+        image_path = self.path(name)
+        if image_path is None:
+            return None
+        with span("images.read"), open(image_path, "rb") as img_file:
+            return base64.b64encode(img_file.read()).decode("utf-8")
+
+    def thumbnail(self, name: str, width: int) -> Optional[str]:
+        """
+        Return the path of a thumbnail of the image, generating it if it does not exist yet.
+        :param name: The image name.
+        :param width: One of the configured thumbnail widths.
+        :return: The thumbnail path, or None if there is no image or the width is not configured.
+        """
+        image_path = self.path(name)
+        if image_path is None or width not in self.thumbnail_sizes:
+            return None
+        thumbnail_path = os.path.join(self.directory, THUMBNAIL_DIR, str(width), os.path.basename(image_path))
+        if (not os.path.exists(thumbnail_path)
+                or os.path.getmtime(thumbnail_path) < os.path.getmtime(image_path)):
+            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            with span("images.thumbnail"), Image.open(image_path) as image:
+                image.thumbnail((width, width * 4))
+                tmp_path = f"{thumbnail_path}.tmp{os.path.splitext(thumbnail_path)[1]}"
+                image.save(tmp_path)
+            os.replace(tmp_path, thumbnail_path)
+        return thumbnail_path
+
+    def generate_thumbnails(self):
+        """Pre-generate every configured thumbnail size for every indexed image."""
+        for name in list(self._index):
+            for width in self.thumbnail_sizes:
+                self.thumbnail(name, width)
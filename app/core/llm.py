@@ -1,25 +1,69 @@
-from typing import Optional
+from typing import AsyncIterator, Optional, Union
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 from pydantic import Field, BaseModel
 
+from app.core.tracing import span
+
+MODEL = "o1"
+
 
 class LLMResponse(BaseModel):
     answer: str = Field(description="The response generated by the LLM model.")
     item_id: Optional[str] = Field(description="The ID of the item in the database.")
 
 
+class NoAnswerError(RuntimeError):
+    """The model refused, or its response could not be parsed into an `LLMResponse`."""
+
+
 class LLM:
-    def __init__(self, api_key: str):
-        self.llm_client = OpenAI(api_key=api_key)
-
-    def generate_response(self, system: str, user: str):
-        completion = self.llm_client.beta.chat.completions.parse(
-            model="o1",
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            response_format=LLMResponse
-        )
+    def __init__(self, api_key: str, http_client: Optional[httpx.AsyncClient] = None,
+                 timeout: Optional[float] = None):
+        options = {"timeout": timeout} if timeout is not None else {}
+        self.llm_client = AsyncOpenAI(api_key=api_key, http_client=http_client, **options)
+
+    async def close(self):
+        await self.llm_client.close()
+
+    async def generate_response(self, system: str, user: str):
+        with span("openai.completion", service="openai"):
+            completion = await self.llm_client.beta.chat.completions.parse(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": user},
+                ],
+                response_format=LLMResponse
+            )
         return completion.choices[0].message.parsed
+
+    async def stream_response(self, system: str, user: str) -> AsyncIterator[Union[str, LLMResponse]]:
+        """
+        Stream a structured response.
+        The model still produces an `LLMResponse` JSON object; the growing `answer` field is
+        read from the partially parsed JSON and yielded as text fragments while it is generated.
+        :return: The answer text fragments, followed by the parsed `LLMResponse` as the last item;
+            it is None when the model refused or the response did not parse.
+        """
+        sent = 0
+        # The span also covers the time the caller spends between two fragments
+        with span("openai.stream", service="openai"):
+            async with self.llm_client.beta.chat.completions.stream(
+                    model=MODEL,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                    response_format=LLMResponse
+            ) as stream:
+                async for event in stream:
+                    if event.type != "content.delta" or not isinstance(event.parsed, dict):
+                        continue
+                    answer = event.parsed.get("answer") or ""
+                    if len(answer) > sent:
+                        yield answer[sent:]
+                        sent = len(answer)
+                completion = await stream.get_final_completion()
+        yield completion.choices[0].message.parsed
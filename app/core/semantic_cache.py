@@ -0,0 +1,93 @@
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+
+class _Partition:
+    def __init__(self, dim: int, capacity: int):
+        """
+        Fixed-size ring of normalized query vectors; the oldest entry is overwritten when full.
+        """
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.created_at = np.full(capacity, -np.inf)
+        self.item_ids: list[Optional[frozenset]] = [None] * capacity
+        self.values: list[Any] = [None] * capacity
+        self.next = 0
+
+    def add(self, vector: np.ndarray, item_ids: frozenset, value: Any, now: float):
+        row = self.next
+        self.vectors[row] = vector
+        self.created_at[row] = now
+        self.item_ids[row] = item_ids
+        self.values[row] = value
+        self.next = (row + 1) % len(self.values)
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600.0, max_entries: int = 1000):
+        """
+        Cache of answers keyed by the embedding of the question, so paraphrases share an answer.
+        Entries live in separate partitions (e.g. per language and prompt). A lookup returns
+        the answer of the most similar live entry whose cosine similarity reaches `threshold`
+        and whose retrieved item ids are the same as the current ones, so an answer is never
+        reused over a different set of items.
+        :param threshold: The minimum cosine similarity of a hit.
+        :param ttl: The number of seconds an answer can be reused.
+        :param max_entries: The maximum number of answers kept per partition.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._partitions: dict[str, _Partition] = {}
+        self.hits = 0
+        self.misses = 0
+        self.item_mismatches = 0
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, partition: str, embedding: list[float], item_ids: list[str]) -> Optional[Any]:
+        """
+        Look up a cached answer.
+        :param partition: The partition to search.
+        :param embedding: The question embedding.
+        :param item_ids: The ids of the items retrieved for the question.
+        :return: The cached answer, or None.
+        """
+        entries = self._partitions.get(partition)
+        if entries is None:
+            self.misses += 1
+            return None
+        scores = entries.vectors @ self._normalize(embedding)
+        scores[entries.created_at < time.monotonic() - self.ttl] = -np.inf
+        candidates = np.flatnonzero(scores >= self.threshold)
+        item_ids = frozenset(item_ids)
+        for row in candidates[np.argsort(-scores[candidates])]:
+            if entries.item_ids[row] == item_ids:
+                self.hits += 1
+                return entries.values[row]
+        if len(candidates):
+            self.item_mismatches += 1
+        self.misses += 1
+        return None
+
+    def put(self, partition: str, embedding: list[float], item_ids: list[str], value: Any):
+        vector = self._normalize(embedding)
+        entries = self._partitions.get(partition)
+        if entries is None:
+            entries = self._partitions[partition] = _Partition(len(vector), self.max_entries)
+        entries.add(vector, frozenset(item_ids), value, time.monotonic())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "item_mismatches": self.item_mismatches,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "partitions": {name: int(np.isfinite(entries.created_at).sum())
+                           for name, entries in self._partitions.items()},
+        }
@@ -0,0 +1,43 @@
+import logging
+from typing import Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# The encoding of the o1 and gpt-4o models
+DEFAULT_ENCODING = "o200k_base"
+# Rough characters per token, used when the encoding cannot be loaded
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    def __init__(self, encoding: str = DEFAULT_ENCODING):
+        """
+        Count and cut prompt text in model tokens, locally.
+        tiktoken downloads the encoding on first use and caches it; without network access
+        (and no cached copy) counts fall back to an estimate from the text length.
+        :param encoding: The tiktoken encoding name.
+        """
+        self._encoding: Optional[tiktoken.Encoding] = None
+        try:
+            self._encoding = tiktoken.get_encoding(encoding)
+        except Exception as e:
+            logger.warning("Could not load the %s encoding, estimating token counts: %s", encoding, e)
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int, suffix: str = "…") -> str:
+        """Cut `text` to at most `max_tokens` tokens, marking the cut with `suffix`."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            limit = max_tokens * CHARS_PER_TOKEN
+            return text if len(text) <= limit else text[:limit - len(suffix)] + suffix
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens - 1]) + suffix
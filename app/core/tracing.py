@@ -0,0 +1,270 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Process-wide latency histograms and call counters, rendered in the Prometheus text format.
+        Stages are the traced calls (e.g. "mongo.find", "cohere.embed"); calls to external
+        services are also counted per service and outcome. Background workers publish their
+        own gauges and counters with `set_gauge` and `increment`.
+        """
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.stages: dict[str, Histogram] = {}
+        self.requests: dict[tuple[str, str, int], Histogram] = {}
+        self.external_calls: dict[tuple[str, str], int] = {}
+        self.stage_errors: dict[str, int] = {}
+        # Metrics published by background workers: name -> (type, help, value by labels)
+        self.custom: dict[str, tuple[str, str, dict[tuple, float]]] = {}
+
+    def observe_stage(self, stage: str, seconds: float, failed: bool, service: Optional[str]):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                self.stage_errors[stage] = self.stage_errors.get(stage, 0) + 1
+            if service is not None:
+                key = (service, "error" if failed else "ok")
+                self.external_calls[key] = self.external_calls.get(key, 0) + 1
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            key = (method, route, status)
+            histogram = self.requests.get(key)
+            if histogram is None:
+                histogram = self.requests[key] = Histogram()
+            histogram.observe(seconds)
+
+    def set_gauge(self, name: str, value: float, help_text: str, **labels: str):
+        with self._lock:
+            self._custom(name, "gauge", help_text)[tuple(sorted(labels.items()))] = value
+
+    def increment(self, name: str, amount: float, help_text: str, **labels: str):
+        with self._lock:
+            values = self._custom(name, "counter", help_text)
+            key = tuple(sorted(labels.items()))
+            values[key] = values.get(key, 0) + amount
+
+    def _custom(self, name: str, kind: str, help_text: str) -> dict[tuple, float]:
+        entry = self.custom.get(name)
+        if entry is None:
+            entry = self.custom[name] = (kind, help_text, {})
+        return entry[2]
+
+    def render(self, caches: Optional[dict[str, dict]] = None) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        :param caches: Hit and miss counters (and optionally the size) of each cache, by cache name.
+        :return: The metrics page.
+        """
+        lines = []
+        with self._lock:
+            _render_histograms(lines, "http_request_duration_seconds", "Request latency by route.",
+                               {(("method", method), ("route", route), ("status", str(status))): histogram
+                                for (method, route, status), histogram in self.requests.items()})
+            _render_histograms(lines, "stage_duration_seconds", "Latency of the traced calls by stage.",
+                               {(("stage", stage),): histogram for stage, histogram in self.stages.items()})
+            _render_counter(lines, "stage_errors_total", "Traced calls that raised, by stage.",
+                            {(("stage", stage),): count for stage, count in self.stage_errors.items()})
+            _render_counter(lines, "external_calls_total", "Calls to external services by outcome.",
+                            {(("service", service), ("outcome", outcome)): count
+                             for (service, outcome), count in self.external_calls.items()})
+            for name, (kind, help_text, values) in sorted(self.custom.items()):
+                render = _render_counter if kind == "counter" else _render_gauge
+                render(lines, name, help_text, dict(values))
+        caches = caches or {}
+        _render_counter(lines, "cache_hits_total", "Cache hits.",
+                        {(("cache", name),): stats["hits"] for name, stats in caches.items()})
+        _render_counter(lines, "cache_misses_total", "Cache misses.",
+                        {(("cache", name),): stats["misses"] for name, stats in caches.items()})
+        _render_gauge(lines, "cache_hit_ratio", "Cache hits over lookups since the process started.",
+                      {(("cache", name),): stats["hits"] / (stats["hits"] + stats["misses"])
+                       for name, stats in caches.items() if stats["hits"] + stats["misses"]})
+        _render_gauge(lines, "cache_entries", "Entries held by the cache.",
+                      {(("cache", name),): stats["size"] for name, stats in caches.items() if "size" in stats})
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped))
+
+
+def _render_histograms(lines: list[str], name: str, help_text: str, histograms: dict[tuple, Histogram]):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in sorted(histograms.items()):
+        prefix = _labels(labels)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix},le="{bound}"}} {cumulative}')
+        cumulative += histogram.counts[-1]
+        lines.append(f'{name}_bucket{{{prefix},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{prefix}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{prefix}}} {cumulative}")
+
+
+def _sample(name: str, labels: tuple, value: float) -> str:
+    return f"{name}{{{_labels(labels)}}} {value}" if labels else f"{name} {value}"
+
+
+def _render_counter(lines: list[str], name: str, help_text: str, values: dict[tuple, float]):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines += [_sample(name, labels, value) for labels, value in sorted(values.items())]
+
+
+def _render_gauge(lines: list[str], name: str, help_text: str, values: dict[tuple, float]):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [_sample(name, labels, value) for labels, value in sorted(values.items())]
+
+
+metrics = Metrics()
+
+
+class Trace:
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        """The spans of one request, as (stage, offset, duration) in seconds."""
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+
+    def server_timing(self, total: float) -> str:
+        """Format the time spent per stage as a `Server-Timing` header value."""
+        stages: dict[str, list] = {}
+        for stage, _, duration in self.spans:
+            entry = stages.setdefault(stage, [0.0, 0])
+            entry[0] += duration
+            entry[1] += 1
+        parts = [f'{stage};dur={duration * 1000:.1f};desc="{count}x"'
+                 for stage, (duration, count) in stages.items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def breakdown(self) -> list[str]:
+        return [f"{offset * 1000:9.1f} ms  +{duration * 1000:8.1f} ms  {stage}"
+                for stage, offset, duration in sorted(self.spans, key=lambda span: span[1])]
+
+
+# The trace of the current request; copied into the tasks and threads it starts
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+class _Span:
+    __slots__ = ("stage", "service", "started")
+
+    def __init__(self, stage: str, service: Optional[str]):
+        self.stage = stage
+        self.service = service
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        metrics.observe_stage(self.stage, elapsed, exc_type is not None, self.service)
+        trace = _current.get()
+        if trace is not None:
+            trace.spans.append((self.stage, self.started - trace.started, elapsed))
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage: str, service: Optional[str] = None):
+    """
+    Time a block of code as one stage of the current request.
+    The duration is added to the stage histogram and, when the request is traced, to its trace.
+    :param stage: The stage name, e.g. "qdrant.search".
+    :param service: The external service called in the block, counted in `external_calls_total`.
+    """
+    if not metrics.enabled:
+        return _NO_SPAN
+    return _Span(stage, service)
+
+
+class TracingMiddleware:
+    def __init__(self, app, server_timing: bool = True, slow_request_ms: float = 0.0,
+                 slow_sample_rate: float = 0.0):
+        """
+        ASGI middleware recording the latency of every request by route. A request is traced,
+        i.e. its spans are kept, when the `Server-Timing` header is enabled or when it is picked
+        by the slow request sampling; a sampled request slower than `slow_request_ms` has its
+        full stage breakdown logged.
+        :param app: The ASGI application.
+        :param server_timing: Whether to send the per-stage timings in a `Server-Timing` header.
+        :param slow_request_ms: The latency above which a sampled request is logged; 0 disables the log.
+        :param slow_sample_rate: The fraction of requests considered for the slow request log.
+        """
+        self.app = app
+        self.server_timing = server_timing
+        self.slow_request_seconds = slow_request_ms / 1000
+        self.slow_sample_rate = slow_sample_rate if slow_request_ms > 0 else 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        sampled = self.slow_sample_rate > 0 and random.random() < self.slow_sample_rate
+        trace = Trace() if self.server_timing or sampled else None
+        token = _current.set(trace)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = trace.server_timing(time.perf_counter() - started).encode("latin-1")
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            # Label by route template so ids in paths do not create new series
+            metrics.observe_request(scope["method"], getattr(route, "path", "unmatched"), status, elapsed)
+            if sampled and elapsed >= self.slow_request_seconds:
+                logger.warning("Slow request %s %s: %d in %.1f ms\n%s", scope["method"], scope["path"], status,
+                               elapsed * 1000, "\n".join(trace.breakdown()))
@@ -1,32 +1,129 @@
-from typing import Any
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
 
-from tavily import TavilyClient
+from tavily import AsyncTavilyClient
+
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Tavily only returns pages from the last SEARCH_DAYS days
+SEARCH_DAYS = 30
+DAY_SECONDS = 86400
+
+SEARCH_OPTIONS = {
+    "search_depth": "advanced",
+    "topic": "general",
+    "days": SEARCH_DAYS,
+    "max_results": 10,
+    "include_images": True,
+    "include_domains": ["amazon.com"],
+}
 
 
 class WebSearch:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, ttl: float = DAY_SECONDS, max_entries: int = 1000):
         """
         Initialize the WebSearch client with the provided API key.
+        Results are cached in memory by normalized query and search options. A result younger
+        than `ttl` is served as is; an older one is still served while a background call
+        refreshes it, until it falls out of the `days` freshness window of the search.
+        Concurrent misses for the same query share one upstream call.
         :param api_key: The API key to use for authentication.
+        :param ttl: The number of seconds a result is fresh; 0 disables the cache.
+        :param max_entries: The maximum number of cached queries.
         """
-        self.client = TavilyClient(api_key=api_key)
+        self.client = AsyncTavilyClient(api_key=api_key)
+        self.ttl = ttl
+        self.max_age = max(ttl, SEARCH_DAYS * DAY_SECONDS)
+        self.max_entries = max_entries
+        self._cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
 
-    def search(self, query: str) -> dict[str, list[dict[str, Any]] | Any]:
+    @staticmethod
+    def cache_key(query: str) -> str:
+        normalized = " ".join(query.lower().split())
+        return json.dumps([normalized, SEARCH_OPTIONS], sort_keys=True)
+
+    async def search(self, query: str) -> dict[str, list[dict[str, Any]] | Any]:
         """
         Search the web for the specified query.
         This method searches the web for the specified query, returning the search results.
         :param query: The query to search for.
         :return: The search results.
         """
+        if self.ttl <= 0:
+            return await self._search(query)
+        key = self.cache_key(query)
+        entry = self._cache.get(key)
+        if entry is not None:
+            fetched_at, result = entry
+            age = time.monotonic() - fetched_at
+            if age < self.max_age:
+                self._cache.move_to_end(key)
+                if age < self.ttl:
+                    self.hits += 1
+                else:
+                    # Stale while revalidate: answer now, refresh in the background
+                    self.stale_hits += 1
+                    self._fetch(key, query)
+                return result
+        self.misses += 1
+        # Shielded so a cancelled request does not cancel the call other requests wait on
+        return await asyncio.shield(self._fetch(key, query))
+
+    async def warm(self, queries: Iterable[str], concurrency: int = 4) -> int:
+        """
+        Fill the cache for the given queries, at most `concurrency` upstream calls at a time.
+        :return: The number of queries that could be searched.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm_one(query: str):
+            async with semaphore:
+                await self.search(query)
+
+        results = await asyncio.gather(*(warm_one(query) for query in dict.fromkeys(queries)),
+                                       return_exceptions=True)
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                "size": len(self._cache)}
+
+    def _fetch(self, key: str, query: str) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, query))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Web search for %s failed: %s", key, task.exception())
+
+    async def _refresh(self, key: str, query: str) -> dict:
+        result = await self._search(query)
+        self._cache[key] = (time.monotonic(), result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return result
+
+    async def _search(self, query: str) -> dict[str, list[dict[str, Any]] | Any]:
         try:
             # Search the web for the query
-            response = self.client.search(query=query,
-                                          search_depth="advanced",
-                                          topic="general",
-                                          days=30,
-                                          max_results=10,
-                                          include_images=True,
-                                          include_domains=["amazon.com"], )
+            with span("tavily.search", service="tavily"):
+                response = await self.client.search(query=query, **SEARCH_OPTIONS)
             web_search_results = []
             for item in response['results']:
                 # Only include URLs that are product pages (contains '/dp/')
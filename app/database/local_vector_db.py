@@ -0,0 +1,165 @@
+import asyncio
+import uuid
+from typing import Iterator, Optional
+
+import numpy as np
+
+from app.core.tracing import span
+from app.database.vector_engine import NumpyVectorEngine
+from app.database.vector_store import AsyncVectorStore, VectorStore, point_id_for
+
+
+def engine_collection(collection_name: str, vector_name: Optional[str] = None) -> str:
+    # Each named vector is kept in its own engine collection, with the same point ids
+    return f"{collection_name}.{vector_name}" if vector_name else collection_name
+
+
+class LocalVectorDBClient(VectorStore):
+    def __init__(self, engine: NumpyVectorEngine):
+        """
+        Vector backend running in-process on a `NumpyVectorEngine`, with no network hop.
+        :param engine: The engine holding the collections.
+        """
+        self.engine = engine
+
+    def close(self):
+        pass
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return any(name == collection_name or name.startswith(collection_name + ".")
+                   for name in self.engine.collection_names())
+
+    def create_collection(self, collection_name: str = "items_ar", size: int = 384,
+                          vector_names: tuple[str, ...] = ()):
+        for vector_name in vector_names or (None,):
+            self.engine.create_collection(engine_collection(collection_name, vector_name), size)
+
+    def insert_vector(self, vector: list | dict, payload: dict, collection_name: str, point_id: str = None) -> str:
+        return self.insert_vectors([vector], [payload], collection_name,
+                                   point_ids=[point_id] if point_id else None)[0]
+
+    def insert_vectors(self, vectors: list[list] | list[dict], payloads: list[dict], collection_name: str,
+                       point_ids: list[str] = None, wait: bool = True) -> list[str]:
+        if point_ids is None:
+            point_ids = [str(uuid.uuid4()) for _ in vectors]
+        if vectors and isinstance(vectors[0], dict):
+            self.update_vectors(vectors, payloads, collection_name, point_ids)
+            return point_ids
+        with span("vector.upsert"):
+            self.engine.upsert(collection_name, point_ids, vectors, payloads)
+        return point_ids
+
+    def delete_vectors(self, mongo_ids: list[str], collection_name: str):
+        point_ids = [point_id_for(mongo_id) for mongo_id in mongo_ids]
+        with span("vector.delete"):
+            for name in self.engine.collection_names():
+                if name == collection_name or name.startswith(collection_name + "."):
+                    self.engine.delete(name, point_ids)
+
+    def set_payloads(self, mongo_ids: list[str], payloads: list[dict], collection_name: str):
+        point_ids = [point_id_for(mongo_id) for mongo_id in mongo_ids]
+        with span("vector.upsert"):
+            for name in self.engine.collection_names():
+                if name == collection_name or name.startswith(collection_name + "."):
+                    # The engine only writes whole rows, so the stored vectors are written back
+                    vectors = self.engine.retrieve(name, point_ids)
+                    rows = [(point_id, payload) for point_id, payload in zip(point_ids, payloads)
+                            if point_id in vectors]
+                    if rows:
+                        self.engine.upsert(name, [point_id for point_id, _ in rows],
+                                           [vectors[point_id] for point_id, _ in rows],
+                                           [payload for _, payload in rows])
+
+    def update_vectors(self, vectors: list[dict], payloads: list[dict], collection_name: str,
+                       point_ids: list[str]):
+        with span("vector.upsert"):
+            for vector_name in {name for vector in vectors for name in vector}:
+                rows = [(point_id, vector[vector_name], payload)
+                        for point_id, vector, payload in zip(point_ids, vectors, payloads) if vector_name in vector]
+                self.engine.upsert(engine_collection(collection_name, vector_name),
+                                   [point_id for point_id, _, _ in rows],
+                                   [vector for _, vector, _ in rows],
+                                   [payload for _, _, payload in rows])
+
+    def scroll_vectors(self, collection_name: str, batch_size: int = 256,
+                       vector_name: Optional[str] = None) -> Iterator[tuple[list[str], list[np.ndarray]]]:
+        for _, matrix, payloads in self.engine.scroll(engine_collection(collection_name, vector_name), batch_size):
+            yield [payload["id"] for payload in payloads], list(matrix)
+
+    def search_vector(self, query_vector: list, collection_name: str,
+                      score_threshold: float, top_k: int,
+                      filters: dict = None, vector_name: Optional[str] = None) -> list[str]:
+        return self.search_vectors([query_vector], collection_name, score_threshold, top_k, filters, vector_name)[0]
+
+    def search_vectors(self, query_vectors: list[list], collection_name: str,
+                       score_threshold: float, top_k: int,
+                       filters: dict = None, vector_name: Optional[str] = None) -> list[list[str]]:
+        with span("vector.search"):
+            batch = self.engine.search(engine_collection(collection_name, vector_name), query_vectors, top_k=top_k,
+                                       score_threshold=score_threshold, filters=filters)
+        return [[payload["id"] for _, _, payload in hits] for hits in batch]
+
+    def search_vector_scored(self, query_vector: list, collection_name: str,
+                             score_threshold: float, top_k: int,
+                             filters: dict = None, vector_name: Optional[str] = None) -> list[tuple[str, float]]:
+        with span("vector.search"):
+            hits, = self.engine.search(engine_collection(collection_name, vector_name), [query_vector], top_k=top_k,
+                                       score_threshold=score_threshold, filters=filters)
+        return [(payload["id"], score) for _, score, payload in hits]
+
+    def get_vectors(self, mongo_ids: list[str], collection_name: str,
+                    vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+        point_ids = [point_id_for(mongo_id) for mongo_id in mongo_ids]
+        with span("vector.retrieve"):
+            vectors = self.engine.retrieve(engine_collection(collection_name, vector_name), point_ids)
+        return {mongo_id: vectors[point_id] for mongo_id, point_id in zip(mongo_ids, point_ids)
+                if point_id in vectors}
+
+
+class AsyncLocalVectorDBClient(AsyncVectorStore):
+    def __init__(self, engine: NumpyVectorEngine):
+        """
+        Asyncio wrapper around `LocalVectorDBClient`.
+        Searches run in a worker thread; NumPy releases the GIL during the matrix product.
+        :param engine: The engine holding the collections.
+        """
+        self.local = LocalVectorDBClient(engine)
+
+    async def close(self):
+        pass
+
+    async def insert_vector(self, vector: list | dict, payload: dict, collection_name: str,
+                            point_id: str = None) -> str:
+        return await asyncio.to_thread(self.local.insert_vector, vector, payload, collection_name, point_id)
+
+    async def insert_vectors(self, vectors: list[list] | list[dict], payloads: list[dict], collection_name: str,
+                             point_ids: list[str] = None) -> list[str]:
+        return await asyncio.to_thread(self.local.insert_vectors, vectors, payloads, collection_name, point_ids)
+
+    async def delete_vectors(self, mongo_ids: list[str], collection_name: str):
+        await asyncio.to_thread(self.local.delete_vectors, mongo_ids, collection_name)
+
+    async def set_payloads(self, mongo_ids: list[str], payloads: list[dict], collection_name: str):
+        await asyncio.to_thread(self.local.set_payloads, mongo_ids, payloads, collection_name)
+
+    async def search_vector(self, query_vector: list, collection_name: str,
+                            score_threshold: float, top_k: int,
+                            filters: dict = None, vector_name: Optional[str] = None) -> list[str]:
+        return await asyncio.to_thread(self.local.search_vector, query_vector, collection_name,
+                                       score_threshold, top_k, filters, vector_name)
+
+    async def search_vectors(self, query_vectors: list[list], collection_name: str,
+                             score_threshold: float, top_k: int,
+                             filters: dict = None, vector_name: Optional[str] = None) -> list[list[str]]:
+        return await asyncio.to_thread(self.local.search_vectors, query_vectors, collection_name,
+                                       score_threshold, top_k, filters, vector_name)
+
+    async def search_vector_scored(self, query_vector: list, collection_name: str,
+                                   score_threshold: float, top_k: int,
+                                   filters: dict = None, vector_name: Optional[str] = None) -> list[tuple[str, float]]:
+        return await asyncio.to_thread(self.local.search_vector_scored, query_vector, collection_name,
+                                       score_threshold, top_k, filters, vector_name)
+
+    async def get_vectors(self, mongo_ids: list[str], collection_name: str,
+                          vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+        return await asyncio.to_thread(self.local.get_vectors, mongo_ids, collection_name, vector_name)
@@ -1,15 +1,25 @@
-from pymongo import MongoClient
-from pymongo.results import InsertOneResult
+from typing import Optional
+
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.results import BulkWriteResult, InsertManyResult, InsertOneResult
+
+from app.core.tracing import span
 
 
 class Mongo:
-    def __init__(self, uri: str, db_name: str):
-        self.client = MongoClient(uri)
+    def __init__(self, uri: str, db_name: str, **client_options):
+        self.client = MongoClient(uri, **client_options)
         self.db = self.client[db_name]
 
+    def close(self):
+        self.client.close()
+
     def insert(self, collection: str, data: dict) -> InsertOneResult:
         return self.db[collection].insert_one(data)
 
+    def insert_many(self, collection: str, data: list[dict], ordered: bool = False) -> InsertManyResult:
+        return self.db[collection].insert_many(data, ordered=ordered)
+
     def aggregate(self, collection: str, pipeline: list) -> list:
         return list(self.db[collection].aggregate(pipeline))
 
@@ -29,7 +39,113 @@ class Mongo:
         # Perform the search
         return list(self.db[collection].find(query_dict))
 
+    def text_search(self, collection: str, query: str, filter: dict = None, limit: int = 0, skip: int = 0,
+                    projection: dict = None, batch_size: int = None) -> list:
+        """Blocking counterpart of `AsyncMongo.text_search`."""
+        return list(text_search_cursor(self.db[collection], query, filter, limit, skip, projection, batch_size))
+
     def get_messages(self, collection: str, query: dict, limit: int) -> list:
         return list(
             self.db[collection].find(query).sort("created_at", -1).limit(limit)
         )
+
+
+class AsyncMongo:
+    def __init__(self, uri: str, db_name: str, **client_options):
+        self.client = AsyncMongoClient(uri, **client_options)
+        self.db = self.client[db_name]
+
+    async def close(self):
+        await self.client.close()
+
+    async def insert(self, collection: str, data: dict) -> InsertOneResult:
+        with span("mongo.insert"):
+            return await self.db[collection].insert_one(data)
+
+    async def insert_many(self, collection: str, data: list[dict], ordered: bool = False) -> InsertManyResult:
+        with span("mongo.insert_many"):
+            return await self.db[collection].insert_many(data, ordered=ordered)
+
+    async def aggregate(self, collection: str, pipeline: list, **kwargs) -> list:
+        with span("mongo.aggregate"):
+            cursor = await self.db[collection].aggregate(pipeline, **kwargs)
+            return await cursor.to_list()
+
+    async def find_one(self, collection: str, query: dict, projection: dict = None) -> dict:
+        with span("mongo.find_one"):
+            return await self.db[collection].find_one(query, projection)
+
+    async def find_many(self, collection: str, query: dict, sort: list = None, limit: int = 0,
+                        projection: dict = None) -> list:
+        cursor = self.db[collection].find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        with span("mongo.find"):
+            return await cursor.limit(limit).to_list()
+
+    async def bulk_write(self, collection: str, operations: list, ordered: bool = False) -> BulkWriteResult:
+        with span("mongo.bulk_write"):
+            return await self.db[collection].bulk_write(operations, ordered=ordered)
+
+    async def create_index(self, collection: str, keys: list, **kwargs) -> str:
+        return await self.db[collection].create_index(keys, **kwargs)
+
+    async def list_indexes(self, collection: str) -> list:
+        cursor = await self.db[collection].list_indexes()
+        return await cursor.to_list()
+
+    async def drop_index(self, collection: str, name: str):
+        await self.db[collection].drop_index(name)
+
+    async def rename(self, collection: str, new_name: str, drop_target: bool = False):
+        await self.db[collection].rename(new_name, dropTarget=drop_target)
+
+    async def watch(self, collection: str, pipeline: list = None, **kwargs):
+        return await self.db[collection].watch(pipeline, **kwargs)
+
+    async def full_text_search(self, collection: str, query: str, filter: dict = None,
+                               projection: dict = None) -> list:
+        """Every match, unranked; `text_search` returns only the best ones."""
+        # Merge the query with the filter dictionary if filter is provided
+        query_dict = {"$text": {"$search": query}}
+
+        if filter:
+            query_dict.update(filter)  # Merge filter into query_dict
+
+        # Perform the search
+        with span("mongo.text_search"):
+            return await self.db[collection].find(query_dict, projection).to_list()
+
+    async def text_search(self, collection: str, query: str, filter: dict = None, limit: int = 0, skip: int = 0,
+                          projection: dict = None, batch_size: int = None) -> list:
+        """
+        Full-text search ranked by relevance in the database.
+        Matches are sorted by `textScore` and paged with `skip`/`limit` on the server, so only
+        the returned documents are sent, in as few batches as possible.
+        :param collection: The collection, which needs a text index.
+        :param query: The `$search` string.
+        :param filter: Optional conditions added to the `$text` query.
+        :param limit: The maximum number of documents, 0 for all of them.
+        :param skip: The number of best matches to skip.
+        :param projection: Optional fields to return; `_id` and `score` are always returned.
+        :param batch_size: Documents per batch, the limit by default so one round trip is enough.
+        :return: The documents, best first, each with its relevance as `score`.
+        """
+        cursor = text_search_cursor(self.db[collection], query, filter, limit, skip, projection, batch_size)
+        with span("mongo.text_search"):
+            return [document async for document in cursor]
+
+    async def get_messages(self, collection: str, query: dict, limit: int) -> list:
+        with span("mongo.find"):
+            return await self.db[collection].find(query).sort("created_at", -1).limit(limit).to_list()
+
+
+def text_search_cursor(collection, query: str, filter: Optional[dict], limit: int, skip: int,
+                       projection: Optional[dict], batch_size: Optional[int]):
+    # Project and sort by the relevance score, so the server only returns the best `limit` documents
+    score = {"$meta": "textScore"}
+    cursor = collection.find({"$text": {"$search": query}, **(filter or {})}, {**(projection or {}), "score": score})
+    cursor = cursor.sort([("score", score)]).skip(skip).limit(limit)
+    if batch_size or limit:
+        cursor = cursor.batch_size(batch_size or limit)
+    return cursor
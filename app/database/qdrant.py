@@ -1,23 +1,64 @@
 import uuid
+from typing import Iterator, Optional
 
-from qdrant_client import QdrantClient
+import numpy as np
+
+from pydantic import BaseModel, Field
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client import models
 from qdrant_client.models import PointStruct
 
+from app.core.tracing import span
+from app.database.vector_store import AsyncVectorStore, VectorStore, point_id_for
+
+
+class VectorIndexSettings(BaseModel):
+    exact: bool = Field(default=True, description="Brute-force search instead of the HNSW index.")
+    hnsw_m: int = Field(default=16, description="Edges per node in the HNSW graph.")
+    hnsw_ef_construct: int = Field(default=100, description="Candidate list size while building the graph.")
+    hnsw_ef: int = Field(default=128, description="Candidate list size per query; higher is slower and more exact.")
+    quantization: Optional[str] = Field(default=None, description="'int8' for scalar quantization, or None.")
+    quantization_rescore: bool = Field(default=True, description="Rescore quantized hits with the full vectors.")
+    quantization_oversampling: float = Field(default=2.0, description="Candidates fetched per result before rescoring.")
+    payload_indexes: dict[str, str] = Field(default_factory=dict,
+                                            description="Payload field -> schema type (keyword, integer, float, ...).")
+
 
-class VectorDBClient:
-    def __init__(self, host: str, port: int):
-        self.client = QdrantClient(url=host, port=port)
+class VectorDBClient(VectorStore):
+    def __init__(self, host: str, port: int, timeout: int = None,
+                 index_settings: VectorIndexSettings = None):
+        """
+        :param host: The Qdrant URL, or ":memory:" for an in-process instance.
+        :param port: The Qdrant port.
+        :param timeout: The request timeout in seconds.
+        :param index_settings: The HNSW, quantization and payload index settings.
+        """
+        self.client = QdrantClient(location=host, port=port, timeout=timeout)
+        self.index_settings = index_settings or VectorIndexSettings()
 
-    def create_collection(self):
+    def close(self):
+        self.client.close()
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return self.client.collection_exists(collection_name)
+
+    def create_collection(self, collection_name: str = "items_ar", size: int = 384,
+                          vector_names: tuple[str, ...] = ()):
+        settings = self.index_settings
+        vector_params = models.VectorParams(size=size, distance=models.Distance.COSINE)
         self.client.create_collection(
-            collection_name="items_ar",
-            vectors_config=models.VectorParams(
-                size=384,
-                distance=models.Distance.COSINE),
+            collection_name=collection_name,
+            vectors_config={name: vector_params for name in vector_names} if vector_names else vector_params,
+            hnsw_config=models.HnswConfigDiff(m=settings.hnsw_m, ef_construct=settings.hnsw_ef_construct),
+            quantization_config=build_quantization_config(settings),
         )
-    def insert_vector(self, vector: list, payload: dict, collection_name: str):
-        point_id = str(uuid.uuid4())
+        for field_name, field_schema in settings.payload_indexes.items():
+            self.client.create_payload_index(collection_name=collection_name,
+                                             field_name=field_name,
+                                             field_schema=field_schema)
+
+    def insert_vector(self, vector: list | dict, payload: dict, collection_name: str, point_id: str = None):
+        point_id = point_id or str(uuid.uuid4())
         self.client.upsert(
             collection_name=collection_name,
             points=[
@@ -26,38 +67,274 @@ class VectorDBClient:
         )
         return point_id
 
+    def insert_vectors(self, vectors: list[list] | list[dict], payloads: list[dict], collection_name: str,
+                       point_ids: list[str] = None, wait: bool = True) -> list[str]:
+        if point_ids is None:
+            point_ids = [str(uuid.uuid4()) for _ in vectors]
+        self.client.upsert(
+            collection_name=collection_name,
+            points=[
+                PointStruct(id=point_id, vector=vector, payload=payload)
+                for point_id, vector, payload in zip(point_ids, vectors, payloads)
+            ],
+            wait=wait,
+        )
+        return point_ids
+
+    def delete_vectors(self, mongo_ids: list[str], collection_name: str):
+        self.client.delete(collection_name=collection_name,
+                           points_selector=[point_id_for(mongo_id) for mongo_id in mongo_ids])
+
+    def set_payloads(self, mongo_ids: list[str], payloads: list[dict], collection_name: str):
+        point_ids = [point_id_for(mongo_id) for mongo_id in mongo_ids]
+        existing = {str(point.id) for point in self.client.retrieve(collection_name=collection_name, ids=point_ids,
+                                                                    with_payload=False, with_vectors=False)}
+        operations = build_payload_operations(point_ids, payloads, existing)
+        if operations:
+            self.client.batch_update_points(collection_name=collection_name, update_operations=operations)
+
+    def update_vectors(self, vectors: list[dict], payloads: list[dict], collection_name: str,
+                       point_ids: list[str]):
+        existing = {str(point.id) for point in self.client.retrieve(collection_name=collection_name, ids=point_ids,
+                                                                    with_payload=False, with_vectors=False)}
+        updates = [models.PointVectors(id=point_id, vector=vector)
+                   for point_id, vector in zip(point_ids, vectors) if point_id in existing]
+        if updates:
+            self.client.update_vectors(collection_name=collection_name, points=updates)
+        missing = [(point_id, vector, payload) for point_id, vector, payload in zip(point_ids, vectors, payloads)
+                   if point_id not in existing]
+        if missing:
+            self.insert_vectors(vectors=[vector for _, vector, _ in missing],
+                                payloads=[payload for _, _, payload in missing],
+                                collection_name=collection_name,
+                                point_ids=[point_id for point_id, _, _ in missing])
+
+    def scroll_vectors(self, collection_name: str, batch_size: int = 256,
+                       vector_name: Optional[str] = None) -> Iterator[tuple[list[str], list[np.ndarray]]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(collection_name=collection_name, limit=batch_size, offset=offset,
+                                                with_payload=["id"],
+                                                with_vectors=[vector_name] if vector_name else True)
+            if points:
+                vectors = point_vectors(points, vector_name)
+                yield list(vectors), list(vectors.values())
+            if offset is None:
+                return
+
     def search_vector(self, query_vector: list, collection_name: str,
                       score_threshold: float, top_k: int,
-                      filters: dict = None):
-        must = []
-        if filters:
-            for key, value in filters.items():
-                must.append(
-                    models.FieldCondition(
-                        key=key,
-                        match=models.MatchValue(
-                            value=value,
-                        ),
-                    )
-                )
+                      filters: dict = None, vector_name: Optional[str] = None):
         results = self.client.search(
             collection_name=collection_name,
-            query_vector=query_vector,
+            query_vector=named_query(query_vector, vector_name),
             limit=top_k,
-            query_filter=models.Filter(
-                must=must
-            ),
-            search_params=models.SearchParams(exact=True),
+            query_filter=build_filter(filters),
+            search_params=build_search_params(self.index_settings),
             score_threshold=score_threshold
         )
-        # Sort results by the score in descending order
-        sorted_results = sorted(results, key=lambda x: x.score, reverse=True)
-        ids_list = []
-        for result in sorted_results:
-            mongo_id = result.model_dump()['payload']['id']
-            ids_list.append(mongo_id)
-
-        return ids_list
+        return result_ids(results)
+
+    def search_vectors(self, query_vectors: list[list], collection_name: str,
+                       score_threshold: float, top_k: int,
+                       filters: dict = None, vector_name: Optional[str] = None) -> list[list[str]]:
+        batch = self.client.search_batch(
+            collection_name=collection_name,
+            requests=build_search_requests(query_vectors, top_k, score_threshold, filters, self.index_settings,
+                                           vector_name)
+        )
+        return [result_ids(results) for results in batch]
+
+    def get_vectors(self, mongo_ids: list[str], collection_name: str,
+                    vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+        points = self.client.retrieve(collection_name=collection_name,
+                                      ids=[point_id_for(mongo_id) for mongo_id in mongo_ids],
+                                      with_payload=["id"], with_vectors=[vector_name] if vector_name else True)
+        return point_vectors(points, vector_name)
+
+
+class AsyncVectorDBClient(AsyncVectorStore):
+    def __init__(self, host: str, port: int, timeout: int = None,
+                 index_settings: VectorIndexSettings = None):
+        self.client = AsyncQdrantClient(location=host, port=port, timeout=timeout)
+        self.index_settings = index_settings or VectorIndexSettings()
+
+    async def close(self):
+        await self.client.close()
+
+    async def insert_vector(self, vector: list | dict, payload: dict, collection_name: str, point_id: str = None):
+        point_id = point_id or str(uuid.uuid4())
+        with span("qdrant.upsert", service="qdrant"):
+            await self.client.upsert(
+                collection_name=collection_name,
+                points=[
+                    PointStruct(id=point_id, vector=vector, payload=payload)
+                ],
+            )
+        return point_id
+
+    async def insert_vectors(self, vectors: list[list] | list[dict], payloads: list[dict], collection_name: str,
+                             point_ids: list[str] = None) -> list[str]:
+        if point_ids is None:
+            point_ids = [str(uuid.uuid4()) for _ in vectors]
+        with span("qdrant.upsert", service="qdrant"):
+            await self.client.upsert(
+                collection_name=collection_name,
+                points=[
+                    PointStruct(id=point_id, vector=vector, payload=payload)
+                    for point_id, vector, payload in zip(point_ids, vectors, payloads)
+                ],
+            )
+        return point_ids
+
+    async def delete_vectors(self, mongo_ids: list[str], collection_name: str):
+        with span("qdrant.delete", service="qdrant"):
+            await self.client.delete(collection_name=collection_name,
+                                     points_selector=[point_id_for(mongo_id) for mongo_id in mongo_ids])
+
+    async def set_payloads(self, mongo_ids: list[str], payloads: list[dict], collection_name: str):
+        point_ids = [point_id_for(mongo_id) for mongo_id in mongo_ids]
+        with span("qdrant.set_payload", service="qdrant"):
+            existing = {str(point.id) for point in await self.client.retrieve(collection_name=collection_name,
+                                                                              ids=point_ids, with_payload=False,
+                                                                              with_vectors=False)}
+            operations = build_payload_operations(point_ids, payloads, existing)
+            if operations:
+                await self.client.batch_update_points(collection_name=collection_name, update_operations=operations)
+
+    async def search_vector(self, query_vector: list, collection_name: str,
+                            score_threshold: float, top_k: int,
+                            filters: dict = None, vector_name: Optional[str] = None):
+        with span("qdrant.search", service="qdrant"):
+            results = await self.client.search(
+                collection_name=collection_name,
+                query_vector=named_query(query_vector, vector_name),
+                limit=top_k,
+                query_filter=build_filter(filters),
+                search_params=build_search_params(self.index_settings),
+                score_threshold=score_threshold
+            )
+        return result_ids(results)
+
+    async def search_vectors(self, query_vectors: list[list], collection_name: str,
+                             score_threshold: float, top_k: int,
+                             filters: dict = None, vector_name: Optional[str] = None) -> list[list[str]]:
+        with span("qdrant.search", service="qdrant"):
+            batch = await self.client.search_batch(
+                collection_name=collection_name,
+                requests=build_search_requests(query_vectors, top_k, score_threshold, filters,
+                                               self.index_settings, vector_name)
+            )
+        return [result_ids(results) for results in batch]
+
+    async def search_vector_scored(self, query_vector: list, collection_name: str,
+                                   score_threshold: float, top_k: int,
+                                   filters: dict = None, vector_name: Optional[str] = None) -> list[tuple[str, float]]:
+        with span("qdrant.search", service="qdrant"):
+            results = await self.client.search(
+                collection_name=collection_name,
+                query_vector=named_query(query_vector, vector_name),
+                limit=top_k,
+                query_filter=build_filter(filters),
+                search_params=build_search_params(self.index_settings),
+                score_threshold=score_threshold
+            )
+        return result_scores(results)
+
+    async def get_vectors(self, mongo_ids: list[str], collection_name: str,
+                          vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+        with span("qdrant.retrieve", service="qdrant"):
+            points = await self.client.retrieve(collection_name=collection_name,
+                                                ids=[point_id_for(mongo_id) for mongo_id in mongo_ids],
+                                                with_payload=["id"],
+                                                with_vectors=[vector_name] if vector_name else True)
+        return point_vectors(points, vector_name)
+
+
+def build_search_requests(query_vectors: list[list], top_k: int, score_threshold: float, filters: dict,
+                          settings: VectorIndexSettings,
+                          vector_name: Optional[str] = None) -> list[models.SearchRequest]:
+    query_filter = build_filter(filters)
+    search_params = build_search_params(settings)
+    return [
+        models.SearchRequest(vector=models.NamedVector(name=vector_name, vector=query_vector)
+                             if vector_name else query_vector,
+                             limit=top_k, filter=query_filter, params=search_params,
+                             score_threshold=score_threshold, with_payload=True)
+        for query_vector in query_vectors
+    ]
+
+
+def build_payload_operations(point_ids: list[str], payloads: list[dict],
+                             existing: set[str]) -> list[models.OverwritePayloadOperation]:
+    # Setting the payload of a missing point fails, so only existing points are updated
+    return [models.OverwritePayloadOperation(overwrite_payload=models.SetPayload(payload=payload, points=[point_id]))
+            for point_id, payload in zip(point_ids, payloads) if point_id in existing]
+
+
+def named_query(query_vector: list, vector_name: Optional[str]) -> list | tuple[str, list]:
+    # Qdrant searches a named vector when the query is a (name, vector) pair
+    return (vector_name, query_vector) if vector_name else query_vector
+
+
+def build_quantization_config(settings: VectorIndexSettings) -> Optional[models.QuantizationConfig]:
+    if settings.quantization is None:
+        return None
+    if settings.quantization != "int8":
+        raise ValueError(f"Unsupported quantization: {settings.quantization}")
+    return models.ScalarQuantization(
+        scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+    )
+
+
+def build_search_params(settings: VectorIndexSettings) -> models.SearchParams:
+    if settings.exact:
+        return models.SearchParams(exact=True)
+    quantization = None
+    if settings.quantization is not None:
+        quantization = models.QuantizationSearchParams(rescore=settings.quantization_rescore,
+                                                       oversampling=settings.quantization_oversampling)
+    return models.SearchParams(hnsw_ef=settings.hnsw_ef, exact=False, quantization=quantization)
+
+
+def build_filter(filters: dict = None) -> models.Filter:
+    must = []
+    if filters:
+        for key, value in filters.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                # Numbers such as prices are stored as floats, which MatchValue does not accept
+                must.append(models.FieldCondition(key=key, range=models.Range(gte=value, lte=value)))
+                continue
+            must.append(
+                models.FieldCondition(
+                    key=key,
+                    match=models.MatchValue(
+                        value=value,
+                    ),
+                )
+            )
+    return models.Filter(
+        must=must
+    )
+
+
+def result_ids(results: list) -> list[str]:
+    return [mongo_id for mongo_id, _ in result_scores(results)]
+
+
+def point_vectors(points: list, vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+    vectors = {}
+    for point in points:
+        vector = (point.vector or {}).get(vector_name) if vector_name else point.vector
+        if vector is not None:
+            vectors[point.payload['id']] = np.asarray(vector, dtype=np.float32)
+    return vectors
+
+
+def result_scores(results: list) -> list[tuple[str, float]]:
+    # Sort results by the score in descending order
+    sorted_results = sorted(results, key=lambda x: x.score, reverse=True)
+    return [(result.payload['id'], result.score) for result in sorted_results]
 
 
 # VectorDBClient(host="http://172.105.247.6", port=6333).create_collection()
\ No newline at end of file
@@ -0,0 +1,418 @@
+import json
+import os
+import threading
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+import portalocker
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.bin"
+IDS_FILE = "ids.npy"
+PAYLOAD_FILE = "payload.json"
+LOCK_FILE = ".lock"
+
+# Rows scored per block when the stored dtype has no fast BLAS path (float16)
+SCORE_BLOCK_ROWS = 65536
+# Rows appended to the log before ids and payloads are rewritten as one new base; the log may
+# grow to the size of the base, so the rewrites cost O(1) per row on average
+CHECKPOINT_MIN_ROWS = 1024
+# Share of deleted rows from which the vectors are compacted into a new file
+COMPACT_RATIO = 0.25
+
+
+def _write_atomic(path: str, write, mode: str = "w"):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _Snapshot:
+    def __init__(self, meta: dict, vectors: Optional[np.memmap], ids: np.ndarray,
+                 payload: dict[str, np.ndarray], row_of: dict[str, int], deleted: np.ndarray):
+        """
+        One published version of a collection. It is never changed once built: readers take
+        the current snapshot once and use it for the whole call while writers publish new ones.
+        Deleted rows keep their place until the next compaction and are masked out.
+        """
+        self.meta = meta
+        self.version = meta["version"]
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self.vectors = vectors
+        self.ids = ids
+        self.payload = payload
+        self.row_of = row_of
+        self.deleted = deleted
+        self.deleted_count = int(deleted.sum())
+
+    def mask(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+        mask = np.ones(self.count, dtype=bool)
+        for key, value in filters.items():
+            column = self.payload.get(key)
+            if column is None:
+                return np.zeros(self.count, dtype=bool)
+            mask &= column == value
+        return mask
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of every stored vector against every query, shape (count, n_queries)."""
+        matrix = self.vectors[:self.count]
+        if self.dtype == np.float32:
+            return matrix @ queries.T
+        scores = np.empty((self.count, len(queries)), dtype=np.float32)
+        for start in range(0, self.count, SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+        return scores
+
+    def row_payload(self, row: int) -> dict:
+        return {key: values[row] for key, values in self.payload.items() if values[row] is not None}
+
+
+def _files(meta: dict) -> dict:
+    # Collections written before the rows log keep their original file names
+    return meta.get("files", {"vectors": VECTORS_FILE, "ids": IDS_FILE, "payload": PAYLOAD_FILE, "log": None})
+
+
+class _Collection:
+    def __init__(self, path: str):
+        """
+        One collection on disk: a contiguous, memory-mapped vector matrix, a base of ids and
+        column-oriented payloads, and an append-only log of the rows written since that base.
+        `meta.json` is written last on every change and acts as the commit point that readers
+        poll; it records how much of the log is committed.
+        """
+        self.path = path
+        self.snapshot: Optional[_Snapshot] = None
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def read_meta(self) -> dict:
+        with open(self.file(META_FILE)) as f:
+            return json.load(f)
+
+    def load(self):
+        """Build the snapshot of the committed state and publish it with one assignment."""
+        meta = self.read_meta()
+        files = _files(meta)
+        previous = self.snapshot
+        if previous is not None and _files(previous.meta) == files \
+                and previous.meta.get("log_bytes", 0) <= meta.get("log_bytes", 0):
+            # Same base: only the rows logged since the previous snapshot are read
+            ids, payload, row_of, deleted = previous.ids, previous.payload, previous.row_of, previous.deleted
+            start, count = previous.meta.get("log_bytes", 0), previous.count
+        else:
+            base_count = meta.get("base_count", meta["count"])
+            ids = np.load(self.file(files["ids"]))[:base_count]
+            with open(self.file(files["payload"])) as f:
+                columns = json.load(f)
+            payload = {key: np.array(values[:base_count], dtype=object) for key, values in columns.items()}
+            row_of = {point_id: row for row, point_id in enumerate(ids.tolist())}
+            deleted = np.zeros(base_count, dtype=bool)
+            start, count = 0, base_count
+        records = self._read_log(files["log"], start, meta.get("log_bytes", 0))
+        if records:
+            ids, payload, row_of, deleted = self._apply(records, ids, payload, row_of, deleted, count, meta["count"])
+
+        vectors = (np.memmap(self.file(files["vectors"]), dtype=np.dtype(meta["dtype"]), mode="r",
+                             shape=(meta["capacity"], meta["dim"]))
+                   if meta["capacity"] else None)
+        # Readers share one read-only mapping of the file through the OS page cache
+        self.snapshot = _Snapshot(meta, vectors, ids, payload, row_of, deleted)
+
+    def _read_log(self, log_file: Optional[str], start: int, stop: int) -> list[dict]:
+        if not log_file or stop <= start:
+            return []
+        with open(self.file(log_file), "rb") as f:
+            f.seek(start)
+            data = f.read(stop - start)
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    @staticmethod
+    def _apply(records: list[dict], ids: np.ndarray, payload: dict[str, np.ndarray], row_of: dict[str, int],
+               deleted: np.ndarray, old_count: int,
+               count: int) -> tuple[np.ndarray, dict[str, np.ndarray], dict[str, int], np.ndarray]:
+        # Copies, so the previous snapshot stays unchanged for the readers still using it
+        ids = ids.tolist() + [None] * (count - old_count)
+        deleted = np.concatenate([deleted, np.zeros(count - old_count, dtype=bool)])
+        keys = {key for record in records for key in record.get("payload", ())} | set(payload)
+        columns = {key: np.concatenate([payload.get(key, np.full(old_count, None, dtype=object)),
+                                        np.full(count - old_count, None, dtype=object)])
+                   for key in keys}
+        row_of = dict(row_of)
+        for record in records:
+            row = record["row"]
+            if record.get("deleted"):
+                # A tombstone: the row stays in place, masked, until the vectors are compacted
+                deleted[row] = True
+                if row_of.get(record["id"]) == row:
+                    row_of.pop(record["id"])
+                continue
+            ids[row] = record["id"]
+            deleted[row] = False
+            for key, column in columns.items():
+                column[row] = record["payload"].get(key)
+            row_of[record["id"]] = row
+        return np.array(ids, dtype=str), columns, row_of, deleted
+
+    def is_stale(self) -> bool:
+        try:
+            return self.snapshot is None or self.read_meta()["version"] != self.snapshot.version
+        except FileNotFoundError:
+            return True
+
+
+class NumpyVectorEngine:
+    def __init__(self, directory: str, dtype: str = "float32", refresh_interval: float = 1.0):
+        """
+        In-process vector engine for small and medium catalogs.
+        Vectors are stored normalized, so a single matrix product gives cosine scores and
+        `argpartition` selects the top k. Every collection lives in its own directory and
+        is reloaded when another process publishes a change; writers serialize on a file lock.
+        Searches read an immutable snapshot, so they never see a write half applied.
+        :param directory: The directory holding the collections.
+        :param dtype: The storage dtype of new collections, "float32" or "float16".
+        :param refresh_interval: The minimum number of seconds between two change checks.
+        """
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.refresh_interval = refresh_interval
+        self._collections: dict[str, _Collection] = {}
+        self._checked_at: dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.directory, collection_name)
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self._path(collection_name), META_FILE))
+
+    def collection_names(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if self.collection_exists(name))
+
+    def _collection(self, collection_name: str, force_check: bool = False) -> _Collection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            now = time.monotonic()
+            if (collection is None or force_check
+                    or now - self._checked_at.get(collection_name, 0.0) > self.refresh_interval):
+                self._checked_at[collection_name] = now
+                if collection is None:
+                    if not self.collection_exists(collection_name):
+                        raise ValueError(f"Collection {collection_name} does not exist")
+                    collection = _Collection(self._path(collection_name))
+                    self._collections[collection_name] = collection
+                if collection.is_stale():
+                    collection.load()
+            return collection
+
+    def _snapshot(self, collection_name: str) -> _Snapshot:
+        return self._collection(collection_name).snapshot
+
+    def create_collection(self, collection_name: str, size: int):
+        path = self._path(collection_name)
+        os.makedirs(path, exist_ok=True)
+        with portalocker.Lock(os.path.join(path, LOCK_FILE), timeout=60):
+            if self.collection_exists(collection_name):
+                raise ValueError(f"Collection {collection_name} already exists")
+            open(os.path.join(path, VECTORS_FILE), "wb").close()
+            meta = {"dim": size, "dtype": self.dtype.name, "count": 0, "capacity": 0, "version": 0}
+            self._write_base(path, meta, np.empty(0, dtype=str), {})
+
+    @staticmethod
+    def _write_base(path: str, meta: dict, ids: np.ndarray, payload: dict[str, np.ndarray],
+                    vectors_file: Optional[str] = None):
+        """Write ids and payloads as a new base with an empty log, then publish it."""
+        generation = meta.get("generation", 0) + 1
+        files = {"vectors": vectors_file or _files(meta)["vectors"], "ids": f"ids.{generation}.npy",
+                 "payload": f"payload.{generation}.json", "log": f"rows.{generation}.log"}
+        _write_atomic(os.path.join(path, files["ids"]), lambda f: np.save(f, ids), mode="wb")
+        _write_atomic(os.path.join(path, files["payload"]),
+                      lambda f: json.dump({key: column.tolist() for key, column in payload.items()},
+                                          f, ensure_ascii=False))
+        open(os.path.join(path, files["log"]), "wb").close()
+        previous_files = sorted(name for name in _files(meta).values() if name)
+        published = {**meta, "count": len(ids), "version": meta["version"] + 1, "generation": generation,
+                     "files": files, "base_count": len(ids), "log_bytes": 0, "log_rows": 0,
+                     "previous_files": previous_files}
+        _write_atomic(os.path.join(path, META_FILE), lambda f: json.dump(published, f))
+        # Readers may still open the files of the previous base; older ones are no longer referenced
+        keep = set(files.values()) | set(previous_files)
+        for name in meta.get("previous_files", []):
+            if name not in keep and os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+
+    def upsert(self, collection_name: str, point_ids: list[str], vectors: list[list[float]], payloads: list[dict]):
+        path = self._path(collection_name)
+        with self._lock, portalocker.Lock(os.path.join(path, LOCK_FILE), timeout=60):
+            collection = self._collection(collection_name, force_check=True)
+            snapshot = collection.snapshot
+            meta = dict(snapshot.meta)
+            files = _files(meta)
+            point_ids = [str(point_id) for point_id in point_ids]
+            # Every point gets a new row, also when it exists: published rows are never written, so
+            # readers of older snapshots keep consistent vectors, and the old row becomes a tombstone
+            new_rows = {}
+            for point_id in point_ids:
+                new_rows.setdefault(point_id, snapshot.count + len(new_rows))
+            rows = [new_rows[point_id] for point_id in point_ids]
+
+            count = snapshot.count + len(new_rows)
+            if count > meta["capacity"]:
+                meta["capacity"] = max(count, meta["capacity"] * 2, 1024)
+                with open(os.path.join(path, files["vectors"]), "r+b") as f:
+                    f.truncate(meta["capacity"] * meta["dim"] * snapshot.dtype.itemsize)
+
+            # The rows lie past the published count, so readers only see them once meta.json is replaced
+            matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+            writable = np.memmap(os.path.join(path, files["vectors"]), dtype=snapshot.dtype, mode="r+",
+                                 shape=(meta["capacity"], meta["dim"]))
+            writable[rows] = matrix.astype(snapshot.dtype)
+            writable.flush()
+            del writable
+
+            meta["count"] = count
+            # Tombstones come first, so applying them does not unmap the new rows of the same ids
+            records = [{"id": point_id, "row": snapshot.row_of[point_id], "deleted": True}
+                       for point_id in new_rows if point_id in snapshot.row_of]
+            records += [{"id": point_id, "row": row, "payload": payload}
+                        for point_id, row, payload in zip(point_ids, rows, payloads)]
+            self._commit(path, snapshot, meta, records)
+            collection.load()
+
+    def _commit(self, path: str, snapshot: _Snapshot, meta: dict, records: list[dict]):
+        """Publish row writes and tombstones, in the log or, from time to time, as a new base."""
+        deleted_count = snapshot.deleted_count + sum(1 for record in records if record.get("deleted"))
+        if (_files(meta)["log"] is not None
+                and meta.get("log_rows", 0) + len(records) <= max(meta.get("base_count", 0), CHECKPOINT_MIN_ROWS)
+                and deleted_count <= meta["count"] * COMPACT_RATIO):
+            self._append_log(path, meta, records)
+            return
+        ids, payload, _, deleted = _Collection._apply(records, snapshot.ids, snapshot.payload, snapshot.row_of,
+                                                      snapshot.deleted, snapshot.count, meta["count"])
+        if deleted.any():
+            self._compact(path, meta, snapshot.dtype, ids, payload, deleted)
+        else:
+            self._write_base(path, meta, ids, payload)
+
+    def _compact(self, path: str, meta: dict, dtype: np.dtype, ids: np.ndarray, payload: dict[str, np.ndarray],
+                 deleted: np.ndarray):
+        """
+        Copy the live rows into a new vectors file and publish it as a new base.
+        The current file is never changed, so readers that still use it keep correct rows.
+        """
+        kept = np.flatnonzero(~deleted)
+        name = f"vectors.{meta.get('generation', 0) + 1}.bin"
+        tmp_path = os.path.join(path, f"{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.truncate(len(kept) * meta["dim"] * dtype.itemsize)
+        if len(kept):
+            source = np.memmap(os.path.join(path, _files(meta)["vectors"]), dtype=dtype, mode="r",
+                               shape=(meta["capacity"], meta["dim"]))
+            target = np.memmap(tmp_path, dtype=dtype, mode="r+", shape=(len(kept), meta["dim"]))
+            for start in range(0, len(kept), SCORE_BLOCK_ROWS):
+                target[start:start + SCORE_BLOCK_ROWS] = source[kept[start:start + SCORE_BLOCK_ROWS]]
+            target.flush()
+            del source, target
+        os.replace(tmp_path, os.path.join(path, name))
+        self._write_base(path, {**meta, "capacity": len(kept)}, ids[kept],
+                         {key: column[kept] for key, column in payload.items()}, vectors_file=name)
+
+    @staticmethod
+    def _append_log(path: str, meta: dict, records: list[dict]):
+        log_path = os.path.join(path, meta["files"]["log"])
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode()
+        with open(log_path, "r+b") as f:
+            # Drop whatever an interrupted writer appended after the committed end
+            f.truncate(meta["log_bytes"])
+            f.seek(meta["log_bytes"])
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        meta = {**meta, "version": meta["version"] + 1, "log_bytes": meta["log_bytes"] + len(data),
+                "log_rows": meta.get("log_rows", 0) + len(records)}
+        _write_atomic(os.path.join(path, META_FILE), lambda f: json.dump(meta, f))
+
+    def delete(self, collection_name: str, point_ids: list[str]):
+        """
+        Remove points. Their rows are marked deleted in the log and masked out of searches;
+        once enough rows are deleted, the live rows are compacted into a new vectors file.
+        """
+        path = self._path(collection_name)
+        with self._lock, portalocker.Lock(os.path.join(path, LOCK_FILE), timeout=60):
+            collection = self._collection(collection_name, force_check=True)
+            snapshot = collection.snapshot
+            records = [{"id": point_id, "row": snapshot.row_of[point_id], "deleted": True}
+                       for point_id in dict.fromkeys(map(str, point_ids)) if point_id in snapshot.row_of]
+            if not records:
+                return
+            self._commit(path, snapshot, dict(snapshot.meta), records)
+            collection.load()
+
+    def retrieve(self, collection_name: str, point_ids: list[str]) -> dict[str, np.ndarray]:
+        """Return the stored (normalized) vectors of the given points; unknown ids are left out."""
+        snapshot = self._snapshot(collection_name)
+        rows = {point_id: snapshot.row_of[point_id] for point_id in map(str, point_ids)
+                if point_id in snapshot.row_of}
+        if not rows:
+            return {}
+        matrix = np.asarray(snapshot.vectors[list(rows.values())], dtype=np.float32)
+        return dict(zip(rows, matrix))
+
+    def scroll(self, collection_name: str, batch_size: int) -> Iterator[tuple[list[str], np.ndarray, list[dict]]]:
+        """Iterate over the stored points as batches of (point ids, normalized vectors, payloads)."""
+        snapshot = self._collection(collection_name, force_check=True).snapshot
+        live = np.flatnonzero(~snapshot.deleted)
+        for start in range(0, len(live), batch_size):
+            rows = live[start:start + batch_size]
+            yield (snapshot.ids[rows].tolist(), np.asarray(snapshot.vectors[rows], dtype=np.float32),
+                   [snapshot.row_payload(row) for row in rows])
+
+    def search(self, collection_name: str, query_vectors: list[list[float]], top_k: int,
+               score_threshold: Optional[float] = None, filters: Optional[dict] = None) -> list[list[tuple]]:
+        """
+        Search several queries at once.
+        :return: For each query, a list of (point id, score, payload) tuples sorted by score.
+        """
+        snapshot = self._snapshot(collection_name)
+        if snapshot.count == 0:
+            return [[] for _ in query_vectors]
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32))
+        scores = snapshot.scores(queries)
+        mask = snapshot.mask(filters)
+        if mask is not None:
+            scores[~mask] = -np.inf
+        if snapshot.deleted_count:
+            scores[snapshot.deleted] = -np.inf
+
+        k = min(top_k, snapshot.count)
+        if k <= 0:
+            return [[] for _ in query_vectors]
+        results = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            hits = []
+            for row in top:
+                score = float(column[row])
+                if score == -np.inf or (score_threshold is not None and score < score_threshold):
+                    break
+                hits.append((str(snapshot.ids[row]), score, snapshot.row_payload(row)))
+            results.append(hits)
+        return results
@@ -0,0 +1,161 @@
+import uuid
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+import numpy as np
+
+# Namespace for point ids derived from Mongo ids, so re-ingesting an item overwrites its point
+POINT_ID_NAMESPACE = uuid.UUID("6f1d6a2e-3c1b-4f0e-9a57-2b8f3f0c9d41")
+
+
+# Languages every item is embedded in
+LANGUAGES = ("ar", "en")
+
+
+def point_id_for(mongo_id: str) -> str:
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, str(mongo_id)))
+
+
+class VectorLayout:
+    def __init__(self, collection: Optional[str] = None):
+        """
+        Where the vectors of an item live.
+        By default every language has its own collection ("items_ar", "items_en") of unnamed
+        vectors. With `collection` set, an item is a single point of that collection holding one
+        named vector per language, so writing an item is one upsert.
+        :param collection: The collection of the named layout, or None for one collection per language.
+        """
+        self.collection = collection
+
+    @property
+    def named(self) -> bool:
+        return self.collection is not None
+
+    def collections(self) -> list[str]:
+        return [self.collection] if self.named else [f"items_{lang}" for lang in LANGUAGES]
+
+    def target(self, lang: str) -> tuple[str, Optional[str]]:
+        """The collection and vector name searched for a query language."""
+        if self.named:
+            return self.collection, lang
+        return f"items_{lang}", None
+
+    def points(self, vectors: dict[str, list]) -> list[tuple[str, list]]:
+        """
+        Group the vectors of some items by the collection they are written to.
+        :param vectors: The vectors of the items by language, in the same item order.
+        :return: (collection, per-item vectors) pairs; named vectors are dicts by language.
+        """
+        if self.named:
+            return [(self.collection, [dict(zip(vectors, item_vectors)) for item_vectors in zip(*vectors.values())])]
+        return [(f"items_{lang}", lang_vectors) for lang, lang_vectors in vectors.items()]
+
+
+class VectorStore(ABC):
+    """Blocking vector backend used by ingestion and the command line tools."""
+
+    @abstractmethod
+    def close(self):
+        ...
+
+    @abstractmethod
+    def collection_exists(self, collection_name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def create_collection(self, collection_name: str = "items_ar", size: int = 384,
+                          vector_names: tuple[str, ...] = ()):
+        """Create a collection of unnamed vectors, or of the given named vectors."""
+
+    @abstractmethod
+    def insert_vector(self, vector: list | dict, payload: dict, collection_name: str, point_id: str = None) -> str:
+        ...
+
+    @abstractmethod
+    def insert_vectors(self, vectors: list[list] | list[dict], payloads: list[dict], collection_name: str,
+                       point_ids: list[str] = None, wait: bool = True) -> list[str]:
+        """Upsert points; a vector is a dict by vector name in a collection of named vectors."""
+
+    @abstractmethod
+    def delete_vectors(self, mongo_ids: list[str], collection_name: str):
+        """Delete the points of the given items; unknown items are ignored."""
+
+    @abstractmethod
+    def set_payloads(self, mongo_ids: list[str], payloads: list[dict], collection_name: str):
+        """Replace the payloads of the points of the given items, keeping their vectors; unknown items are ignored."""
+
+    @abstractmethod
+    def update_vectors(self, vectors: list[dict], payloads: list[dict], collection_name: str,
+                       point_ids: list[str]):
+        """Set some named vectors of points, keeping their other vectors; missing points are created."""
+
+    @abstractmethod
+    def scroll_vectors(self, collection_name: str, batch_size: int = 256,
+                       vector_name: Optional[str] = None) -> Iterator[tuple[list[str], list[np.ndarray]]]:
+        """Iterate over every stored vector as batches of (Mongo ids, vectors)."""
+
+    @abstractmethod
+    def search_vector(self, query_vector: list, collection_name: str,
+                      score_threshold: float, top_k: int,
+                      filters: dict = None, vector_name: Optional[str] = None) -> list[str]:
+        """Return the Mongo ids of the closest items, best first."""
+
+    @abstractmethod
+    def search_vectors(self, query_vectors: list[list], collection_name: str,
+                       score_threshold: float, top_k: int,
+                       filters: dict = None, vector_name: Optional[str] = None) -> list[list[str]]:
+        """Batch version of `search_vector`, one result list per query."""
+
+    @abstractmethod
+    def get_vectors(self, mongo_ids: list[str], collection_name: str,
+                    vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+        """Fetch the stored vectors of the given items in one call; missing items are left out."""
+
+
+class AsyncVectorStore(ABC):
+    """Asyncio vector backend used on the request path."""
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+    @abstractmethod
+    async def insert_vector(self, vector: list | dict, payload: dict, collection_name: str,
+                            point_id: str = None) -> str:
+        ...
+
+    @abstractmethod
+    async def insert_vectors(self, vectors: list[list] | list[dict], payloads: list[dict], collection_name: str,
+                             point_ids: list[str] = None) -> list[str]:
+        """Upsert points in one request; a vector is a dict by vector name in a collection of named vectors."""
+
+    @abstractmethod
+    async def delete_vectors(self, mongo_ids: list[str], collection_name: str):
+        """Delete the points of the given items; unknown items are ignored."""
+
+    @abstractmethod
+    async def set_payloads(self, mongo_ids: list[str], payloads: list[dict], collection_name: str):
+        """Replace the payloads of the points of the given items, keeping their vectors; unknown items are ignored."""
+
+    @abstractmethod
+    async def search_vector(self, query_vector: list, collection_name: str,
+                            score_threshold: float, top_k: int,
+                            filters: dict = None, vector_name: Optional[str] = None) -> list[str]:
+        """Return the Mongo ids of the closest items, best first."""
+
+    @abstractmethod
+    async def search_vectors(self, query_vectors: list[list], collection_name: str,
+                             score_threshold: float, top_k: int,
+                             filters: dict = None, vector_name: Optional[str] = None) -> list[list[str]]:
+        """Batch version of `search_vector`, one result list per query."""
+
+    @abstractmethod
+    async def search_vector_scored(self, query_vector: list, collection_name: str,
+                                   score_threshold: float, top_k: int,
+                                   filters: dict = None, vector_name: Optional[str] = None) -> list[tuple[str, float]]:
+        """Like `search_vector`, returning (Mongo id, cosine score) pairs."""
+
+    @abstractmethod
+    async def get_vectors(self, mongo_ids: list[str], collection_name: str,
+                          vector_name: Optional[str] = None) -> dict[str, np.ndarray]:
+        """Fetch the stored vectors of the given items in one call; missing items are left out."""
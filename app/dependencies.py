@@ -1,56 +1,77 @@
+import threading
+from typing import Optional
+
 from app.config import config
-from app.core.embed import CohereClient
+from app.container import Container
+from app.core.embed import AsyncCohereClient
 from app.core.llm import LLM
 from app.core.web_search import WebSearch
-from app.database.mongo import Mongo
-from app.database.qdrant import VectorDBClient
+from app.database.mongo import AsyncMongo
+from app.database.vector_store import AsyncVectorStore
+from app.services.ingest_service import IngestService
 from app.services.item_service import ItemService
 from app.services.llm_service import LLMService
 from app.services.similar import SimilarService
 from app.services.transaction_service import TransactionService
 
+_container: Optional[Container] = None
+_container_lock = threading.Lock()
+
+
+def get_container() -> Container:
+    """Return the process-wide container, creating it on first use."""
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = Container(config)
+    return _container
+
+
+async def close_container():
+    """Close the process-wide container, if one was created."""
+    global _container
+    with _container_lock:
+        container, _container = _container, None
+    if container is not None:
+        await container.close()
+
+
+def get_qdrant_client() -> AsyncVectorStore:
+    return get_container().async_vectordb
+
 
-def get_qdrant_client():
-    return VectorDBClient(host=config.VECTOR_DB_URI,
-                          port=config.VECTOR_DB_PORT)
+def get_llm() -> LLM:
+    return get_container().llm
 
 
-def get_llm():
-    return LLM(api_key=config.OPEN_AI_API)
+def get_cohere_client() -> AsyncCohereClient:
+    return get_container().async_cohere
 
 
-def get_cohere_client():
-    return CohereClient(api_key=config.COHERE_API_KEY)
+def get_mongo_client() -> AsyncMongo:
+    return get_container().async_mongo
 
 
-def get_mongo_client():
-    return Mongo(uri=config.MONGO_URI, db_name=config.MONGO_DB_NAME)
+def get_llm_service() -> LLMService:
+    return get_container().llm_service
 
 
-def get_llm_service():
-    return LLMService(llm=LLM(api_key=config.OPEN_AI_API),
-                      search_service=similar_service(),
-                      web_search_service=get_web_search_service(),
-                      item_service=item_service())
+def get_web_search_service() -> WebSearch:
+    return get_container().web_search
 
 
-def get_web_search_service():
-    return WebSearch(api_key=config.TAVILYAPI_KEY)
+def item_service() -> ItemService:
+    return get_container().item_service
 
 
-def item_service():
-    return ItemService(mongo=get_mongo_client(),
-                       cohere=get_cohere_client(),
-                       vectordb=get_qdrant_client())
+def ingest_service() -> IngestService:
+    return get_container().ingest_service
 
 
-def transaction_service():
-    return TransactionService(mongo=get_mongo_client())
+def transaction_service() -> TransactionService:
+    return get_container().transaction_service
 
 
-def similar_service():
-    return SimilarService(mongo=get_mongo_client(),
-                          cohere=get_cohere_client(),
-                          vectordb=get_qdrant_client(),
-                          web_search_service=get_web_search_service(),
-                          item_service=item_service())
+def similar_service() -> SimilarService:
+    return get_container().similar_service
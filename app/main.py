@@ -1,9 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routes import items, transactions, similar, llm
+from app.config import config
+from app.core.tracing import TracingMiddleware, metrics
+from app.dependencies import close_container, get_container
+from app.routes import items, transactions, similar, llm, monitoring
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create every client once per worker process and close them on shutdown
+    container = get_container()
+    await container.co_purchase.ensure_indexes()
+    await container.conversations.ensure_indexes()
+    if config.CO_PURCHASE_BUILD_IF_EMPTY:
+        app.state.co_purchase_build_task = asyncio.create_task(container.co_purchase.rebuild_if_empty())
+    if config.IMAGE_PREGENERATE_THUMBNAILS:
+        app.state.thumbnail_task = asyncio.create_task(asyncio.to_thread(container.images.generate_thumbnails))
+    if config.PROMPT_WATCH:
+        app.state.prompt_watch_task = asyncio.create_task(container.prompts.watch())
+    if config.VECTOR_SYNC_ENABLED:
+        app.state.vector_sync_task = asyncio.create_task(container.vector_sync.run())
+    if config.WEB_SEARCH_PREWARM_ITEMS:
+        app.state.web_search_prewarm_task = asyncio.create_task(container.similar_service.prewarm_web_search(
+            config.WEB_SEARCH_PREWARM_ITEMS, concurrency=config.WEB_SEARCH_PREWARM_CONCURRENCY))
+    yield
+    if config.CO_PURCHASE_BUILD_IF_EMPTY:
+        app.state.co_purchase_build_task.cancel()
+    if config.PROMPT_WATCH:
+        app.state.prompt_watch_task.cancel()
+    if config.VECTOR_SYNC_ENABLED:
+        app.state.vector_sync_task.cancel()
+    if config.WEB_SEARCH_PREWARM_ITEMS:
+        app.state.web_search_prewarm_task.cancel()
+    await close_container()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -14,7 +50,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timings, request histograms and the sampled slow request log
+metrics.enabled = config.TRACE_ENABLED
+app.add_middleware(
+    TracingMiddleware,
+    server_timing=config.TRACE_SERVER_TIMING,
+    slow_request_ms=config.TRACE_SLOW_REQUEST_MS,
+    slow_sample_rate=config.TRACE_SLOW_SAMPLE_RATE,
+)
+
 app.include_router(items.router, prefix="/api")
 app.include_router(transactions.router, prefix="/api")
 app.include_router(similar.router, prefix="/api")
 app.include_router(llm.router, prefix="/api")
+app.include_router(monitoring.router)
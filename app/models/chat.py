@@ -10,3 +10,6 @@ class Chat(BaseModel):
     filters: Optional[dict] = Field(description="The filters to apply to the search results.", default=None)
     search: Optional[bool] = Field(description="Whether to perform a web search.", default=False)
     conversation_id: Optional[str] = Field(description="The conversation ID to track the chat history.", default=None)
+    prompt: Optional[str] = Field(description="The prompt name to use, the configured default if omitted.",
+                                  default=None)
+    prompt_version: Optional[int] = Field(description="The prompt version, the latest if omitted.", default=None)
@@ -1,9 +1,14 @@
 # app/models/item.py
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field
 from pyobjectID import MongoObjectId
 
+# Fields a client can ask for with `fields=`; `_id` is always returned
+ItemField = Literal["name_ar", "name_en", "description_ar", "description_en", "color_ar", "color_en",
+                    "material", "price", "image_url", "image"]
+Language = Literal["ar", "en"]
+
 
 class Item(BaseModel):
     name_ar: str
@@ -18,4 +23,25 @@ class Item(BaseModel):
 
 class GetItem(Item):
     id: MongoObjectId = Field(alias="_id")
-    image: Optional[bytes] = Field(default=None)
+    image_url: Optional[str] = Field(default=None)
+    image: Optional[bytes] = Field(default=None, description="Base64 image bytes, only set in the legacy inline mode.")
+
+
+class ListingItem(BaseModel):
+    id: str = Field(alias="_id")
+    name: str = Field(description="The name in the requested language.")
+    price: float
+    image_url: Optional[str] = Field(default=None)
+
+
+class ItemView(BaseModel):
+    profile: Literal["full", "listing"] = Field(
+        default="full",
+        description="'full' returns every item field; 'listing' returns only id, name, price and image URL.")
+    fields: Optional[list[ItemField]] = Field(default=None,
+                                              description="Return only these fields; overrides the profile.")
+    lang: Optional[Language] = Field(default=None, description="Language of the listing `name`, English if omitted.")
+
+    @property
+    def full(self) -> bool:
+        return self.profile == "full" and not self.fields
@@ -1,6 +1,10 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class Message(BaseModel):
     question: str = Field(description="The question to add.")
-    answer: str = Field(description="The answer to add.")
\ No newline at end of file
+    answer: str = Field(description="The answer to add.")
+    created_at: Optional[datetime] = Field(default=None, description="When the answer was given.")
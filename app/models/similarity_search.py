@@ -1,10 +1,39 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field
 
+from app.models.item import GetItem, ItemField, ItemView, Language
+
 
 class SimilaritySearch(BaseModel):
     query: str
     limit: int
     score_threshold: float
-    filters: Optional[dict] = Field(default=None)
\ No newline at end of file
+    filters: Optional[dict] = Field(default=None)
+    inline_images: bool = Field(default=False, description="Embed base64 image bytes instead of only image URLs.")
+    mode: Literal["cascade", "hybrid"] = Field(
+        default="cascade",
+        description="'cascade' returns reranked full-text hits followed by vector hits; "
+                    "'hybrid' runs both retrievers and fuses them into one ranked list.")
+    fusion: Literal["rrf", "weighted"] = Field(
+        default="rrf", description="Hybrid fusion: reciprocal-rank fusion or weighted normalized scores.")
+    text_weight: float = Field(default=0.5, ge=0, le=1,
+                               description="Weight of the full-text ranking in hybrid mode; the vector ranking "
+                                           "gets the rest.")
+    profile: Literal["full", "listing"] = Field(
+        default="full",
+        description="'full' returns every item field; 'listing' returns only id, name, price and image URL.")
+    fields: Optional[list[ItemField]] = Field(default=None,
+                                              description="Return only these item fields; overrides the profile.")
+    lang: Optional[Language] = Field(default=None,
+                                     description="Language of the listing `name`, the query language if omitted.")
+
+    def view(self, lang: Language) -> ItemView:
+        return ItemView(profile=self.profile, fields=self.fields, lang=self.lang or lang)
+
+
+class ScoredItem(GetItem):
+    score: float = Field(description="The fused hybrid score.")
+    scores: dict[str, float] = Field(default_factory=dict,
+                                     description="Raw score per retriever: 'text' (textScore), 'vector' (cosine).")
+    ranks: dict[str, int] = Field(default_factory=dict, description="1-based rank per retriever.")
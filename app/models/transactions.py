@@ -1,10 +1,28 @@
 # app/models/transaction.py
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional
 
 import pyobjectID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+
+# ObjectIds hold the creation time as unsigned seconds since the Unix epoch
+MIN_TIMESTAMP = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MAX_TIMESTAMP = datetime(2106, 2, 7, tzinfo=timezone.utc)
 
 
 class Transaction(BaseModel):
     user_id: pyobjectID.PyObjectId
     items: List[pyobjectID.PyObjectId]
+    timestamp: Optional[datetime] = Field(default=None,
+                                          description="When the purchase happened, now if omitted; UTC if no "
+                                                      "timezone is given.")
+
+    @field_validator("timestamp")
+    @classmethod
+    def utc_timestamp(cls, timestamp: Optional[datetime]) -> Optional[datetime]:
+        if timestamp is None:
+            return None
+        timestamp = timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp
+        if not MIN_TIMESTAMP <= timestamp < MAX_TIMESTAMP:
+            raise ValueError("timestamp is outside the range of ObjectId times")
+        return timestamp
@@ -1,24 +1,119 @@
 # app/routes/items.py
-from typing import Dict
+import asyncio
+import io
+import os
+from typing import Dict, Literal, Optional
 
-from fastapi import APIRouter
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse
+from pydantic import ValidationError
 from pyobjectID import PyObjectId
 
-from app.dependencies import item_service
-from app.models.item import Item
+from app.config import config
+from app.dependencies import item_service, ingest_service
+from app.models.item import Item, ItemView, Language
+from app.services.ingest_service import AsyncByteReader, CheckpointMismatch, IngestService, read_records
+from app.services.item_service import ItemService
 
 router = APIRouter()
 
+def item_view(profile: Literal["full", "listing"] = "full",
+              fields: Optional[str] = Query(default=None,
+                                            description="Comma separated item fields, e.g. name_en,price,image_url."),
+              lang: Optional[Language] = None) -> ItemView:
+    """The response profile or field selection given in the query string."""
+    try:
+        return ItemView(profile=profile, fields=fields.split(",") if fields else None, lang=lang)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
 
 @router.post("/items/")
-async def create_item(item: Item) -> Dict[str, str]:
+async def create_item(item: Item, service: ItemService = Depends(item_service)) -> Dict[str, str]:
     # Insert item into MongoDB
-    inserted_id = item_service().insert(item)
+    inserted_id = await service.insert(item)
     return {"item_id": str(inserted_id)}
 
 
-@router.get("/items/{item_id}")
-async def get_item(item_id: PyObjectId):
-    # Get item from MongoDB
-    item = item_service().get_item(item_id)
+@router.post("/items/bulk")
+async def create_items_bulk(request: Request, format: Optional[Literal["jsonl", "csv"]] = None,
+                            checkpoint: Optional[str] = Query(default=None, pattern=r"^[\w-]+$"),
+                            service: IngestService = Depends(ingest_service)) -> dict:
+    """
+    Bulk-load items streamed as JSONL or CSV in the request body.
+
+    The body is parsed and ingested while it is being received.
+
+    :param format: The body format, inferred from the content type when omitted.
+    :param checkpoint: Optional checkpoint name; re-posting the same body with it resumes an interrupted load.
+    :return: The ingestion report.
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "jsonl")
+    checkpoint_path = None
+    if checkpoint:
+        os.makedirs(config.INGEST_CHECKPOINT_DIR, exist_ok=True)
+        checkpoint_path = os.path.join(config.INGEST_CHECKPOINT_DIR, f"{checkpoint}.json")
+    # The pipeline reads the body while it is received, so parsing and the write stages overlap the upload
+    body = io.BufferedReader(AsyncByteReader(request.stream(), asyncio.get_running_loop()))
+    try:
+        report = await run_in_threadpool(service.ingest, read_records(body, fmt), checkpoint_path)
+    except CheckpointMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return report
+
+
+@router.get("/items/{item_id}", response_class=ORJSONResponse)
+async def get_item(item_id: PyObjectId, inline_image: bool = False, view: ItemView = Depends(item_view),
+                   service: ItemService = Depends(item_service)):
+    # Get item from MongoDB, reading only the fields of the view
+    item = await service.get_item(item_id, inline_image=inline_image, view=view)
+    if not view.full:
+        # Already plain JSON types
+        return ORJSONResponse(item)
     return item
+
+
+@router.get("/items/{item_id}/image")
+async def get_item_image(item_id: PyObjectId, request: Request, width: Optional[int] = None,
+                         service: ItemService = Depends(item_service)):
+    """
+    Serve the image of an item straight from disk.
+
+    Supports conditional requests (ETag / Last-Modified) and byte ranges.
+
+    :param width: Optional thumbnail width, one of the configured thumbnail sizes.
+    """
+    image_path = await service.get_image_path(item_id, width=width)
+    if image_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    try:
+        # The image index may be a few seconds stale, so the file can be gone
+        stat = await asyncio.to_thread(os.stat, image_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": f"public, max-age={config.IMAGE_CACHE_MAX_AGE}",
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image_path, headers=headers, stat_result=stat)
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -1,22 +1,73 @@
 # app/routes/llm.py
+import json
+from typing import AsyncIterator
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
+from app.core.llm import NoAnswerError
 from app.dependencies import get_llm_service
 from app.models.chat import Chat
+from app.services.llm_service import LLMService
 
 router = APIRouter()
 
 
 @router.post("/chat")
-def chat(chat_request: Chat):
-    answer = get_llm_service().chat(
+async def chat(chat_request: Chat, service: LLMService = Depends(get_llm_service)):
+    try:
+        answer = await service.chat(
+            limit=chat_request.limit,
+            query=chat_request.query,
+            score_threshold=chat_request.score_threshold,
+            filters=chat_request.filters,
+            search=chat_request.search,
+            conversation_id=chat_request.conversation_id,
+            prompt=chat_request.prompt,
+            prompt_version=chat_request.prompt_version
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except NoAnswerError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return answer
+
+
+@router.post("/chat/stream")
+async def chat_stream(chat_request: Chat, service: LLMService = Depends(get_llm_service)) -> StreamingResponse:
+    """
+    Chat over server-sent events.
+
+    Emits a `results` event with the retrieved items, `token` events with answer text
+    while it is generated, and a final `done` event with the answer, item id and
+    conversation id. Failures after the stream started are sent as an `error` event.
+    """
+    events = service.chat_stream(
         limit=chat_request.limit,
         query=chat_request.query,
         score_threshold=chat_request.score_threshold,
         filters=chat_request.filters,
         search=chat_request.search,
-        conversation_id=chat_request.conversation_id
+        conversation_id=chat_request.conversation_id,
+        prompt=chat_request.prompt,
+        prompt_version=chat_request.prompt_version
     )
-    return answer
+    return StreamingResponse(_sse(events), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/chat/cache")
+async def chat_cache_stats(service: LLMService = Depends(get_llm_service)) -> dict:
+    """Hit-rate counters of the semantic answer cache."""
+    if service.semantic_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **service.semantic_cache.stats()}
+
 
+async def _sse(events: AsyncIterator[tuple[str, dict]]) -> AsyncIterator[str]:
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
@@ -0,0 +1,16 @@
+# app/routes/monitoring.py
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.container import Container
+from app.core.tracing import metrics
+from app.dependencies import get_container
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(container: Container = Depends(get_container)) -> PlainTextResponse:
+    """Latency histograms, external call counts and cache hit ratios in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(container.cache_stats()),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
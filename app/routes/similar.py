@@ -1,35 +1,50 @@
 # app/routes/similar.py
 from typing import Dict, List, Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
 from pyobjectID import PyObjectId
 
 from app.dependencies import similar_service
-from app.models.item import GetItem
-from app.models.similarity_search import SimilaritySearch
+from app.models.item import GetItem, ItemView
+from app.models.similarity_search import ScoredItem, SimilaritySearch
+from app.routes.items import item_view
+from app.services.similar import SimilarService
 
 router = APIRouter()
 
 
-@router.post("/search")
-def search_items(query: SimilaritySearch) -> dict[str, list[GetItem] | list[Any] | list]:
+@router.post("/search", response_class=ORJSONResponse)
+async def search_items(query: SimilaritySearch,
+                       service: SimilarService = Depends(similar_service)
+                       ) -> dict[str, list[ScoredItem] | list[GetItem] | list[Any] | list]:
     """
     Search for items similar to the provided query.
 
+    With `mode="hybrid"`, full-text and vector results are fused into `results`,
+    each with its fused `score` and per-retriever `scores` and `ranks`.
+    With `profile="listing"` or `fields`, only those fields are read from Mongo and returned.
+
     :param query: The query to search for.
     :return: Dictionary containing the search results.
     """
-    items = similar_service().search(query)
+    items = await service.search(query)
+    if not query.view("en").full:
+        # Already plain JSON types; skip the response model validation
+        return ORJSONResponse(items)
     return items
 
 
-@router.get("/related_transaction/{item_id}")
-async def get_related_items(item_id: PyObjectId) -> Dict[str, List]:
-    related_items = similar_service().get_related_transaction(item_id)
+@router.get("/related_transaction/{item_id}", response_class=ORJSONResponse)
+async def get_related_items(item_id: PyObjectId, inline_images: bool = False, view: ItemView = Depends(item_view),
+                            service: SimilarService = Depends(similar_service)) -> Dict[str, List]:
+    related_items = await service.get_related_transaction(item_id, inline_images=inline_images, view=view)
+    if not view.full:
+        return ORJSONResponse({"results": related_items})
     return {"results": related_items}
 
 
 @router.get("/web_search/{item_id}")
-async def search_web(item_id: PyObjectId):
-    related_items = similar_service().web_search(item_id)
+async def search_web(item_id: PyObjectId, service: SimilarService = Depends(similar_service)):
+    related_items = await service.web_search(item_id)
     return related_items
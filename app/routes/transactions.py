@@ -1,13 +1,38 @@
 # app/routes/transactions.py
-from fastapi import APIRouter
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 from app.dependencies import transaction_service
 from app.models.transactions import Transaction
+from app.services.transaction_service import TransactionService, read_json_records
 
 router = APIRouter()
 
 
 @router.post("/transactions/")
-async def create_transaction(transaction: Transaction):
-    transaction_id = transaction_service().create_transaction(transaction)
+async def create_transaction(transaction: Transaction,
+                             service: TransactionService = Depends(transaction_service)):
+    transaction_id = await service.create_transaction(transaction)
     return {"transaction_id": transaction_id}
+
+
+@router.post("/transactions/bulk")
+async def create_transactions_bulk(request: Request, format: Optional[Literal["ndjson", "json"]] = None,
+                                   chunk_size: Optional[int] = Query(default=None, ge=1, le=100000),
+                                   service: TransactionService = Depends(transaction_service)) -> dict:
+    """
+    Bulk-load transactions streamed as NDJSON or a JSON array in the request body.
+
+    The body is parsed and written while it is being received.
+
+    :param format: The body format, inferred from the content type when omitted.
+    :param chunk_size: The number of transactions per write, the configured size when omitted.
+    :return: The ingestion report; a 400 carries the same report if the body is malformed.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("json" if content_type.startswith("application/json") else "ndjson")
+    report = await service.bulk_create(read_json_records(request.stream(), fmt), chunk_size=chunk_size)
+    if "error" in report:
+        raise HTTPException(status_code=400, detail=report)
+    return report
@@ -0,0 +1,181 @@
+import logging
+import math
+from datetime import datetime, timezone
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+from app.database.mongo import AsyncMongo
+
+logger = logging.getLogger(__name__)
+
+# Decayed scores are base-2 logarithms of weights counted from this instant
+DECAY_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DAY_SECONDS = 86400
+# Floor of a summed weight before its logarithm is taken; purchases that old no longer count
+MIN_WEIGHT = 1e-300
+
+
+def log2_add(a: float, b: float) -> float:
+    """log2(2 ** a + 2 ** b), without computing either power."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1.0 + math.pow(2.0, low - high))
+
+
+class CoPurchaseIndex:
+    def __init__(self, mongo: AsyncMongo, collection: str = "item_pairs",
+                 half_life_days: Optional[float] = None):
+        """
+        Materialized item-to-item co-purchase counts.
+        Every (item, related item) pair bought in the same transaction has one document
+        holding the raw `count` and a `score` used for ranking. With a half-life, every
+        purchase weighs 2 ** (age_of_epoch / half_life), so newer purchases weigh exponentially
+        more, and the score is the base-2 logarithm of the summed weights. Ranking by score then
+        equals ranking by decayed count, and the score grows linearly with time instead of
+        overflowing. Without a half-life the score is the count.
+        :param mongo: The Mongo client.
+        :param collection: The collection holding the pair documents.
+        :param half_life_days: Optional half-life of a purchase, in days; None disables decay.
+        """
+        self.mongo = mongo
+        self.collection = collection
+        self.half_life_days = half_life_days
+
+    async def ensure_indexes(self, collection: Optional[str] = None):
+        collection = collection or self.collection
+        await self.mongo.create_index(collection, [("item_id", ASCENDING), ("related_id", ASCENDING)],
+                                      unique=True)
+        await self.mongo.create_index(collection, [("item_id", ASCENDING), ("score", DESCENDING)])
+
+    def log_weight(self, timestamp: datetime) -> float:
+        """The base-2 logarithm of the weight of a purchase made at `timestamp`."""
+        age_days = (timestamp - DECAY_EPOCH).total_seconds() / DAY_SECONDS
+        return age_days / self.half_life_days
+
+    async def record(self, items: list[ObjectId], timestamp: datetime):
+        """
+        Add one transaction's items to the index.
+        :param items: The items bought together.
+        :param timestamp: When the transaction happened.
+        """
+        await self.record_many([(items, timestamp)])
+
+    async def record_many(self, transactions: list[tuple[list[ObjectId], datetime]]):
+        """
+        Add many transactions to the index with one bulk write.
+        Increments of the same pair are summed first, so each pair is written once.
+        :param transactions: (items bought together, timestamp) pairs.
+        """
+        increments: dict[tuple[ObjectId, ObjectId], list] = {}
+        for items, timestamp in transactions:
+            unique_items = list(dict.fromkeys(items))
+            if len(unique_items) < 2:
+                continue
+            weight = self.log_weight(timestamp) if self.half_life_days else None
+            for item_id in unique_items:
+                for related_id in unique_items:
+                    if item_id != related_id:
+                        increment = increments.setdefault((item_id, related_id), [0, None])
+                        increment[0] += 1
+                        if weight is None:
+                            increment[1] = increment[0]
+                        elif increment[1] is None:
+                            increment[1] = weight
+                        else:
+                            increment[1] = log2_add(increment[1], weight)
+        if not increments:
+            return
+        operations = [
+            UpdateOne({"item_id": item_id, "related_id": related_id}, self._increment(count, score), upsert=True)
+            for (item_id, related_id), (count, score) in increments.items()
+        ]
+        await self.mongo.bulk_write(self.collection, operations, ordered=False)
+
+    def _increment(self, count: int, score: float):
+        if not self.half_life_days:
+            return {"$inc": {"count": count, "score": score}}
+        # Pipeline update: the stored log-score and the increment are added in linear space,
+        # relative to the larger of the two, so no power ever overflows
+        high = {"$max": ["$score", score]}
+        low = {"$min": ["$score", score]}
+        added = {"$add": [high, {"$log": [{"$add": [1, {"$pow": [2, {"$subtract": [low, high]}]}]}, 2]}]}
+        return [{"$set": {
+            "count": {"$add": [{"$ifNull": ["$count", 0]}, count]},
+            "score": {"$cond": [{"$eq": [{"$type": "$score"}, "missing"]}, score, added]},
+        }}]
+
+    async def top_k(self, item_id: ObjectId, k: int = 10) -> list[ObjectId]:
+        """Return the ids of the items most often bought with `item_id`, best first."""
+        pairs = await self.mongo.find_many(self.collection, {"item_id": item_id},
+                                           sort=[("score", DESCENDING)], limit=k)
+        return [pair["related_id"] for pair in pairs]
+
+    async def popular(self, limit: int) -> list[ObjectId]:
+        """Return the ids of the items with the highest total co-purchase score, best first."""
+        score = "$score"
+        if self.half_life_days:
+            # Summed as weights relative to now, which are at most the decayed counts
+            score = {"$pow": [2, {"$subtract": ["$score", self.log_weight(datetime.now(timezone.utc))]}]}
+        pipeline = [
+            {"$group": {"_id": "$item_id", "score": {"$sum": score}}},
+            {"$sort": {"score": DESCENDING}},
+            {"$limit": limit},
+        ]
+        results = await self.mongo.aggregate(collection=self.collection, pipeline=pipeline)
+        return [result["_id"] for result in results]
+
+    async def rebuild(self, transactions_collection: str = "transactions"):
+        """
+        Recompute the whole index from the transactions collection.
+        The result is written to a staging collection and swapped in with a rename,
+        so readers keep using the old index until the new one is complete. Transactions
+        recorded while the rebuild runs only reach the old collection, so run it when
+        ingestion is quiet.
+        """
+        staging = f"{self.collection}_rebuild"
+        score = "$score"
+        if self.half_life_days:
+            # Weights are summed relative to now, so they never exceed 1, then turned into log-scores
+            now = datetime.now(timezone.utc)
+            age_ms = {"$subtract": [{"$toDate": "$_id"}, now]}
+            weight = {"$pow": [2, {"$divide": [age_ms, self.half_life_days * DAY_SECONDS * 1000]}]}
+            score = {"$add": [self.log_weight(now), {"$log": [{"$max": ["$score", MIN_WEIGHT]}, 2]}]}
+        else:
+            weight = {"$literal": 1}
+        pipeline = [
+            {"$project": {"a": {"$setUnion": ["$items", []]}, "b": {"$setUnion": ["$items", []]},
+                          "weight": weight}},
+            {"$unwind": "$a"},
+            {"$unwind": "$b"},
+            {"$match": {"$expr": {"$ne": ["$a", "$b"]}}},
+            {"$group": {"_id": {"item_id": "$a", "related_id": "$b"},
+                        "count": {"$sum": 1}, "score": {"$sum": "$weight"}}},
+            {"$project": {"_id": 0, "item_id": "$_id.item_id", "related_id": "$_id.related_id",
+                          "count": 1, "score": score}},
+            {"$out": staging},
+        ]
+        await self.mongo.aggregate(collection=transactions_collection, pipeline=pipeline, allowDiskUse=True)
+        await self.ensure_indexes(staging)
+        await self.mongo.rename(staging, self.collection, drop_target=True)
+
+    async def rebuild_if_empty(self, transactions_collection: str = "transactions") -> bool:
+        """
+        Build the index from the transaction history when it is empty but transactions exist,
+        e.g. on the first start after upgrading to the index.
+        Several worker processes may start it at once; the one that loses the final rename
+        only logs a warning, since the index is then already built.
+        :return: Whether the index was built.
+        """
+        if await self.mongo.find_one(self.collection, {}, projection={"_id": 1}) is not None:
+            return False
+        if await self.mongo.find_one(transactions_collection, {}, projection={"_id": 1}) is None:
+            return False
+        logger.info("Co-purchase index is empty, building it from %s", transactions_collection)
+        try:
+            await self.rebuild(transactions_collection)
+        except OperationFailure:
+            logger.warning("Co-purchase index build failed", exc_info=True)
+            return False
+        return True
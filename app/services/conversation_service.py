@@ -0,0 +1,146 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.tokens import TokenCounter
+from app.database.mongo import AsyncMongo
+from app.models.message import Message
+
+# Share of the history budget kept for the questions of turns that no longer fit
+SUMMARY_SHARE = 0.25
+
+
+class Session:
+    def __init__(self, budget: int, tokens: TokenCounter):
+        """
+        The rolling history of one conversation, kept within `budget` tokens.
+        The most recent turns are kept whole; when they no longer fit, the oldest turn is
+        dropped and only its question is kept in a one-line summary of earlier questions.
+        :param budget: The maximum number of tokens of the rendered history.
+        :param tokens: The token counter.
+        """
+        self.budget = budget
+        self.tokens = tokens
+        self.turns: list[tuple[Message, str, int]] = []  # Oldest first, with the rendered turn and its tokens
+        self.earlier_questions: list[str] = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.loaded_at = time.monotonic()
+
+    def __bool__(self) -> bool:
+        return bool(self.turns)
+
+    @property
+    def last_question(self) -> Optional[str]:
+        return self.turns[-1][0].question if self.turns else None
+
+    @property
+    def size(self) -> int:
+        return self.summary_tokens + sum(count for _, _, count in self.turns)
+
+    def add(self, message: Message):
+        # A single turn never takes more than the whole budget
+        text = self.tokens.truncate(f"Q: {message.question}\nA: {message.answer}", self.budget)
+        self.turns.append((message, text, self.tokens.count(text)))
+        while len(self.turns) > 1 and self.size > self.budget:
+            oldest, _, _ = self.turns.pop(0)
+            self.earlier_questions.append(oldest.question)
+            self._summarize()
+
+    def _summarize(self):
+        # Keep the most recent earlier questions that fit in the summary share
+        limit = int(self.budget * SUMMARY_SHARE)
+        questions = []
+        for question in reversed(self.earlier_questions):
+            candidate = "Earlier questions: " + "; ".join([question, *questions])
+            if self.tokens.count(candidate) > limit:
+                break
+            questions.insert(0, question)
+        self.earlier_questions = questions
+        self.summary = "Earlier questions: " + "; ".join(questions) if questions else ""
+        self.summary_tokens = self.tokens.count(self.summary) if questions else 0
+
+    def lines(self) -> list[str]:
+        """The summary and the turns, oldest first."""
+        lines = [self.summary] if self.summary else []
+        return lines + [text for _, text, _ in self.turns]
+
+    def render(self) -> str:
+        """The history as prompt text, oldest first."""
+        return "\n".join(self.lines())
+
+
+class ConversationService:
+    def __init__(self, mongo: AsyncMongo, tokens: TokenCounter, token_budget: int = 1500,
+                 history_limit: int = 10, max_sessions: int = 1000, ttl: float = 300.0,
+                 collection: str = "messages"):
+        """
+        Conversation sessions for chat.
+        Messages are written to Mongo with a timestamp and added to an in-process LRU of
+        sessions, so a turn only reads the history from Mongo when its session is not cached.
+        A cached session is reloaded after `ttl` seconds, which bounds how stale it can be
+        when turns of one conversation are served by different worker processes.
+        :param mongo: The Mongo client.
+        :param tokens: The token counter used for the history budget.
+        :param token_budget: The maximum number of tokens of the history in the prompt.
+        :param history_limit: The number of latest messages read when a session is loaded.
+        :param max_sessions: The maximum number of cached sessions.
+        :param ttl: The number of seconds a cached session is used before it is reloaded.
+        :param collection: The collection holding the messages.
+        """
+        self.mongo = mongo
+        self.tokens = tokens
+        self.token_budget = token_budget
+        self.history_limit = history_limit
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.collection = collection
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+
+    async def ensure_indexes(self):
+        await self.mongo.create_index(self.collection, [("conversation_id", ASCENDING), ("created_at", DESCENDING)])
+
+    async def create(self) -> str:
+        """Create a conversation and cache its empty session."""
+        result = await self.mongo.insert(collection="conversations", data={"created_at": datetime.now(timezone.utc)})
+        conversation_id = str(result.inserted_id)
+        self._cache(conversation_id, Session(self.token_budget, self.tokens))
+        return conversation_id
+
+    async def history(self, conversation_id: str) -> Session:
+        """
+        Get the budgeted history of a conversation.
+        :param conversation_id: The conversation ID.
+        :return: The session, loaded from Mongo when it is not cached or expired.
+        """
+        session = self._sessions.get(conversation_id)
+        if session is not None and time.monotonic() - session.loaded_at < self.ttl:
+            self._sessions.move_to_end(conversation_id)
+            return session
+        messages = await self.mongo.get_messages(collection=self.collection,
+                                                 query={"conversation_id": ObjectId(conversation_id)},
+                                                 limit=self.history_limit)
+        session = Session(self.token_budget, self.tokens)
+        for message in reversed(messages):
+            session.add(Message(**message))
+        self._cache(conversation_id, session)
+        return session
+
+    async def append(self, conversation_id: str, question: str, answer: str):
+        """Write a question and answer pair and add it to the cached session, if any."""
+        message = Message(question=question, answer=answer, created_at=datetime.now(timezone.utc))
+        await self.mongo.insert(collection=self.collection,
+                                data={**message.model_dump(), "conversation_id": ObjectId(conversation_id)})
+        session = self._sessions.get(conversation_id)
+        if session is not None:
+            session.add(message)
+
+    def _cache(self, conversation_id: str, session: Session):
+        self._sessions[conversation_id] = session
+        self._sessions.move_to_end(conversation_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -0,0 +1,330 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+from itertools import islice
+from typing import IO, AsyncIterable, Iterable, Iterator, Optional
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.clean_text import clean_arabic_text
+from app.core.embed import CohereClient
+from app.database.mongo import Mongo
+from app.database.vector_store import VectorLayout, VectorStore, point_id_for
+from app.models.item import Item
+from app.services.item_service import EMBED_MODEL, ItemService
+
+# Mongo error code for a duplicate _id, raised when a chunk is replayed after a resume
+DUPLICATE_KEY_ERROR = 11000
+
+# Marks the end of the stream between pipeline stages
+_DONE = object()
+
+
+class CheckpointMismatch(ValueError):
+    """A checkpoint written with another chunk size, whose in-flight offsets do not line up."""
+
+
+def read_records(stream: IO[bytes], fmt: str = "jsonl") -> Iterator[dict | ValueError]:
+    """
+    Stream records from a binary file object without loading it into memory.
+    JSONL lines that are not valid JSON are yielded as the `ValueError` describing them,
+    so a single bad line is rejected without aborting the load.
+    :param stream: The binary stream to read from.
+    :param fmt: The input format, either "jsonl" or "csv".
+    :return: An iterator over the parsed records.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+    elif fmt == "jsonl":
+        for line in text:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield ValueError(f"Invalid JSON: {e}")
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+class AsyncByteReader(io.RawIOBase):
+    def __init__(self, chunks: AsyncIterable[bytes], loop: asyncio.AbstractEventLoop):
+        """
+        Blocking binary file object over an async byte stream, e.g. a request body, for a worker thread.
+        Every read pulls the next chunk from the event loop, so the stream is consumed only as fast as
+        it is parsed and at most one chunk is buffered.
+        :param chunks: The byte chunks.
+        :param loop: The event loop the chunks are produced on; it must not be blocked by the reader.
+        """
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._buffer = memoryview(b"")
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._done:
+            chunk = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+            if chunk is None:
+                self._done = True
+            else:
+                self._buffer = memoryview(chunk)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def normalize_item(record: dict) -> Item:
+    """
+    Normalize a raw record into an `Item`.
+    Strings are trimmed with inner whitespace collapsed, the Arabic name is cleaned
+    the same way as single inserts, and the English color is lower-cased.
+    :param record: The raw record.
+    :return: The normalized item.
+    """
+    cleaned = {key: " ".join(value.split()) if isinstance(value, str) else value
+               for key, value in record.items()}
+    item = Item(**cleaned)
+    item.name_ar = clean_arabic_text(item.name_ar)
+    item.color_en = item.color_en.lower()
+    return item
+
+
+class Checkpoint:
+    def __init__(self, path: Optional[str], chunk_size: Optional[int] = None):
+        """
+        Track ingestion progress in a JSON file so an interrupted load can resume.
+        `completed` is the number of input records fully written to Mongo and Qdrant.
+        `in_flight` maps the input offset of each unfinished chunk to the ids assigned
+        to it, so a replayed chunk reuses the same ids instead of duplicating items.
+        Those offsets depend on the chunk size, so a load with unfinished chunks can only
+        be resumed with the chunk size it was started with.
+        :param path: The path of the checkpoint file, or None to disable checkpointing.
+        :param chunk_size: The chunk size of this load.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.completed = 0
+        self.in_flight = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.completed = state.get("completed", 0)
+            self.in_flight = state.get("in_flight", {})
+            saved_chunk_size = state.get("chunk_size")
+            if self.in_flight and saved_chunk_size != chunk_size:
+                raise CheckpointMismatch(f"Checkpoint {path} has unfinished chunks of {saved_chunk_size} records; "
+                                         f"resume it with a chunk size of {saved_chunk_size}")
+
+    def ids_for(self, offset: int) -> Optional[list[str]]:
+        return self.in_flight.get(str(offset))
+
+    def start_chunk(self, offset: int, ids: list[str]):
+        with self._lock:
+            self.in_flight[str(offset)] = ids
+            self._save()
+
+    def finish_chunk(self, offset: int, size: int):
+        with self._lock:
+            self.in_flight.pop(str(offset), None)
+            self.completed = offset + size
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"completed": self.completed, "in_flight": self.in_flight, "chunk_size": self.chunk_size}, f)
+        os.replace(tmp_path, self.path)
+
+
+class _Chunk:
+    def __init__(self, offset: int, size: int, items: list[Item]):
+        self.offset = offset
+        self.size = size
+        self.items = items
+        self.search = ItemService.search_fields(items)
+        self.ids: list[str] = []
+        self.embeddings_ar: list[list] = []
+        self.embeddings_en: list[list] = []
+
+
+class _StageStats:
+    def __init__(self):
+        self.items = 0
+        self.seconds = 0.0
+
+    def report(self) -> dict:
+        return {
+            "items": self.items,
+            "seconds": round(self.seconds, 3),
+            "items_per_sec": round(self.items / self.seconds, 1) if self.seconds else None,
+        }
+
+
+class IngestService:
+    def __init__(self, mongo: Mongo, cohere: CohereClient, vectordb: VectorStore,
+                 chunk_size: int = 500, queue_size: int = 4, layout: VectorLayout = None):
+        """
+        Bulk catalog ingestion.
+        Records flow through three stages running in their own threads and connected
+        by bounded queues, so Mongo writes, embedding and vector upserts overlap:
+        normalize + `insert_many` -> batch embed both languages -> batch upsert to Qdrant.
+        :param mongo: The Mongo client.
+        :param cohere: The embedding client.
+        :param vectordb: The vector database client.
+        :param chunk_size: The number of records processed together in every stage.
+        :param queue_size: The number of chunks buffered between two stages.
+        :param layout: Where the item vectors are written.
+        """
+        self.mongo = mongo
+        self.cohere = cohere
+        self.vectordb = vectordb
+        self.layout = layout or VectorLayout()
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+
+    def ingest(self, records: Iterable[dict], checkpoint_path: Optional[str] = None) -> dict:
+        """
+        Ingest a stream of raw item records.
+        :param records: The raw records to ingest; a `ValueError` in their place rejects that record.
+        :param checkpoint_path: Optional checkpoint file used to resume an interrupted load.
+        :return: A report with accepted/rejected counts and per-stage throughput.
+        """
+        checkpoint = Checkpoint(checkpoint_path, self.chunk_size)
+        resumed_from = checkpoint.completed
+        stats = {"insert": _StageStats(), "embed": _StageStats(), "upsert": _StageStats()}
+        rejected = []
+        started = time.perf_counter()
+
+        to_embed = queue.Queue(maxsize=self.queue_size)
+        to_upsert = queue.Queue(maxsize=self.queue_size)
+        errors = []
+
+        embed_thread = threading.Thread(target=self._run_stage,
+                                        args=(self._embed_chunk, to_embed, to_upsert, stats["embed"], errors))
+        upsert_thread = threading.Thread(target=self._run_stage,
+                                         args=(lambda chunk: self._upsert_chunk(chunk, checkpoint),
+                                               to_upsert, None, stats["upsert"], errors))
+        embed_thread.start()
+        upsert_thread.start()
+        try:
+            # Skip the records a previous run already finished
+            records = islice(records, resumed_from, None)
+            for chunk in self._chunks(records, resumed_from, rejected):
+                if errors:
+                    break
+                stage_started = time.perf_counter()
+                self._insert_chunk(chunk, checkpoint)
+                stats["insert"].seconds += time.perf_counter() - stage_started
+                stats["insert"].items += len(chunk.items)
+                to_embed.put(chunk)
+        finally:
+            to_embed.put(_DONE)
+            embed_thread.join()
+            upsert_thread.join()
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - started
+        accepted = stats["upsert"].items
+        return {
+            "accepted": accepted,
+            "rejected": len(rejected),
+            "errors": rejected[:20],
+            "resumed_from": resumed_from,
+            "seconds": round(elapsed, 3),
+            "items_per_sec": round(accepted / elapsed, 1) if elapsed else None,
+            "stages": {name: stage.report() for name, stage in stats.items()},
+        }
+
+    def _chunks(self, records: Iterable[dict], offset: int, rejected: list) -> Iterator[_Chunk]:
+        while True:
+            batch = list(islice(records, self.chunk_size))
+            if not batch:
+                return
+            items = []
+            for position, record in enumerate(batch, start=offset):
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    items.append(normalize_item(record))
+                except (ValueError, ValidationError, AttributeError, TypeError) as e:
+                    rejected.append({"record": position, "error": str(e)})
+            yield _Chunk(offset=offset, size=len(batch), items=items)
+            offset += len(batch)
+
+    @staticmethod
+    def _run_stage(handler, source: queue.Queue, sink: Optional[queue.Queue], stats: _StageStats, errors: list):
+        while True:
+            chunk = source.get()
+            if chunk is _DONE:
+                break
+            if errors:
+                # Keep draining so the producer never blocks on a full queue
+                continue
+            try:
+                stage_started = time.perf_counter()
+                handler(chunk)
+                stats.seconds += time.perf_counter() - stage_started
+                stats.items += len(chunk.items)
+                if sink is not None:
+                    sink.put(chunk)
+            except Exception as e:
+                errors.append(e)
+        if sink is not None:
+            sink.put(_DONE)
+
+    def _insert_chunk(self, chunk: _Chunk, checkpoint: Checkpoint):
+        if not chunk.items:
+            return
+        # Reuse the ids of a chunk that was interrupted so replaying it is idempotent
+        chunk.ids = checkpoint.ids_for(chunk.offset) or [str(ObjectId()) for _ in chunk.items]
+        checkpoint.start_chunk(chunk.offset, chunk.ids)
+        documents = [{"_id": ObjectId(item_id), **item.model_dump(), **search}
+                     for item_id, item, search in zip(chunk.ids, chunk.items, chunk.search)]
+        try:
+            self.mongo.insert_many(collection="items", data=documents, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                raise
+
+    def _embed_chunk(self, chunk: _Chunk):
+        if not chunk.items:
+            return
+        texts = [search["search_ar"] for search in chunk.search] + [search["search_en"] for search in chunk.search]
+        embeddings = self.cohere.embed_texts(texts=texts,
+                                             model=EMBED_MODEL,
+                                             input_type="search_query",
+                                             embedding_types=["float"])
+        chunk.embeddings_ar = embeddings[:len(chunk.items)]
+        chunk.embeddings_en = embeddings[len(chunk.items):]
+
+    def _upsert_chunk(self, chunk: _Chunk, checkpoint: Checkpoint):
+        if chunk.items:
+            point_ids = [point_id_for(item_id) for item_id in chunk.ids]
+            payloads = [ItemService.vector_payload(item_id, item) for item_id, item in zip(chunk.ids, chunk.items)]
+            for collection_name, vectors in self.layout.points({"ar": chunk.embeddings_ar,
+                                                                "en": chunk.embeddings_en}):
+                self.vectordb.insert_vectors(vectors=vectors, payloads=payloads,
+                                             collection_name=collection_name, point_ids=point_ids)
+        checkpoint.finish_chunk(chunk.offset, chunk.size)
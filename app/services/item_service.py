@@ -1,86 +1,41 @@
-import base64
-import os
+import asyncio
+import hashlib
+from typing import Optional
 
 from bson import ObjectId
+from pymongo import ASCENDING, TEXT, UpdateOne
 
-from app.clean_text import clean_arabic_text
-from app.core.embed import CohereClient
-from app.database.mongo import Mongo
-from app.database.qdrant import VectorDBClient
-from app.models.item import Item, GetItem
-from app.models.message import Message
-
-products = [
-    {
-        "name_ar": "لباس سلامة",
-        "name_en": "Safety Vest",
-        "description_ar": "لباس يعكس الضوء يستخدم في مواقع البناء لضمان السلامة.",
-        "description_en": "A reflective vest used at construction sites for safety.",
-        "color_en": "orange",
-        "color_ar": "برتقالي",
-        "material": "polyester",
-        "price": 75.00
-    },
-    {
-        "name_ar": "خوذة أمان",
-        "name_en": "Safety Helmet",
-        "description_ar": "خوذة واقية للرأس تستخدم في مواقع البناء لحماية العمال.",
-        "description_en": "A protective helmet used at construction sites to protect workers.",
-        "color_en": "yellow",
-        "color_ar": "أصفر",
-        "material": "hard plastic",
-        "price": 120.00
-    },
-    {
-        "name_ar": "نظارات حماية",
-        "name_en": "Safety Glasses",
-        "description_ar": "نظارات واقية تستخدم لحماية العينين أثناء العمل.",
-        "description_en": "Protective glasses used to shield the eyes while working.",
-        "color_en": "clear",
-        "color_ar": "شفاف",
-        "material": "plastic",
-        "price": 60.00
-    },
-    {
-        "name_ar": "قفازات عازلة",
-        "name_en": "Insulated Gloves",
-        "description_ar": "قفازات توفر الحماية ضد الكهرباء والمواد الكيميائية.",
-        "description_en": "Gloves that provide protection against electricity and chemicals.",
-        "color_en": "yellow",
-        "color_ar": "أصفر",
-        "material": "rubber",
-        "price": 90.00
-    },
-    {
-        "name_ar": "أشرطة قياس",
-        "name_en": "Measuring Tape",
-        "description_ar": "شريط مرن يستخدم لقياس المسافات بدقة.",
-        "description_en": "A flexible tape used for accurately measuring distances.",
-        "color_en": "yellow",
-        "color_ar": "أصفر",
-        "material": "metal, plastic",
-        "price": 50.00
-    },
-    {
-        "name_ar": "مرشح هواء صناعي",
-        "name_en": "Industrial Air Filter",
-        "description_ar": "مرشح يستخدم لتنقية الهواء من الغبار والملوثات في مواقع العمل.",
-        "description_en": "A filter used to purify air from dust and pollutants at work sites.",
-        "color_en": "white",
-        "color_ar": "أبيض",
-        "material": "synthetic fibers",
-        "price": 500.00
-    }
-]
+from app.clean_text import clean_arabic_text, clean_texts
+from app.core.embed import AsyncCohereClient
+from app.core.images import ImageStore
+from app.core.tracing import span
+from app.database.mongo import AsyncMongo
+from app.database.vector_store import AsyncVectorStore, VectorLayout, point_id_for
+from app.models.item import Item, GetItem, ItemView
+
+EMBED_MODEL = "embed-multilingual-light-v3.0"
+TEXT_INDEX = "search_text"
+# Item fields copied into the vector payloads, so searches can filter on them
+PAYLOAD_FIELDS = ("price", "color_ar", "color_en", "material")
+
+
+def embedding_hash(search_ar: str, search_en: str) -> str:
+    """Hash of the text embedded for an item and of the model embedding it."""
+    return hashlib.sha256(f"{EMBED_MODEL}\0{search_ar}\0{search_en}".encode()).hexdigest()
 
 
 class ItemService:
-    def __init__(self, mongo: Mongo, cohere: CohereClient, vectordb: VectorDBClient):
+    def __init__(self, mongo: AsyncMongo, cohere: AsyncCohereClient, vectordb: AsyncVectorStore,
+                 images: ImageStore, image_url_template: str = "/api/items/{item_id}/image",
+                 layout: VectorLayout = None):
         self.mongo = mongo
         self.cohere = cohere
         self.vectordb = vectordb
+        self.layout = layout or VectorLayout()
+        self.images = images
+        self.image_url_template = image_url_template
 
-    def insert(self, data: Item) -> str:
+    async def insert(self, data: Item) -> str:
         """
         Insert the provided data into the MongoDB database.
 
@@ -90,137 +45,244 @@ class ItemService:
         :param data: The data to insert.
         :return: The ID of the inserted document.
         """
-        for product in products:
-            print(product)
-            data = Item(**product)
-            data.name_ar = clean_arabic_text(data.name_ar)
-            # Insert the data into the database
-            result = self.mongo.insert(collection="items", data=data.model_dump())
-
-            embed_sentence_ar = f"{data.name_ar} {data.description_ar}"
-            embedding_ar = self.cohere.embed_text(texts=[embed_sentence_ar],
-                                                  model="embed-multilingual-light-v3.0",
-                                                  input_type="search_query",
-                                                  embedding_types=["float"])
-            embed_sentence_en = f"{data.name_en} {data.description_en}"
-            embedding_en = self.cohere.embed_text(texts=[embed_sentence_en],
-                                                  model="embed-multilingual-light-v3.0",
-                                                  input_type="search_query",
-                                                  embedding_types=["float"])
-            # Insert the vector into the vector database
-            self.vectordb.insert_vector(vector=embedding_ar,
-                                        payload={"id": str(result.inserted_id)},
-                                        collection_name="items_ar")
-            self.vectordb.insert_vector(vector=embedding_en,
-                                        payload={"id": str(result.inserted_id)},
-                                        collection_name="items_en")
-        return "str(result.inserted_id)"
+        data.name_ar = clean_arabic_text(data.name_ar)
+        search = self.search_fields([data])[0]
+        # Insert the data into the database; the hash is only stored once the vectors are written, so the
+        # vector sync re-embeds the item if embedding or upserting fails
+        document = {**data.model_dump(), "search_ar": search["search_ar"], "search_en": search["search_en"]}
+        result = await self.mongo.insert(collection="items", data=document)
+        inserted_id = str(result.inserted_id)
+
+        # Embed both languages in a single request
+        embedding_ar, embedding_en = await self.cohere.embed_texts(texts=[search["search_ar"], search["search_en"]],
+                                                                   model=EMBED_MODEL,
+                                                                   input_type="search_query",
+                                                                   embedding_types=["float"])
+        # Insert the vectors into the vector database: one point, or one per language collection
+        await asyncio.gather(*(
+            self.vectordb.insert_vector(vector=vectors[0],
+                                        payload=self.vector_payload(inserted_id, data),
+                                        collection_name=collection_name,
+                                        point_id=point_id_for(inserted_id))
+            for collection_name, vectors in self.layout.points({"ar": [embedding_ar], "en": [embedding_en]})
+        ))
+        await self.mongo.bulk_write(collection="items", operations=[
+            UpdateOne({"_id": result.inserted_id}, {"$set": {"embedding_hash": search["embedding_hash"]}})
+        ])
+        return inserted_id
 
     @staticmethod
-    def read_image(image_name: str):
-        """Search for an image file in STATIC_FOLDER with any extension."""
-        for file in os.listdir('static'):
-            if file.startswith(image_name + "."):
-                image_path = os.path.join('static', file)
-                # Read image bytes
-                if image_path:
-                    with open(image_path, "rb") as img_file:
-                        image_bytes = img_file.read()
-                else:
-                    image_bytes = None
-                encoded_images = base64.b64encode(image_bytes).decode("utf-8")
-                return encoded_images
+    def search_fields(items: list[Item]) -> list[dict]:
+        """
+        Build the normalized Arabic and English search text of each item.
+        It is stored with the item for the Mongo text index and is also the text embedded for it,
+        so queries normalized the same way match both retrievers without cleaning items per request.
+        `embedding_hash` identifies the embedded text, so a changed item is only re-embedded
+        when that text actually changed.
+        """
+        arabic = clean_texts(f"{item.name_ar} {item.description_ar}" for item in items)
+        english = (f"{item.name_en} {item.description_en}" for item in items)
+        fields = []
+        for ar, en in zip(arabic, english):
+            search_ar, search_en = " ".join(ar.split()), " ".join(en.split())
+            fields.append({"search_ar": search_ar, "search_en": search_en,
+                           "embedding_hash": embedding_hash(search_ar, search_en)})
+        return fields
+
+    @staticmethod
+    def vector_payload(item_id: str, item: Item) -> dict:
+        """The payload of the vectors of an item: its Mongo id and the filterable fields."""
+        return {"id": item_id, **{field: getattr(item, field) for field in PAYLOAD_FIELDS}}
+
+    async def backfill_search_fields(self, batch_size: int = 1000) -> int:
+        """
+        Store the search fields on items inserted before they existed.
+        :param batch_size: The number of items read and updated per round trip.
+        :return: The number of updated items.
+        """
+        projection = {field: 1 for field in Item.model_fields}
+        updated = 0
+        last_id = None
+        while True:
+            query = {"search_ar": {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            documents = await self.mongo.find_many(collection="items", query=query, sort=[("_id", ASCENDING)],
+                                                   limit=batch_size, projection=projection)
+            if not documents:
+                return updated
+            items = [Item(**document) for document in documents]
+            # The stored vectors were embedded from other text, so no hash is set and the vector sync
+            # re-embeds these items
+            await self.mongo.bulk_write(collection="items", operations=[
+                UpdateOne({"_id": document["_id"]}, {"$set": {"search_ar": fields["search_ar"],
+                                                              "search_en": fields["search_en"]}})
+                for document, fields in zip(documents, self.search_fields(items))
+            ])
+            updated += len(documents)
+            last_id = documents[-1]["_id"]
 
-    def get_item(self, item_id: ObjectId) -> GetItem:
+    async def ensure_text_index(self, replace: bool = False) -> str:
+        """
+        Create the text index over the search fields.
+        A collection has at most one text index; an existing one on other fields is dropped
+        when `replace` is set, otherwise creating the index fails.
+        Stemming is disabled (language "none") as the fields hold both Arabic and English.
+        """
+        if replace:
+            for index in await self.mongo.list_indexes("items"):
+                if TEXT in index["key"].values() and index["name"] != TEXT_INDEX:
+                    await self.mongo.drop_index("items", index["name"])
+        return await self.mongo.create_index("items", [("search_ar", TEXT), ("search_en", TEXT)],
+                                             name=TEXT_INDEX, default_language="none")
+
+    async def get_item(self, item_id: ObjectId, inline_image: bool = False,
+                       view: Optional[ItemView] = None) -> GetItem | dict:
         """
         Get the item from the MongoDB database.
 
         This method retrieves the item with the provided ID from the MongoDB database.
 
         :param item_id: The ID of the item to retrieve.
+        :param inline_image: Whether to embed the image bytes instead of only its URL.
+        :param view: Optional profile or field selection; only those fields are read and returned.
         :return: The retrieved item.
         """
         # Retrieve the item from the database
-        item = self.mongo.find_one(collection="items", query={"_id": item_id})
-        # Add image bytes to response
-        item["image"] = self.read_image(item["name_en"])
-        return GetItem(**item)
+        item = await self.mongo.find_one(collection="items", query={"_id": item_id},
+                                         projection=self.projection(view))
+        items = await self.to_items([item], inline_images=inline_image, view=view)
+        return items[0]
 
-    def get_items(self, items_ids: list[ObjectId]) -> list[GetItem]:
+    async def get_items(self, items_ids: list[ObjectId], inline_images: bool = False,
+                        view: Optional[ItemView] = None, filters: Optional[dict] = None) -> list[GetItem] | list[dict]:
         """
         Get the items from the MongoDB database in the same order as items_ids.
 
         :param items_ids: The IDs of the items to retrieve.
+        :param inline_images: Whether to embed the image bytes instead of only their URLs.
+        :param view: Optional profile or field selection; only those fields are read and returned.
+        :param filters: Optional conditions the items must also match.
         :return: The retrieved items in the same order.
         """
         pipeline = [
-            {"$match": {"_id": {"$in": items_ids}}},
+            {"$match": {"_id": {"$in": items_ids}, **(filters or {})}},
             {"$addFields": {"sortIndex": {"$indexOfArray": [items_ids, "$_id"]}}},
             {"$sort": {"sortIndex": 1}}
         ]
+        projection = self.projection(view)
+        if projection:
+            pipeline.append({"$project": projection})
 
-        items = self.mongo.aggregate(collection="items", pipeline=pipeline)
-
-        result_list = []
-        for item in items:
-            item["image"] = self.read_image(item["name_en"])
-            item = GetItem(**item)
-            result_list.append(item)
-        return result_list
+        with span("items.hydrate"):
+            items = await self.mongo.aggregate(collection="items", pipeline=pipeline)
+            return await self.to_items(items, inline_images=inline_images, view=view)
 
-    def get_prompt(self, prompt_id: ObjectId) -> dict:
+    @staticmethod
+    def projection(view: Optional[ItemView], extra: tuple[str, ...] = ()) -> Optional[dict]:
         """
-        Get the prompt from the MongoDB database.
+        Build the Mongo projection of the fields a view returns.
 
-        This method retrieves the prompt with the provided ID from the MongoDB database.
+        :param view: The requested view; None or the full profile reads whole documents.
+        :param extra: Fields the caller needs besides the returned ones.
+        :return: The projection, or None for whole documents.
+        """
+        if view is None or view.full:
+            return None
+        if view.fields:
+            fields = [field for field in view.fields if field not in ("image_url", "image")]
+            with_image = "image_url" in view.fields or "image" in view.fields
+        else:
+            fields = [f"name_{view.lang or 'en'}", "price"]
+            with_image = True
+        if with_image:
+            # Image files are named after the English name
+            fields.append("name_en")
+        return dict.fromkeys([*fields, *extra], 1)
 
-        :param prompt_id: The ID of the prompt to retrieve.
-        :return: The retrieved prompt.
+    async def to_items(self, items: list[dict], inline_images: bool = False,
+                       view: Optional[ItemView] = None) -> list[GetItem] | list[dict]:
         """
-        # Retrieve the prompt from the database
-        prompt = self.mongo.find_one(collection="prompts", query={"_id": prompt_id})
-        return prompt
+        Attach image URLs to raw item documents and validate them into `GetItem`.
+        With a listing profile or a field selection, the documents are instead shaped into
+        plain dicts holding only those fields, ready for `ORJSONResponse`.
 
-    def add_message(self, question: str, answer: str, conversation_id: ObjectId):
+        :param items: The raw item documents.
+        :param inline_images: Whether to also embed the base64 image bytes (legacy mode).
+        :param view: Optional profile or field selection; "image" in the fields embeds the image bytes.
+        :return: The validated items, or the selected fields of every item.
         """
-        Add a question and answer pair to the MongoDB database.
+        await self.refresh_images()
+        if view is not None and not view.full:
+            if view.fields and "image" in view.fields:
+                return await asyncio.to_thread(self._to_views, items, view)
+            return self._to_views(items, view)
+        if inline_images:
+            # Reading the files is blocking, so do it off the event loop
+            return await asyncio.to_thread(self._to_items, items, True)
+        return self._to_items(items, False)
 
-        This method adds a question and answer pair to the MongoDB database.
+    async def refresh_images(self):
+        # The change check stats and may rescan the image directory, so it runs off the event loop
+        if self.images.stale:
+            await asyncio.to_thread(self.images.refresh)
 
-        :param question: The question to add.
-        :param answer: The answer to add.
-        :param conversation_id: The ID of the conversation to which the question and answer belong.
-        """
-        data = {"question": question,
-                "answer": answer,
-                "conversation_id": ObjectId(conversation_id)}
-        self.mongo.insert(collection="messages", data=data)
+    def _to_items(self, items: list[dict], inline_images: bool) -> list[GetItem]:
+        result_list = []
+        for item in items:
+            if self.images.lookup(item["name_en"]) is not None:
+                item["image_url"] = self.image_url_template.format(item_id=item["_id"])
+                if inline_images:
+                    item["image"] = self.images.read_base64(item["name_en"])
+            item = GetItem(**item)
+            result_list.append(item)
+        return result_list
 
-    def get_messages(self, conversation_id: ObjectId) -> list[Message]:
-        """
-        Get all messages from the MongoDB database.
+    def _to_views(self, items: list[dict], view: ItemView) -> list[dict]:
+        # The listing profile is ListingItem: the name in the requested language, price and image URL
+        fields = view.fields or ("name", "price", "image_url")
+        name_field = f"name_{view.lang or 'en'}"
+        result_list = []
+        for item in items:
+            result = {"_id": str(item["_id"])}
+            for field in fields:
+                if field == "name":
+                    result["name"] = item.get(name_field)
+                elif field == "image_url":
+                    has_image = self.images.lookup(item["name_en"]) is not None
+                    result["image_url"] = self.image_url_template.format(item_id=item["_id"]) if has_image else None
+                elif field == "image":
+                    result["image"] = self.images.read_base64(item["name_en"])
+                else:
+                    result[field] = item.get(field)
+            result_list.append(result)
+        return result_list
 
-        This method retrieves all messages from the MongoDB database.
+    async def get_image_path(self, item_id: ObjectId, width: Optional[int] = None) -> Optional[str]:
+        """
+        Get the path of the image of an item.
 
-        :return: A list of all messages.
+        :param item_id: The ID of the item.
+        :param width: Optional thumbnail width; must be one of the configured sizes.
+        :return: The image path, or None if the item or its image does not exist.
         """
-        # Retrieve all messages in reverse order
-        list_messages = []
-        messages = self.mongo.get_messages(collection="messages",
-                                             query={"conversation_id": ObjectId(conversation_id)},
-                                             limit=10)
-        for message in messages:
-            list_messages.append(Message(**message))
-        return list_messages
+        item = await self.mongo.find_one(collection="items", query={"_id": item_id}, projection={"name_en": 1})
+        if item is None:
+            return None
+        if width is None:
+            await self.refresh_images()
+            return self.images.lookup(item["name_en"])
+        return await asyncio.to_thread(self.images.thumbnail, item["name_en"], width)
 
-    def create_conversation(self) -> str:
+    async def get_prompt(self, prompt_id: ObjectId) -> dict:
         """
-        Create a new conversation in the MongoDB database.
+        Get the prompt from the MongoDB database.
 
-        This method creates a new conversation in the MongoDB database and returns the conversation ID.
+        This method retrieves the prompt with the provided ID from the MongoDB database.
 
-        :return: The ID of the created conversation.
+        :param prompt_id: The ID of the prompt to retrieve.
+        :return: The retrieved prompt.
         """
-        # Create a new conversation in the database
-        conversation_id = self.mongo.insert(collection="conversations", data={})
-        return conversation_id.inserted_id
+        # Retrieve the prompt from the database
+        prompt = await self.mongo.find_one(collection="prompts", query={"_id": prompt_id})
+        return prompt
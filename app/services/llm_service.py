@@ -1,38 +1,52 @@
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, Optional
 
-from bson import ObjectId
-
-from app.core.llm import LLM
+from app.clean_text import detect_language, normalize_query
+from app.core.context import ContextBuilder
+from app.core.llm import LLM, LLMResponse, NoAnswerError
+from app.core.semantic_cache import SemanticCache
 from app.core.web_search import WebSearch
-from app.models.prompt import Prompt
 from app.models.similarity_search import SimilaritySearch
+from app.services.conversation_service import ConversationService, Session
 from app.services.item_service import ItemService
+from app.services.prompt_registry import CompiledPrompt, PromptRegistry
 from app.services.similar import SimilarService
 
+# The language written in the prompt for each detected query language
+LANGUAGE_NAMES = {"ar": "Arabic", "en": "English"}
+
 
 class LLMService:
     def __init__(self, llm: LLM,
                  search_service: SimilarService,
                  web_search_service: WebSearch,
-                 item_service: ItemService
+                 item_service: ItemService,
+                 prompts: PromptRegistry,
+                 conversations: ConversationService,
+                 context: ContextBuilder,
+                 semantic_cache: Optional[SemanticCache] = None
                  ):
         self.llm = llm
         self.search_service = search_service
         self.web_search_service = web_search_service
         self.item_service = item_service
+        self.prompts = prompts
+        self.conversations = conversations
+        self.context = context
+        self.semantic_cache = semantic_cache
 
-    def generate_response(self, system: str, user: str):
-        """Returns a generator to enable streaming responses."""
-        result = self.llm.generate_response(system, user)
+    async def generate_response(self, system: str, user: str):
+        """Returns the complete structured response; `chat_stream` streams it instead."""
+        result = await self.llm.generate_response(system, user)
         return result
 
-    def search_items(self, query: SimilaritySearch) -> dict:
+    async def search_items(self, query: SimilaritySearch) -> dict:
         """Searches for similar items and returns search results."""
-        result = self.search_service.search(query)
+        result = await self.search_service.search(query)
 
-        # Use list comprehension to extract results and exclude the 'image' field
-        full_text_results = [item.model_dump(exclude={'image'}) for item in result["results"]]
-        similar_items = [item.model_dump(exclude={'image'}) for item in result["related_results"]]
+        # Use list comprehension to extract results and exclude the image fields
+        full_text_results = [item.model_dump(exclude={'image', 'image_url'}) for item in result["results"]]
+        similar_items = [item.model_dump(exclude={'image', 'image_url'}) for item in result["related_results"]]
 
         return {
             "results": full_text_results,
@@ -43,59 +57,167 @@ class LLMService:
         """Generates the system instruction for the AI model."""
         return system
 
-    def _generate_user_message(
-            self, query: str, full_text_search_result: list, similar_items: list,
-            lang: str, user: str,
-            chat_history: Optional[list] = None,
-            web_search_result: Optional[list] = None
-    ) -> str:
-        """Creates a user message prompt for the AI model."""
-        formated_user = (user.replace("{query}", query)
-                         .replace("{lang}", lang)
-                         .replace("{chat_history}", str(chat_history))
-                         .replace("{full_text_search_result}", str(full_text_search_result))
-                         .replace("{similar_items}", str(similar_items))
-                         .replace("{web_search_result}", str(web_search_result)))
-        return formated_user
-
-    def chat(
+    def _generate_user_message(self, query: str, lang: str, prompt: CompiledPrompt, context: dict[str, str]) -> str:
+        """
+        Creates a user message prompt for the AI model.
+        :param context: The rendered chat history, full-text search, similar items and web search sections.
+        """
+        return prompt.user.render(query=query, lang=lang, **context)
+
+    async def chat(
             self, query: str, limit: int = 10, score_threshold: float = 0.3, filters: Optional[dict] = None,
             conversation_id: Optional[str] = None,
-            search: bool = True
+            search: bool = True, prompt: Optional[str] = None, prompt_version: Optional[int] = None
     ):
         # Remove space form query if it is the first letter
         query = query.strip()
-        if not conversation_id:
-            conversation_id = self.item_service.create_conversation()
-        chat_history = self.item_service.get_messages(ObjectId(conversation_id))
-        new_query = query + " " + chat_history[0].question if chat_history else query
-        lang = "English"
-
-        if '\u0600' <= query[0] <= '\u06FF' or '\u0750' <= query[0] <= '\u077F' or '\u08A0' <= query[
-            0] <= '\u08FF':
-            lang = "Arabic"
-        # Retrieve knowledge base results
-        knowledge_base = self.search_items(
-            query=SimilaritySearch(query=new_query, limit=limit, score_threshold=score_threshold, filters=filters)
-        )
-        web_search_results = self.web_search_service.search(query) if search else {"results": []}
-        # Generate system and user messages
-        prompt = Prompt(**self.item_service.get_prompt(prompt_id=ObjectId("67c045cf1eb68369147527c0")))
-        system_message = self._generate_system_message(prompt.system)
-        user_message = self._generate_user_message(
-            query=query,
-            chat_history=chat_history,
-            full_text_search_result=knowledge_base["results"],
-            similar_items=knowledge_base["related_results"],
-            web_search_result=web_search_results["results"],
-            lang=lang,
-            user=prompt.user
-        )
-        # Stream the AI's response
-        answer = self.generate_response(system=system_message, user=user_message)
-        self.item_service.add_message(question=query, answer=answer.answer, conversation_id=ObjectId(conversation_id))
+        tasks = self._start_context(query, limit, score_threshold, filters, conversation_id, search,
+                                    prompt, prompt_version)
+        try:
+            (conversation_id, chat_history, knowledge_base), web_search_results, compiled_prompt = \
+                await asyncio.gather(*tasks)
+        finally:
+            # A failed branch, e.g. an unknown prompt, must not leave the others running
+            for task in tasks:
+                task.cancel()
+        answer, cache_slot = await self._cached_answer(query, chat_history, knowledge_base, compiled_prompt,
+                                                       search)
+        if answer is None:
+            system_message, user_message = self._build_messages(query, chat_history, knowledge_base,
+                                                                web_search_results, compiled_prompt)
+            answer = await self.generate_response(system=system_message, user=user_message)
+            if answer is None:
+                raise NoAnswerError("The model returned no answer")
+            self._cache_answer(cache_slot, answer)
+        await self.conversations.append(conversation_id, question=query, answer=answer.answer)
         return {
             "answer": answer.answer,
             "item_id": answer.item_id,
             "conversation_id": str(conversation_id),
         }
+
+    async def chat_stream(
+            self, query: str, limit: int = 10, score_threshold: float = 0.3, filters: Optional[dict] = None,
+            conversation_id: Optional[str] = None,
+            search: bool = True, prompt: Optional[str] = None, prompt_version: Optional[int] = None
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Streaming variant of `chat`, yielding (event, data) pairs:
+        "results" as soon as the knowledge base search finishes, then one "token" per
+        answer fragment while the model generates, and finally "done" with the parsed
+        answer, item id and conversation id. The message is persisted before "done".
+        An answer that streamed but did not parse is kept as plain text without an item id;
+        a refusal raises `NoAnswerError`, which the route sends as an "error" event.
+        """
+        query = query.strip()
+        tasks = self._start_context(query, limit, score_threshold, filters, conversation_id, search,
+                                    prompt, prompt_version)
+        try:
+            conversation_id, chat_history, knowledge_base = await tasks[0]
+            yield "results", {"conversation_id": str(conversation_id), **knowledge_base}
+            web_search_results, compiled_prompt = await asyncio.gather(tasks[1], tasks[2])
+        finally:
+            # The client may disconnect before the context is ready
+            for task in tasks:
+                task.cancel()
+
+        answer, cache_slot = await self._cached_answer(query, chat_history, knowledge_base, compiled_prompt,
+                                                       search)
+        if answer is not None:
+            yield "token", {"text": answer.answer}
+        else:
+            system_message, user_message = self._build_messages(query, chat_history, knowledge_base,
+                                                                web_search_results, compiled_prompt)
+            streamed = []
+            async for chunk in self.llm.stream_response(system=system_message, user=user_message):
+                if isinstance(chunk, str):
+                    streamed.append(chunk)
+                    yield "token", {"text": chunk}
+                else:
+                    answer = chunk
+            if answer is not None:
+                self._cache_answer(cache_slot, answer)
+            elif streamed:
+                # The final JSON did not parse, so the answer is the text the client already received
+                answer = LLMResponse(answer="".join(streamed), item_id=None)
+            else:
+                raise NoAnswerError("The model returned no answer")
+
+        await self.conversations.append(conversation_id, question=query, answer=answer.answer)
+        yield "done", {
+            "answer": answer.answer,
+            "item_id": answer.item_id,
+            "conversation_id": str(conversation_id),
+        }
+
+    def _start_context(self, query: str, limit: int, score_threshold: float, filters: Optional[dict],
+                       conversation_id: Optional[str], search: bool, prompt: Optional[str],
+                       prompt_version: Optional[int]) -> list[asyncio.Task]:
+        """
+        Start the retrieval, web search and prompt lookup concurrently, as they do not depend on each other.
+        :return: The tasks, resolving to (conversation id, history, knowledge base), web results and the prompt.
+        """
+
+        async def knowledge_base_search(search_query: str) -> dict:
+            # Retrieve knowledge base results
+            return await self.search_items(
+                query=SimilaritySearch(query=search_query, limit=limit, score_threshold=score_threshold,
+                                       filters=filters)
+            )
+
+        async def history_and_knowledge_base() -> tuple[str, Session, dict]:
+            if conversation_id:
+                # The search query includes the previous question, so it waits for the history
+                chat_history = await self.conversations.history(conversation_id)
+                new_query = query + " " + chat_history.last_question if chat_history else query
+                return conversation_id, chat_history, await knowledge_base_search(new_query)
+            # A new conversation has no history, so creating it can overlap with the search
+            new_conversation_id, knowledge_base = await asyncio.gather(
+                self.conversations.create(),
+                knowledge_base_search(query),
+            )
+            return new_conversation_id, await self.conversations.history(new_conversation_id), knowledge_base
+
+        async def web_search() -> dict:
+            return await self.web_search_service.search(query) if search else {"results": []}
+
+        return [
+            asyncio.create_task(history_and_knowledge_base()),
+            asyncio.create_task(web_search()),
+            asyncio.create_task(self.prompts.get(prompt, prompt_version)),
+        ]
+
+    async def _cached_answer(self, query: str, chat_history: Session, knowledge_base: dict,
+                             prompt: CompiledPrompt, search: bool) -> tuple[Optional[LLMResponse], Optional[tuple]]:
+        """
+        Look the question up in the semantic cache.
+        Only first turns are cached, since later answers depend on the conversation history.
+        :return: The cached answer or None, and the cache slot to store a fresh answer in.
+        """
+        if self.semantic_cache is None or chat_history:
+            return None, None
+        # The retrieval already embedded this query, so this is served by the embedding cache
+        embedding = await self.search_service.generate_embedding(normalize_query(query))
+        partition = f"{detect_language(query)}:{prompt.name}:{prompt.version}:{'web' if search else 'kb'}"
+        item_ids = [str(item["id"]) for item in knowledge_base["results"] + knowledge_base["related_results"]]
+        slot = (partition, embedding, item_ids)
+        return self.semantic_cache.get(*slot), slot
+
+    def _cache_answer(self, slot: Optional[tuple], answer: LLMResponse):
+        if slot is not None:
+            self.semantic_cache.put(*slot, answer)
+
+    def _build_messages(self, query: str, chat_history: Session, knowledge_base: dict, web_search_results: dict,
+                        prompt: CompiledPrompt) -> tuple[str, str]:
+        lang = detect_language(query)
+
+        # Generate system and user messages
+        system_message = self._generate_system_message(prompt.system)
+        context = self.context.build(lang=lang,
+                                     results=knowledge_base["results"],
+                                     related=knowledge_base["related_results"],
+                                     web_results=web_search_results["results"],
+                                     history=chat_history.lines())
+        user_message = self._generate_user_message(query=query, lang=LANGUAGE_NAMES[lang], prompt=prompt,
+                                                   context=context)
+        return system_message, user_message
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import DESCENDING
+from pymongo.errors import PyMongoError
+
+from app.database.mongo import AsyncMongo
+from app.models.prompt import Prompt
+
+logger = logging.getLogger(__name__)
+
+# Placeholders filled in the user template of the chat prompt
+USER_FIELDS = ("query", "lang", "chat_history", "full_text_search_result", "similar_items", "web_search_result")
+
+
+class CompiledTemplate:
+    def __init__(self, template: str, fields: tuple[str, ...] = USER_FIELDS):
+        """
+        A template split once into literal text and placeholders, so rendering is a single join.
+        Only `{field}` for the given field names is substituted; any other braces stay literal.
+        :param template: The template text.
+        :param fields: The placeholder names.
+        """
+        pattern = re.compile("{(" + "|".join(map(re.escape, fields)) + ")}")
+        # re.split alternates literal text and captured placeholder names
+        self.parts = pattern.split(template)
+
+    def render(self, **values) -> str:
+        parts = self.parts.copy()
+        for i in range(1, len(parts), 2):
+            parts[i] = str(values[parts[i]])
+        return "".join(parts)
+
+
+class CompiledPrompt:
+    def __init__(self, prompt: Prompt, name: str, version: Optional[int]):
+        self.name = name
+        self.version = version
+        self.system = prompt.system
+        self.user = CompiledTemplate(prompt.user)
+
+
+class PromptRegistry:
+    def __init__(self, mongo: AsyncMongo, default_name: str, ttl: float = 60.0, collection: str = "prompts"):
+        """
+        In-process cache of compiled chat prompts.
+        A prompt is looked up by its `name` field, or by `_id` for prompts created before names
+        existed, and optionally pinned to a `version`; without a version the highest one wins.
+        Entries are reloaded after `ttl` seconds, or immediately when `watch` sees a change.
+        If a reload fails the cached prompt keeps being served.
+        :param mongo: The Mongo client.
+        :param default_name: The prompt used when a request does not choose one.
+        :param ttl: The number of seconds a prompt is served before it is reloaded.
+        :param collection: The collection holding the prompts.
+        """
+        self.mongo = mongo
+        self.default_name = default_name
+        self.ttl = ttl
+        self.collection = collection
+        self._cache: dict[tuple[str, Optional[int]], tuple[float, CompiledPrompt]] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, name: Optional[str] = None, version: Optional[int] = None) -> CompiledPrompt:
+        """
+        Get a compiled prompt.
+        :param name: The prompt name or id, the default prompt when omitted.
+        :param version: Optional prompt version, the latest when omitted.
+        :return: The compiled prompt.
+        """
+        key = (name or self.default_name, version)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        async with self._lock:
+            # Another request may have reloaded it while this one waited
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+            try:
+                prompt = await self._load(*key)
+            except PyMongoError:
+                if cached is None:
+                    raise
+                logger.warning("Reloading prompt %s failed, serving the cached version", key, exc_info=True)
+                prompt = cached[1]
+            self._cache[key] = (time.monotonic(), prompt)
+            return prompt
+
+    async def _load(self, name: str, version: Optional[int]) -> CompiledPrompt:
+        query = {"name": name}
+        if ObjectId.is_valid(name):
+            query = {"$or": [query, {"_id": ObjectId(name)}]}
+        if version is not None:
+            query["version"] = version
+        documents = await self.mongo.find_many(collection=self.collection, query=query,
+                                               sort=[("version", DESCENDING)], limit=1)
+        if not documents:
+            raise LookupError(f"Prompt {name} (version {version}) not found")
+        document = documents[0]
+        return CompiledPrompt(Prompt(**document), name=name, version=document.get("version"))
+
+    def invalidate(self):
+        self._cache.clear()
+
+    async def watch(self):
+        """
+        Drop the cache whenever the prompts collection changes.
+        Change streams need a replica set; without one the TTL alone refreshes prompts.
+        """
+        try:
+            async with await self.mongo.watch(self.collection) as stream:
+                async for _ in stream:
+                    self.invalidate()
+        except PyMongoError:
+            logger.warning("Prompt change stream unavailable, relying on the %ss TTL", self.ttl, exc_info=True)
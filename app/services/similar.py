@@ -1,39 +1,52 @@
-from typing import Any
+import asyncio
+from typing import Any, Optional
 
+import numpy as np
 from bson import ObjectId
-from scipy.spatial.distance import cosine
 
-from app.clean_text import clean_arabic_text
-from app.core.embed import CohereClient
+from app.clean_text import detect_language, normalize_query
+from app.core.embed import AsyncCohereClient
+from app.core.fusion import RRF_K, reciprocal_rank_fusion, weighted_score_fusion
 from app.core.web_search import WebSearch
-from app.database.mongo import Mongo
-from app.database.qdrant import VectorDBClient
-from app.models.item import GetItem
-from app.models.similarity_search import SimilaritySearch
-from app.services.item_service import ItemService
+from app.database.mongo import AsyncMongo
+from app.database.vector_store import AsyncVectorStore, VectorLayout
+from app.models.item import GetItem, Item, ItemView
+from app.models.similarity_search import ScoredItem, SimilaritySearch
+from app.services.co_purchase_index import CoPurchaseIndex
+from app.services.item_service import PAYLOAD_FIELDS, ItemService
 
 
 class SimilarService:
-    def __init__(self, mongo: Mongo, cohere: CohereClient,
-                 vectordb: VectorDBClient, web_search_service: WebSearch,
-                 item_service: ItemService):
+    def __init__(self, mongo: AsyncMongo, cohere: AsyncCohereClient,
+                 vectordb: AsyncVectorStore, web_search_service: WebSearch,
+                 item_service: ItemService, co_purchase: CoPurchaseIndex,
+                 rrf_k: int = RRF_K, candidate_factor: int = 2, layout: VectorLayout = None):
+        """
+        :param rrf_k: The rank constant of reciprocal-rank fusion in hybrid search.
+        :param candidate_factor: Candidates fetched per retriever in hybrid search, as a multiple of the limit.
+        :param layout: Where the item vectors are stored.
+        """
         self.mongo = mongo
         self.cohere = cohere
         self.vectordb = vectordb
         self.web_search_service = web_search_service
         self.item_service = item_service
+        self.co_purchase = co_purchase
+        self.rrf_k = rrf_k
+        self.candidate_factor = max(1, candidate_factor)
+        self.layout = layout or VectorLayout()
 
-    def mongo_full_text_search(self, query: str, filter: dict = None) -> list[GetItem]:
-        mongo_search_result = self.mongo.full_text_search(collection="items", query=query, filter=filter)
-        result_list = []
-        for item in mongo_search_result:
-            item["image"] = self.item_service.read_image(item["name_en"])
-            item = GetItem(**item)
-            result_list.append(item)
-        return result_list
-
-    def generate_embedding(self, text: str):
-        embedding = self.cohere.embed_text(
+    async def mongo_full_text_search(self, query: str, filter: dict = None, limit: int = None,
+                                     inline_images: bool = False,
+                                     view: Optional[ItemView] = None) -> list[GetItem] | list[dict]:
+        # The best `limit` matches, ranked and cut in the database
+        mongo_search_result = await self.mongo.text_search(collection="items", query=query, filter=filter,
+                                                           limit=limit or 0,
+                                                           projection=self.item_service.projection(view))
+        return await self.item_service.to_items(mongo_search_result, inline_images=inline_images, view=view)
+
+    async def generate_embedding(self, text: str):
+        embedding = await self.cohere.embed_text(
             texts=[text],
             model="embed-multilingual-light-v3.0",
             input_type="search_query",
@@ -41,106 +54,131 @@ class SimilarService:
         )
         return embedding
 
-    def rerank_documents(self, query: str, documents: list[GetItem], is_arabic: bool) -> list:
-        """Re-rank documents based on their embedding similarity to the query."""
-        # Generate the embedding for the query
-        query_embedding = self.generate_embedding(query)
+    async def generate_embeddings(self, texts: list[str]) -> list[list[float]]:
+        embeddings = await self.cohere.embed_texts(
+            texts=texts,
+            model="embed-multilingual-light-v3.0",
+            input_type="search_query",
+            embedding_types=["float"]
+        )
+        return embeddings
 
-        documents_with_sim = []
+    async def rerank_documents(self, query: str, documents: list[GetItem] | list[dict], is_arabic: bool) -> list:
+        """
+        Re-rank documents based on their embedding similarity to the query.
+        The document vectors are read back from the vector store in one call, so only the
+        query is embedded; documents without a stored vector are embedded as a fallback.
+        """
+        collection_name, vector_name = self.layout.target("ar" if is_arabic else "en")
+        query_embedding, stored = await asyncio.gather(
+            self.generate_embedding(query),
+            self.vectordb.get_vectors([self._item_id(doc) for doc in documents], collection_name,
+                                      vector_name=vector_name),
+        )
 
-        for doc in documents:
-            # Depending on the query language, choose Arabic or English fields
-            if is_arabic:
-                # Arabic query: use Arabic fields
-                document_text = (f"name: {doc.name_ar} description: {doc.description_ar} "
-                                 f"color: {doc.color_ar}")
-            else:
-                # English query: use English fields
-                document_text = (f"name: {doc.name_en} description: {doc.description_en} "
-                                 f"color: {doc.color_en}")
+        missing = [doc for doc in documents if self._item_id(doc) not in stored]
+        if missing:
+            embeddings = await self.generate_embeddings(await self._rerank_texts(missing, is_arabic))
+            stored.update((self._item_id(doc), np.asarray(embedding, dtype=np.float32))
+                          for doc, embedding in zip(missing, embeddings))
 
-            # Generate the embedding for the document text
-            document_embedding = self.generate_embedding(document_text)
+        # Cosine similarity of every document at once
+        matrix = np.stack([stored[self._item_id(doc)] for doc in documents])
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        similarities = matrix @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
 
-            # Compute cosine similarity with the query embedding
-            similarity = 1 - cosine(query_embedding, document_embedding)
+        # Sort the documents by similarity in descending order (stable for ties)
+        order = np.argsort(-similarities, kind="stable")
+        return [documents[i] for i in order]
 
-            documents_with_sim.append((doc, similarity))
+    @staticmethod
+    def vector_filters(filters: Optional[dict]) -> Optional[dict]:
+        """
+        The part of Mongo query filters the vector store can apply: equality on payload fields.
+        Other conditions are applied when the items are fetched from Mongo.
+        """
+        if not filters:
+            return None
+        return {key: value for key, value in filters.items()
+                if key in PAYLOAD_FIELDS and not isinstance(value, (dict, list))} or None
 
-        # Sort the documents by similarity in descending order
-        documents_with_sim.sort(key=lambda x: x[1], reverse=True)
+    @staticmethod
+    def _item_id(doc: GetItem | dict) -> str:
+        return str(doc.id) if isinstance(doc, GetItem) else doc["_id"]
 
-        # Return the documents sorted by similarity
-        return [doc for doc, _ in documents_with_sim]
+    async def _rerank_texts(self, documents: list[GetItem] | list[dict], is_arabic: bool) -> list[str]:
+        """
+        The text embedded for each document at ingest time, so a fallback vector matches a stored one.
+        Partial views lack the fields it is built from, so their items are read from Mongo.
+        """
+        key = "search_ar" if is_arabic else "search_en"
+        items = {self._item_id(doc): doc for doc in documents if isinstance(doc, GetItem)}
+        partial = [ObjectId(doc["_id"]) for doc in documents if isinstance(doc, dict)]
+        if partial:
+            projection = {field: 1 for field in Item.model_fields}
+            for document in await self.mongo.find_many(collection="items", query={"_id": {"$in": partial}},
+                                                       projection=projection):
+                items[str(document["_id"])] = Item(**document)
+        texts = dict(zip(items, (fields[key] for fields in ItemService.search_fields(list(items.values())))))
+        return [texts.get(self._item_id(doc), "") for doc in documents]
 
-    def similarity_search(self, query: SimilaritySearch, is_arabic: bool):
+    async def similarity_search(self, query: SimilaritySearch, is_arabic: bool):
 
-        query_embedding = self.generate_embedding(query.query)
+        query_embedding = await self.generate_embedding(normalize_query(query.query))
+        collection_name, vector_name = self.layout.target("ar" if is_arabic else "en")
         # Perform the search to get the sorted vector IDs
-        search_vector = self.vectordb.search_vector(
+        search_vector = await self.vectordb.search_vector(
             query_vector=query_embedding,
-            collection_name="items_ar" if is_arabic else "items_en",
+            collection_name=collection_name,
+            vector_name=vector_name,
             top_k=query.limit,
-            score_threshold=query.score_threshold
+            score_threshold=query.score_threshold,
+            filters=self.vector_filters(query.filters)
         )
         # Extract and prepare IDs from search_vector in the sorted order
         ids_to_search = [ObjectId(item) for item in search_vector]
         # Fetch the items from MongoDB in bulk using $in to get the documents
-        items = self.item_service.get_items(ids_to_search)
+        items = await self.item_service.get_items(ids_to_search, inline_images=query.inline_images,
+                                                  view=query.view("ar" if is_arabic else "en"),
+                                                  filters=query.filters)
         return items
 
-    def get_related_transaction(self, item_id: ObjectId):
-        pipeline = [
-            # Step 1: Find transactions that contain the selected item
-            {"$match": {"items": item_id}},
-
-            # Step 2: Unwind the items array
-            {"$unwind": "$items"},
-
-            # Step 3: Exclude the selected item
-            {"$match": {"items": {"$ne": item_id}}},
-
-            # Step 4: Group by item ID and count occurrences
-            {"$group": {"_id": "$items", "count": {"$sum": 1}}},
-
-            # Step 5: Sort by frequency (most frequently bought together items first)
-            {"$sort": {"count": -1}},
-
-            # Step 6: Limit results to top 10 (if available)
-            {"$limit": 10}
-        ]
-
-        # Run the aggregation
-        related_items = list(self.mongo.aggregate(collection="transactions", pipeline=pipeline))
-
-        items_details = []
-        for item in related_items:
-            item_details = self.item_service.get_item(item["_id"])
-            items_details.append(item_details)
-        return items_details
-
-    def search(self, query: SimilaritySearch) -> dict[str, list[GetItem] | list[Any] | list]:
-        # Detect language of the query and set flag for Arabic or English
-        is_arabic = False
-        if '\u0600' <= query.query[0] <= '\u06FF' or '\u0750' <= query.query[0] <= '\u077F' or '\u08A0' <= query.query[
-            0] <= '\u08FF':
-            is_arabic = True
-
-        # First, perform the MongoDB full-text search to get the initial results
-        cleaned_query = clean_arabic_text(query.query)
-        reranked_documents = []
-        similar_result = []
-        full_text_search_results = self.mongo_full_text_search(cleaned_query, filter=query.filters)[:query.limit]
-        if full_text_search_results:
-            # Rerank documents based on embedding similarity, depending on query language
-            reranked_documents = self.rerank_documents(query.query, full_text_search_results, is_arabic)
-
-        if len(full_text_search_results) < query.limit:
-            new_limit = query.limit - len(full_text_search_results)
-            query.limit = new_limit
-            similar_result = self.similarity_search(query, is_arabic)
-            # Remove items in reranked_documents from similar_result
-            similar_result = [item for item in similar_result if item not in reranked_documents]
+    async def get_related_transaction(self, item_id: ObjectId, inline_images: bool = False,
+                                      view: Optional[ItemView] = None):
+        # Read the most frequently bought together items from the co-purchase index
+        related_ids = await self.co_purchase.top_k(item_id, k=10)
+
+        # Fetch the related items in one query, keeping the frequency order
+        return await self.item_service.get_items(related_ids, inline_images=inline_images, view=view)
+
+    async def search(self, query: SimilaritySearch) -> dict[str, list[GetItem] | list[dict] | list[Any] | list]:
+        if query.mode == "hybrid":
+            return await self.hybrid_search(query)
+        is_arabic = detect_language(query.query) == "ar"
+
+        async def full_text_branch() -> list[GetItem] | list[dict]:
+            # MongoDB full-text search, reranked by embedding similarity
+            cleaned_query = normalize_query(query.query)
+            documents = await self.mongo_full_text_search(cleaned_query, filter=query.filters, limit=query.limit,
+                                                          inline_images=query.inline_images,
+                                                          view=query.view("ar" if is_arabic else "en"))
+            if not documents:
+                return []
+            return await self.rerank_documents(cleaned_query, documents, is_arabic)
+
+        # Run the full-text and vector searches concurrently. The vector search asks for the
+        # full limit because it no longer knows how many full-text hits there will be.
+        reranked_documents, similar_result = await asyncio.gather(
+            full_text_branch(),
+            self.similarity_search(query, is_arabic),
+        )
+
+        # Keep the vector results that fill the remaining slots and are not already returned
+        remaining = query.limit - len(reranked_documents)
+        seen_ids = {self._item_id(item) for item in reranked_documents}
+        similar_result = [item for item in similar_result
+                          if self._item_id(item) not in seen_ids][:max(remaining, 0)]
 
         results = {
             "results": reranked_documents,
@@ -148,8 +186,91 @@ class SimilarService:
         }
         return results
 
-    def web_search(self, item_id: ObjectId) -> dict[str, list[dict[str, Any]] | Any]:
-        item = GetItem(**self.mongo.find_one(collection="items", query={"_id": item_id}))
-        query_en = f"{item.name_en} {item.color_en}"
-        web_search_results_en = self.web_search_service.search(query_en)
+    async def hybrid_search(self, query: SimilaritySearch) -> dict[str, list[ScoredItem] | list[dict] | list]:
+        """
+        Run full-text and vector retrieval concurrently and fuse them into one ranked list.
+        Every result carries the fused score and the raw score and rank from each retriever.
+        Equality filters on payload fields narrow the vector search; every filter is applied
+        again when the items are fetched, so they constrain both retrievers.
+        """
+        is_arabic = detect_language(query.query) == "ar"
+        candidates = query.limit * self.candidate_factor
+        view = query.view("ar" if is_arabic else "en")
+        projection = self.item_service.projection(view)
+
+        async def text_branch() -> list[dict]:
+            return await self.mongo.text_search(collection="items", query=normalize_query(query.query),
+                                                filter=query.filters, limit=candidates, projection=projection)
+
+        async def vector_branch() -> list[tuple[str, float]]:
+            query_embedding = await self.generate_embedding(normalize_query(query.query))
+            collection_name, vector_name = self.layout.target("ar" if is_arabic else "en")
+            return await self.vectordb.search_vector_scored(
+                query_vector=query_embedding,
+                collection_name=collection_name,
+                vector_name=vector_name,
+                top_k=candidates,
+                score_threshold=query.score_threshold,
+                filters=self.vector_filters(query.filters)
+            )
+
+        text_documents, vector_hits = await asyncio.gather(text_branch(), vector_branch())
+
+        ranked_lists = {
+            "text": [(str(document["_id"]), document.pop("score")) for document in text_documents],
+            "vector": vector_hits,
+        }
+        weights = {"text": query.text_weight, "vector": 1 - query.text_weight}
+        if query.fusion == "weighted":
+            fused = weighted_score_fusion(ranked_lists, weights=weights)
+        else:
+            fused = reciprocal_rank_fusion(ranked_lists, weights=weights, k=self.rrf_k)
+
+        # Full-text hits are already loaded; fetch the vector-only hits in one query
+        documents = {str(document["_id"]): document for document in text_documents}
+        missing = [ObjectId(result.item_id) for result in fused if result.item_id not in documents]
+        if missing:
+            missing_query = {"_id": {"$in": missing}, **(query.filters or {})}
+            for document in await self.mongo.find_many(collection="items", query=missing_query,
+                                                       projection=projection):
+                documents[str(document["_id"])] = document
+
+        top = [result for result in fused if result.item_id in documents][:query.limit]
+        items = await self.item_service.to_items([documents[result.item_id] for result in top],
+                                                 inline_images=query.inline_images, view=view)
+        if not view.full:
+            results = [{**item, "score": result.score, "scores": result.scores, "ranks": result.ranks}
+                       for item, result in zip(items, top)]
+        else:
+            results = [ScoredItem(**item.model_dump(by_alias=True), score=result.score,
+                                  scores=result.scores, ranks=result.ranks)
+                       for item, result in zip(items, top)]
+        return {
+            "results": results,
+            "related_results": []
+        }
+
+    async def web_search(self, item_id: ObjectId) -> dict[str, list[dict[str, Any]] | Any]:
+        item = await self.mongo.find_one(collection="items", query={"_id": item_id},
+                                         projection={"name_en": 1, "color_en": 1})
+        web_search_results_en = await self.web_search_service.search(self.web_search_query(item))
         return web_search_results_en
+
+    @staticmethod
+    def web_search_query(item: dict) -> str:
+        return f"{item['name_en']} {item['color_en']}"
+
+    async def prewarm_web_search(self, limit: int, concurrency: int = 4) -> int:
+        """
+        Cache the web search results of the most co-purchased items, or of the first
+        catalog items while there are no transactions yet.
+        :param limit: The number of items to search.
+        :param concurrency: The maximum number of web searches in flight.
+        :return: The number of items whose results are cached.
+        """
+        item_ids = await self.co_purchase.popular(limit)
+        query = {"_id": {"$in": item_ids}} if item_ids else {}
+        items = await self.mongo.find_many(collection="items", query=query, limit=limit,
+                                           projection={"name_en": 1, "color_en": 1})
+        return await self.web_search_service.warm([self.web_search_query(item) for item in items],
+                                                  concurrency=concurrency)
@@ -1,20 +1,212 @@
-from app.database.mongo import Mongo
+import asyncio
+import codecs
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Optional
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from pyobjectID.errors import InvalidObjectIdError
+
+from app.database.mongo import AsyncMongo
 from app.models.transactions import Transaction
+from app.services.co_purchase_index import CoPurchaseIndex
+
+
+async def read_json_records(chunks: AsyncIterable[bytes], fmt: str = "ndjson") -> AsyncIterator[Any]:
+    """
+    Incrementally parse records from a stream of byte chunks.
+    NDJSON lines that are not valid JSON are yielded as the `ValueError` describing them,
+    so a single bad line is rejected without aborting the stream. A malformed JSON array
+    raises instead, since the position of the following records is lost.
+    :param chunks: The byte chunks, e.g. a request body stream.
+    :param fmt: "ndjson" (one record per line) or "json" (a single array of records).
+    :return: An async iterator over the parsed records.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    if fmt == "ndjson":
+        async for chunk in chunks:
+            buffer += utf8.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield _loads(line)
+        buffer += utf8.decode(b"", final=True)
+        if buffer.strip():
+            yield _loads(buffer)
+    elif fmt == "json":
+        decoder = json.JSONDecoder()
+        # "start" -> "[" -> "first" -> record -> "separator" -> "," -> "value" -> record ... -> "]" -> "end"
+        state = "start"
+        final = False
+        iterator = chunks.__aiter__()
+        while not final:
+            try:
+                buffer += utf8.decode(await iterator.__anext__())
+            except StopAsyncIteration:
+                buffer += utf8.decode(b"", final=True)
+                final = True
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position == len(buffer):
+                    break
+                char = buffer[position]
+                if state == "start":
+                    if char != "[":
+                        raise ValueError("Expected a JSON array of records")
+                    position += 1
+                    state = "first"
+                elif state == "first" and char == "]" or state == "separator" and char == "]":
+                    position += 1
+                    state = "end"
+                elif state in ("first", "value"):
+                    try:
+                        record, position = decoder.raw_decode(buffer, position)
+                    except json.JSONDecodeError as e:
+                        if final:
+                            raise ValueError(f"Invalid JSON: {e}")
+                        break  # The record is incomplete; wait for more data
+                    yield record
+                    state = "separator"
+                elif state == "separator" and char == ",":
+                    position += 1
+                    state = "value"
+                else:
+                    raise ValueError(f"Unexpected {char!r} in the JSON array")
+            buffer = buffer[position:]
+        if state != "end":
+            raise ValueError("Truncated JSON array")
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _loads(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+def object_id_at(timestamp: datetime) -> ObjectId:
+    # from_datetime zeroes the other bytes, so they are random to keep ids of the same second unique
+    return ObjectId(ObjectId.from_datetime(timestamp).binary[:4] + os.urandom(8))
+
+
+def transaction_document(transaction: Transaction) -> dict:
+    """
+    The stored form of a transaction. Its time is kept only in the `_id`, which is dated to the given
+    timestamp, so backfilled purchases get their own age in the co-purchase decay.
+    """
+    _id = object_id_at(transaction.timestamp) if transaction.timestamp else ObjectId()
+    return {"_id": _id, **transaction.model_dump(exclude={"timestamp"})}
 
 
 class TransactionService:
-    def __init__(self, mongo: Mongo):
+    def __init__(self, mongo: AsyncMongo, co_purchase: CoPurchaseIndex, chunk_size: int = 1000):
+        """
+        :param mongo: The Mongo client.
+        :param co_purchase: The co-purchase index updated with every transaction.
+        :param chunk_size: The number of transactions written together by `bulk_create`.
+        """
         self.mongo = mongo
+        self.co_purchase = co_purchase
+        self.chunk_size = chunk_size
 
-    def create_transaction(self, transaction: Transaction) -> str:
+    async def create_transaction(self, transaction: Transaction) -> str:
         """
         Create a new transaction in the MongoDB database.
 
-        This method creates a new transaction in the MongoDB database
-        and returns the ID of the created transaction.
+        This method creates a new transaction in the MongoDB database,
+        adds its items to the co-purchase index and returns the ID of the created transaction.
 
         :param transaction: The transaction to create.
         :return: The ID of the created transaction.
         """
-        result = self.mongo.insert(collection="transactions", data=transaction.model_dump())
+        data = transaction_document(transaction)
+        result = await self.mongo.insert(collection="transactions", data=data)
+        await self.co_purchase.record(data["items"], timestamp=result.inserted_id.generation_time)
         return str(result.inserted_id)
+
+    async def bulk_create(self, records: AsyncIterable[Any], chunk_size: Optional[int] = None) -> dict:
+        """
+        Validate and insert a stream of raw transaction records.
+
+        Records are validated one at a time and written in chunks with unordered
+        `insert_many`. A chunk is written while the next one is being parsed, and the
+        co-purchase index is updated once per chunk.
+
+        :param records: The raw records, e.g. from `read_json_records`.
+        :param chunk_size: The number of transactions per write, `self.chunk_size` by default.
+        :return: A report with accepted/rejected counts, in total and per chunk.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        report = {"accepted": 0, "rejected": 0, "errors": [], "chunks": []}
+        started = time.perf_counter()
+        pending: Optional[asyncio.Task] = None
+        documents: list[dict] = []
+        positions: list[int] = []
+        rejected = 0
+        position = 0
+        try:
+            async for record in records:
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    documents.append(transaction_document(Transaction.model_validate(record)))
+                    positions.append(position)
+                except (ValueError, ValidationError, InvalidObjectIdError, TypeError) as e:
+                    rejected += 1
+                    self._add_error(report, position, e)
+                position += 1
+                if len(documents) + rejected >= chunk_size:
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.create_task(self._write_chunk(documents, positions, rejected, position,
+                                                                    report))
+                    documents, positions, rejected = [], [], 0
+        except ValueError as e:
+            # The stream itself is malformed; keep what was written so far
+            report["error"] = str(e)
+        finally:
+            if pending is not None:
+                await pending
+        if documents or rejected:
+            await self._write_chunk(documents, positions, rejected, position, report)
+
+        elapsed = time.perf_counter() - started
+        report["seconds"] = round(elapsed, 3)
+        report["transactions_per_sec"] = round(report["accepted"] / elapsed, 1) if elapsed else None
+        return report
+
+    async def _write_chunk(self, documents: list[dict], positions: list[int], rejected: int, end: int,
+                           report: dict):
+        inserted = documents
+        if documents:
+            try:
+                await self.mongo.insert_many(collection="transactions", data=documents, ordered=False)
+            except BulkWriteError as e:
+                # Unordered inserts keep going past failures; drop only the failed documents
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                inserted = [document for index, document in enumerate(documents) if index not in failed]
+                for error in e.details.get("writeErrors", []):
+                    self._add_error(report, positions[error["index"]], error["errmsg"])
+            # The ids are dated to the purchase time, so it also sets the decay weight
+            await self.co_purchase.record_many([(document["items"], document["_id"].generation_time)
+                                                for document in inserted])
+        chunk_rejected = rejected + len(documents) - len(inserted)
+        report["chunks"].append({"chunk": len(report["chunks"]), "end": end,
+                                 "accepted": len(inserted), "rejected": chunk_rejected})
+        report["accepted"] += len(inserted)
+        report["rejected"] += chunk_rejected
+
+    @staticmethod
+    def _add_error(report: dict, position: int, error):
+        # Keep the report small on very bad inputs
+        if len(report["errors"]) < 20:
+            report["errors"].append({"record": position, "error": str(error)})
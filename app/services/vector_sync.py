@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic import ValidationError
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+from app.core.embed import AsyncCohereClient
+from app.core.tracing import metrics
+from app.database.mongo import AsyncMongo
+from app.database.vector_store import AsyncVectorStore, VectorLayout, point_id_for
+from app.models.item import Item
+from app.services.item_service import EMBED_MODEL, ItemService
+
+logger = logging.getLogger(__name__)
+
+# The resume token of the change stream is older than the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+# Seconds between two attempts to reopen a failed change stream, doubled up to the maximum
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+# Fields read from an item to decide whether it must be re-embedded
+PROJECTION = {**{field: 1 for field in Item.model_fields}, "embedding_hash": 1}
+
+
+class VectorSyncWorker:
+    def __init__(self, mongo: AsyncMongo, cohere: AsyncCohereClient, vectordb: AsyncVectorStore,
+                 layout: VectorLayout = None, batch_size: int = 256, flush_interval: float = 1.0,
+                 collection: str = "items", state_collection: str = "sync_state", name: str = "items_vectors"):
+        """
+        Keep the item vectors in sync with the items collection by tailing its change stream.
+        Changes are coalesced per item until `batch_size` items are pending or `flush_interval`
+        seconds have passed, so a burst of edits to one item costs one embedding. An item is only
+        re-embedded when the hash of its search text differs from the stored `embedding_hash`;
+        price or color edits only rewrite the vector payloads. Deleted items lose their vectors.
+        The resume token is persisted after every flush, so a restarted worker continues where
+        it stopped. Without a token, or when it has left the oplog, `catch_up` scans the whole
+        collection with the same hash check, which also backfills the payloads of older points;
+        items deleted meanwhile keep their vectors.
+        Change streams need a replica set, and the worker should run in a single process.
+        :param mongo: The Mongo client.
+        :param cohere: The embedding client.
+        :param vectordb: The vector store.
+        :param layout: The collections and vector names of the vectors.
+        :param batch_size: The maximum number of items embedded and written per flush.
+        :param flush_interval: The maximum number of seconds a change waits before it is flushed.
+        :param collection: The collection holding the items.
+        :param state_collection: The collection holding the resume token.
+        :param name: The id of the resume token document.
+        """
+        self.mongo = mongo
+        self.cohere = cohere
+        self.vectordb = vectordb
+        self.layout = layout or VectorLayout()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.collection = collection
+        self.state_collection = state_collection
+        self.name = name
+
+    async def load_token(self) -> Optional[dict]:
+        state = await self.mongo.find_one(collection=self.state_collection, query={"_id": self.name})
+        return state.get("resume_token") if state else None
+
+    async def save_token(self, token: Optional[dict]):
+        await self.mongo.bulk_write(collection=self.state_collection, operations=[
+            UpdateOne({"_id": self.name},
+                      {"$set": {"resume_token": token, "updated_at": datetime.now(timezone.utc)}},
+                      upsert=True)
+        ])
+
+    async def run(self):
+        """Tail the change stream until cancelled, reopening it after errors."""
+        delay = RETRY_DELAY
+        while True:
+            try:
+                await self.follow()
+                delay = RETRY_DELAY
+            except Exception as e:
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Vector sync resume token is no longer in the oplog, catching up")
+                    await self.save_token(None)
+                    continue
+                logger.warning("Vector sync failed, retrying in %ss", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def follow(self):
+        """Consume the change stream, flushing coalesced changes, until it is closed."""
+        token = await self.load_token()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        async with await self.mongo.watch(self.collection, pipeline, full_document="updateLookup",
+                                          resume_after=token,
+                                          max_await_time_ms=int(self.flush_interval * 1000)) as stream:
+            if token is None:
+                # The stream is open before the scan, so changes made during it are not lost
+                await self.catch_up()
+                token = stream.resume_token
+                await self.save_token(token)
+            pending: dict = {}
+            oldest = None  # Cluster time of the oldest pending change
+            deadline = time.monotonic() + self.flush_interval
+            # Changes read before the stream closed are still flushed
+            while stream.alive or pending:
+                change = await stream.try_next() if stream.alive else None
+                if change is not None:
+                    # A later change of the same item replaces the earlier one; None marks a deletion
+                    pending[change["documentKey"]["_id"]] = change.get("fullDocument")
+                    oldest = oldest or change["clusterTime"].time
+                    metrics.set_gauge("vector_sync_pending", len(pending), "Changed items waiting to be flushed")
+                if stream.alive and len(pending) < self.batch_size and time.monotonic() < deadline:
+                    continue
+                lag = time.time() - oldest if pending else 0.0
+                metrics.set_gauge("vector_sync_lag_seconds", max(lag, 0.0),
+                                  "Age of the oldest change when it was flushed")
+                if pending:
+                    await self.flush(pending)
+                    pending, oldest = {}, None
+                    metrics.set_gauge("vector_sync_pending", 0, "Changed items waiting to be flushed")
+                # Every change up to the token is flushed; an idle stream still moves it forward
+                if stream.resume_token != token:
+                    token = stream.resume_token
+                    await self.save_token(token)
+                deadline = time.monotonic() + self.flush_interval
+
+    async def catch_up(self) -> int:
+        """
+        Sync every item whose vectors were not embedded from its current text.
+        :return: The number of re-embedded items.
+        """
+        embedded = 0
+        last_id = None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            documents = await self.mongo.find_many(collection=self.collection, query=query,
+                                                   sort=[("_id", ASCENDING)], limit=self.batch_size,
+                                                   projection=PROJECTION)
+            if not documents:
+                return embedded
+            embedded += await self.flush({document["_id"]: document for document in documents})
+            last_id = documents[-1]["_id"]
+
+    async def flush(self, changes: dict) -> int:
+        """
+        Apply coalesced changes: embed the items whose text changed, then write their vectors
+        and search fields, rewrite the payloads of the other items, and delete the vectors of
+        deleted items.
+        :param changes: The latest document of every changed item by id, None for a deleted item.
+        :return: The number of re-embedded items.
+        """
+        ids, items, documents = [], [], []
+        deleted = [str(item_id) for item_id, document in changes.items() if document is None]
+        for item_id, document in changes.items():
+            if document is None:
+                continue
+            try:
+                items.append(Item(**document))
+            except ValidationError:
+                logger.warning("Item %s is not valid, its vectors are not synced", item_id)
+                continue
+            ids.append(item_id)
+            documents.append(document)
+        fields = ItemService.search_fields(items)
+        changed, unchanged = [], []
+        for item_id, item, document, search in zip(ids, items, documents, fields):
+            payload = ItemService.vector_payload(str(item_id), item)
+            if document.get("embedding_hash") != search["embedding_hash"]:
+                changed.append((item_id, search, payload))
+            else:
+                unchanged.append(payload)
+
+        if unchanged:
+            # The filterable fields may have changed, so the payloads are rewritten without re-embedding
+            await asyncio.gather(*(
+                self.vectordb.set_payloads([payload["id"] for payload in unchanged], unchanged, collection_name)
+                for collection_name in self.layout.collections()
+            ))
+            metrics.increment("vector_sync_items_total", len(unchanged), "Changed items by sync action",
+                              action="unchanged")
+
+        if changed:
+            searches = [search for _, search, _ in changed]
+            texts = [search["search_ar"] for search in searches] + [search["search_en"] for search in searches]
+            embeddings = await self.cohere.embed_texts(texts=texts,
+                                                       model=EMBED_MODEL,
+                                                       input_type="search_query",
+                                                       embedding_types=["float"])
+            mongo_ids = [str(item_id) for item_id, _, _ in changed]
+            payloads = [payload for _, _, payload in changed]
+            point_ids = [point_id_for(mongo_id) for mongo_id in mongo_ids]
+            await asyncio.gather(*(
+                self.vectordb.insert_vectors(vectors=vectors, payloads=payloads,
+                                             collection_name=collection_name, point_ids=point_ids)
+                for collection_name, vectors in self.layout.points({"ar": embeddings[:len(changed)],
+                                                                    "en": embeddings[len(changed):]})
+            ))
+            # Written after the vectors, so a failed flush is retried; this update only
+            # comes back as an unchanged item
+            await self.mongo.bulk_write(collection=self.collection, operations=[
+                UpdateOne({"_id": item_id}, {"$set": search}) for item_id, search, _ in changed
+            ])
+            metrics.increment("vector_sync_items_total", len(changed), "Changed items by sync action",
+                              action="embedded")
+
+        if deleted:
+            await asyncio.gather(*(self.vectordb.delete_vectors(deleted, collection_name)
+                                   for collection_name in self.layout.collections()))
+            metrics.increment("vector_sync_items_total", len(deleted), "Changed items by sync action",
+                              action="deleted")
+        return len(changed)
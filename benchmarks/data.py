@@ -0,0 +1,75 @@
+"""
+Synthetic bilingual catalogs and transaction histories.
+"""
+import numpy as np
+from bson import ObjectId
+
+# (English, Arabic) vocabularies the product names are assembled from
+PRODUCTS = [
+    ("forklift", "رافعة شوكية"), ("pallet jack", "رافعة منصات"), ("safety helmet", "خوذة أمان"),
+    ("work gloves", "قفازات عمل"), ("digital scale", "ميزان رقمي"), ("ladder", "سلم"),
+    ("drill", "مثقاب"), ("generator", "مولد كهربائي"), ("air compressor", "ضاغط هواء"),
+    ("welding machine", "آلة لحام"), ("tool box", "صندوق عدة"), ("hand truck", "عربة يد"),
+    ("safety vest", "سترة أمان"), ("storage rack", "رف تخزين"), ("water pump", "مضخة مياه"),
+    ("angle grinder", "صاروخ تجليخ"),
+]
+COLORS = [
+    ("yellow", "أصفر"), ("red", "أحمر"), ("blue", "أزرق"), ("black", "أسود"), ("white", "أبيض"),
+    ("green", "أخضر"), ("orange", "برتقالي"), ("gray", "رمادي"),
+]
+MATERIALS = ["steel", "aluminum", "plastic", "rubber", "fiberglass", "leather"]
+ADJECTIVES = [
+    ("heavy duty", "للاستخدام الشاق"), ("compact", "صغير الحجم"), ("industrial", "صناعي"),
+    ("portable", "محمول"), ("professional", "احترافي"), ("electric", "كهربائي"),
+]
+
+
+def synthetic_items(count: int, rng: np.random.Generator) -> list[dict]:
+    """Generate `count` bilingual catalog items matching the `Item` model."""
+    items = []
+    for i in range(count):
+        product_en, product_ar = PRODUCTS[rng.integers(len(PRODUCTS))]
+        color_en, color_ar = COLORS[rng.integers(len(COLORS))]
+        adjective_en, adjective_ar = ADJECTIVES[rng.integers(len(ADJECTIVES))]
+        material = MATERIALS[rng.integers(len(MATERIALS))]
+        items.append({
+            "name_ar": f"{product_ar} {adjective_ar} {i}",
+            "name_en": f"{adjective_en} {product_en} {i}",
+            "description_ar": f"{product_ar} {adjective_ar} من {material} باللون {color_ar}",
+            "description_en": f"A {adjective_en} {color_en} {product_en} made of {material}.",
+            "color_ar": color_ar,
+            "color_en": color_en,
+            "material": material,
+            "price": float(round(rng.uniform(10, 50000), 2)),
+        })
+    return items
+
+
+def synthetic_transactions(item_ids: list[ObjectId], count: int, rng: np.random.Generator,
+                           users: int = 1000) -> list[dict]:
+    """
+    Generate `count` baskets of 2 to 6 items. Item popularity follows a Zipf-like
+    distribution, so some pairs are bought together far more often than others.
+    """
+    weights = 1.0 / np.arange(1, len(item_ids) + 1)
+    weights /= weights.sum()
+    user_ids = [ObjectId() for _ in range(users)]
+    transactions = []
+    for _ in range(count):
+        size = min(int(rng.integers(2, 7)), len(item_ids))
+        basket = rng.choice(len(item_ids), size=size, replace=False, p=weights)
+        transactions.append({"user_id": str(user_ids[rng.integers(users)]),
+                             "items": [str(item_ids[index]) for index in basket]})
+    return transactions
+
+
+def queries(items: list[dict], count: int, rng: np.random.Generator) -> list[str]:
+    """Search queries built from catalog vocabulary, half English and half Arabic."""
+    result = []
+    for i in range(count):
+        item = items[rng.integers(len(items))]
+        if i % 2:
+            result.append(f"{item['color_ar']} {item['name_ar'].rsplit(' ', 1)[0]}")
+        else:
+            result.append(f"{item['color_en']} {item['name_en'].rsplit(' ', 1)[0]}")
+    return result
@@ -0,0 +1,470 @@
+"""
+Deterministic local stand-ins for the paid and networked dependencies.
+
+The Cohere, Tavily and OpenAI fakes subclass the real clients and only replace the
+upstream call, so batching, caching and coalescing in the real classes stay on the
+measured path. Upstream latency is simulated with `Latency`.
+
+`InMemoryMongo` implements the subset of `AsyncMongo`/`Mongo` the services use, with
+just enough of the query language for their filters and aggregation pipelines.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.embed import AsyncCohereClient, CohereClient
+from app.core.llm import LLM, LLMResponse
+from app.core.web_search import WebSearch
+
+DIMENSIONS = 384
+OBJECT_ID = re.compile(r"\b[0-9a-f]{24}\b")
+TOKEN = re.compile(r"\w+")
+
+
+class Latency:
+    def __init__(self, median_ms: float = 0.0, p99_ms: Optional[float] = None, seed: int = 0):
+        """
+        Log-normal latency with the given median and 99th percentile; fixed when p99 is omitted.
+        :param median_ms: The median latency in milliseconds.
+        :param p99_ms: The 99th percentile in milliseconds.
+        :param seed: The random seed.
+        """
+        self.median_ms = median_ms
+        # 2.326 is the z-score of the 99th percentile
+        self.sigma = math.log(p99_ms / median_ms) / 2.326 if p99_ms and median_ms else 0.0
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "Latency":
+        """Parse "MEDIAN" or "MEDIAN:P99", in milliseconds."""
+        median, _, p99 = spec.partition(":")
+        return cls(float(median), float(p99) if p99 else None, seed=seed)
+
+    def sample(self) -> float:
+        """A latency in seconds."""
+        if not self.median_ms:
+            return 0.0
+        return self.median_ms * math.exp(self.sigma * self.rng.standard_normal()) / 1000
+
+    async def wait(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def block(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+
+class HashingEmbedder:
+    def __init__(self, dimensions: int = DIMENSIONS):
+        """
+        Bag-of-words embedding: every token maps to a fixed random vector and a text is the
+        normalized sum of its tokens, so texts sharing words are similar.
+        """
+        self.dimensions = dimensions
+        self._tokens: dict[str, np.ndarray] = {}
+
+    def _token(self, token: str) -> np.ndarray:
+        vector = self._tokens.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode()))
+            vector = self._tokens[token] = rng.standard_normal(self.dimensions).astype(np.float32)
+        return vector
+
+    def embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN.findall(text.lower()):
+            vector += self._token(token)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+def _embed_response(embedder: HashingEmbedder, texts: list[str]):
+    vectors = [embedder.embed(text) for text in texts]
+    return SimpleNamespace(embeddings=SimpleNamespace(model_dump=lambda: {"float_": vectors}))
+
+
+class FakeCohereClient(CohereClient):
+    def __init__(self, latency: Latency, embedder: HashingEmbedder, **kwargs):
+        super().__init__(api_key="offline", **kwargs)
+        self.latency = latency
+        self.embedder = embedder
+        self.calls = 0
+
+    def _embed_chunk(self, texts, model, input_type, embedding_types):
+        self.calls += 1
+        self.latency.block()
+        return self._parse(_embed_response(self.embedder, texts), texts)
+
+
+class FakeAsyncCohereClient(AsyncCohereClient):
+    def __init__(self, latency: Latency, embedder: HashingEmbedder, **kwargs):
+        super().__init__(api_key="offline", **kwargs)
+        self.latency = latency
+        self.embedder = embedder
+        self.calls = 0
+
+    async def _embed_chunk(self, texts, model, input_type, embedding_types):
+        self.calls += 1
+        await self.latency.wait()
+        return self._parse(_embed_response(self.embedder, texts), texts)
+
+
+class FakeWebSearch(WebSearch):
+    def __init__(self, latency: Latency, **kwargs):
+        super().__init__(api_key="offline", **kwargs)
+        self.latency = latency
+        self.calls = 0
+
+    async def _search(self, query: str) -> dict:
+        self.calls += 1
+        await self.latency.wait()
+        digest = hashlib.sha1(query.encode()).hexdigest()
+        return {
+            "results": [{"title": f"{query} ({i})", "content": f"Offer {i} for {query}.",
+                         "url": f"https://www.amazon.com/dp/{digest[i:i + 10].upper()}"} for i in range(5)],
+            "images": [],
+        }
+
+
+class FakeLLM(LLM):
+    def __init__(self, latency: Latency, tokens: int = 60):
+        """
+        :param latency: The latency of a whole completion; streaming spreads it over the tokens.
+        :param tokens: The number of words in every answer.
+        """
+        super().__init__(api_key="offline")
+        self.latency = latency
+        self.tokens = tokens
+        self.calls = 0
+
+    def _answer(self, user: str) -> LLMResponse:
+        item_ids = OBJECT_ID.findall(user)
+        words = [f"word{i}" for i in range(self.tokens)]
+        return LLMResponse(answer=" ".join(words), item_id=item_ids[0] if item_ids else None)
+
+    async def generate_response(self, system: str, user: str):
+        self.calls += 1
+        await self.latency.wait()
+        return self._answer(user)
+
+    async def stream_response(self, system: str, user: str):
+        self.calls += 1
+        answer = self._answer(user)
+        delay = self.latency.sample() / max(self.tokens, 1)
+        for word in answer.answer.split(" "):
+            await asyncio.sleep(delay)
+            yield word + " "
+        yield answer
+
+
+def _get(document: dict, path: str):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _equals(value, expected) -> bool:
+    # Like Mongo, equality on an array field matches any of its elements
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = _get(document, key)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$in":
+                    if not any(_equals(value, candidate) for candidate in operand):
+                        return False
+                elif op == "$gte":
+                    if value is None or value < operand:
+                        return False
+                elif op == "$lte":
+                    if value is None or value > operand:
+                        return False
+                elif op == "$gt":
+                    if value is None or value <= operand:
+                        return False
+                elif op == "$exists":
+                    if (value is not None) != bool(operand):
+                        return False
+                else:
+                    raise NotImplementedError(f"Operator {op} is not supported by the in-memory Mongo")
+        elif not _equals(value, condition):
+            return False
+    return True
+
+
+def _copy(document: dict, projection: Optional[dict] = None) -> dict:
+    # Every read returns fresh documents, like a real driver decoding BSON
+    return {key: list(value) if isinstance(value, list) else value for key, value in document.items()
+            if projection is None or key == "_id" or projection.get(key) == 1}
+
+
+def _sort(documents: list[dict], keys: list) -> list[dict]:
+    for key, direction in reversed(keys):
+        documents.sort(key=lambda document: (_get(document, key) is None, _get(document, key)),
+                       reverse=direction == -1)
+    return documents
+
+
+class InMemoryMongo:
+    def __init__(self):
+        """
+        Collections of documents keyed by `_id`, with equality indexes on the fields passed
+        to `create_index` and an inverted index over every string field for `$text`.
+        """
+        self.collections: dict[str, dict] = {}
+        self.indexes: dict[str, dict[str, dict]] = {}
+        self.text: dict[str, dict[str, dict]] = {}
+
+    def _collection(self, name: str) -> dict:
+        return self.collections.setdefault(name, {})
+
+    def create_index(self, collection: str, field: str):
+        index = self.indexes.setdefault(collection, {})
+        if field not in index:
+            index[field] = {}
+            for document in self._collection(collection).values():
+                index[field].setdefault(_get(document, field), set()).add(document["_id"])
+
+    def _index(self, collection: str, document: dict):
+        for field, index in self.indexes.get(collection, {}).items():
+            index.setdefault(_get(document, field), set()).add(document["_id"])
+        text = self.text.setdefault(collection, {})
+        for value in document.values():
+            if isinstance(value, str):
+                for token in TOKEN.findall(value.lower()):
+                    postings = text.setdefault(token, {})
+                    postings[document["_id"]] = postings.get(document["_id"], 0) + 1
+
+    def _insert(self, collection: str, document: dict):
+        document.setdefault("_id", ObjectId())
+        documents = self._collection(collection)
+        if document["_id"] in documents:
+            raise KeyError(document["_id"])
+        documents[document["_id"]] = _copy(document)
+        self._index(collection, documents[document["_id"]])
+        return document["_id"]
+
+    def _insert_many(self, collection: str, data: list[dict], ordered: bool):
+        inserted, errors = [], []
+        for index, document in enumerate(data):
+            try:
+                inserted.append(self._insert(collection, document))
+            except KeyError:
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    def _candidates(self, collection: str, query: dict) -> list[dict]:
+        documents = self._collection(collection)
+        ids = None
+        condition = query.get("_id")
+        if isinstance(condition, dict) and "$in" in condition:
+            ids = condition["$in"]
+        elif condition is not None and not isinstance(condition, dict):
+            ids = [condition]
+        else:
+            for field, index in self.indexes.get(collection, {}).items():
+                condition = query.get(field)
+                if condition is not None and not isinstance(condition, dict):
+                    ids = index.get(condition, ())
+                    break
+        if ids is None:
+            return list(documents.values())
+        return [documents[_id] for _id in ids if _id in documents]
+
+    def _find(self, collection: str, query: dict, sort: list = None, limit: int = 0,
+              projection: dict = None) -> list[dict]:
+        documents = [document for document in self._candidates(collection, query) if matches(document, query)]
+        if sort:
+            documents = _sort(documents, sort)
+        if limit:
+            documents = documents[:limit]
+        return [_copy(document, projection) for document in documents]
+
+    def _text_search(self, collection: str, query: str, filter: dict, with_score: bool, limit: int,
+                     projection: dict = None, skip: int = 0) -> list[dict]:
+        text = self.text.get(collection, {})
+        scores: dict = {}
+        for term in set(TOKEN.findall(query.lower())):
+            for _id, count in text.get(term, {}).items():
+                scores[_id] = scores.get(_id, 0) + count
+        documents = self._collection(collection)
+        results = []
+        for _id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            document = documents[_id]
+            if filter and not matches(document, filter):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            result = _copy(document, projection)
+            if with_score:
+                result["score"] = float(score)
+            results.append(result)
+            if limit and len(results) == limit:
+                break
+        return results
+
+    def _aggregate(self, collection: str, pipeline: list) -> list[dict]:
+        documents = None
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                candidates = self._candidates(collection, spec) if documents is None else documents
+                documents = [document for document in candidates if matches(document, spec)]
+                continue
+            if documents is None:
+                documents = list(self._collection(collection).values())
+            if name == "$addFields":
+                documents = [{**document, **{field: self._expression(document, expression)
+                                             for field, expression in spec.items()}} for document in documents]
+            elif name == "$sort":
+                documents = _sort(list(documents), list(spec.items()))
+            elif name == "$limit":
+                documents = documents[:spec]
+            elif name == "$project":
+                documents = [_copy(document, spec) for document in documents]
+            elif name == "$group":
+                groups: dict = {}
+                for document in documents:
+                    key = self._expression(document, spec["_id"])
+                    group = groups.setdefault(key, {"_id": key})
+                    for field, accumulator in spec.items():
+                        if field != "_id":
+                            (op, expression), = accumulator.items()
+                            if op != "$sum":
+                                raise NotImplementedError(f"Accumulator {op} is not supported")
+                            group[field] = group.get(field, 0) + self._expression(document, expression)
+                documents = list(groups.values())
+            else:
+                raise NotImplementedError(f"Stage {name} is not supported by the in-memory Mongo")
+        if documents is None:
+            documents = list(self._collection(collection).values())
+        return [_copy(document) for document in documents]
+
+    @staticmethod
+    def _expression(document: dict, expression):
+        if isinstance(expression, str) and expression.startswith("$"):
+            return _get(document, expression[1:])
+        if isinstance(expression, dict) and "$indexOfArray" in expression:
+            array, value = expression["$indexOfArray"]
+            value = _get(document, value[1:])
+            return array.index(value) if value in array else -1
+        return expression
+
+    def _bulk_write(self, collection: str, operations: list):
+        for operation in operations:
+            query, update = operation._filter, operation._doc
+            found = [document for document in self._candidates(collection, query) if matches(document, query)][:1]
+            if not found:
+                if not operation._upsert:
+                    continue
+                self._insert(collection, dict(query))
+                found = [document for document in self._candidates(collection, query)
+                         if matches(document, query)][:1]
+            for op, fields in update.items():
+                if op == "$inc":
+                    for field, amount in fields.items():
+                        found[0][field] = found[0].get(field, 0) + amount
+                elif op == "$set":
+                    found[0].update(fields)
+                else:
+                    raise NotImplementedError(f"Update {op} is not supported by the in-memory Mongo")
+
+
+class FakeAsyncMongo:
+    def __init__(self, store: InMemoryMongo):
+        """`AsyncMongo` on an `InMemoryMongo`."""
+        self.store = store
+
+    async def close(self):
+        pass
+
+    async def insert(self, collection: str, data: dict):
+        return SimpleNamespace(inserted_id=self.store._insert(collection, data))
+
+    async def insert_many(self, collection: str, data: list[dict], ordered: bool = False):
+        return self.store._insert_many(collection, data, ordered)
+
+    async def aggregate(self, collection: str, pipeline: list, **kwargs) -> list:
+        return self.store._aggregate(collection, pipeline)
+
+    async def find_one(self, collection: str, query: dict, projection: dict = None) -> dict:
+        documents = self.store._find(collection, query, limit=1, projection=projection)
+        return documents[0] if documents else None
+
+    async def find_many(self, collection: str, query: dict, sort: list = None, limit: int = 0,
+                        projection: dict = None) -> list:
+        return self.store._find(collection, query, sort=sort, limit=limit, projection=projection)
+
+    async def bulk_write(self, collection: str, operations: list, ordered: bool = False):
+        self.store._bulk_write(collection, operations)
+
+    async def create_index(self, collection: str, keys: list, **kwargs) -> str:
+        # Only the leading field is indexed, which is enough for the equality lookups of the services
+        self.store.create_index(collection, keys[0][0])
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    async def full_text_search(self, collection: str, query: str, filter: dict = None,
+                               projection: dict = None) -> list:
+        return self.store._text_search(collection, query, filter, False, 0, projection)
+
+    async def text_search(self, collection: str, query: str, filter: dict = None, limit: int = 0, skip: int = 0,
+                          projection: dict = None, batch_size: int = None) -> list:
+        return self.store._text_search(collection, query, filter, True, limit, projection, skip)
+
+    async def get_messages(self, collection: str, query: dict, limit: int) -> list:
+        return self.store._find(collection, query, sort=[("created_at", -1)], limit=limit)
+
+
+class FakeMongo:
+    def __init__(self, store: InMemoryMongo):
+        """Blocking `Mongo` on an `InMemoryMongo`, used by ingestion."""
+        self.store = store
+
+    def close(self):
+        pass
+
+    def insert(self, collection: str, data: dict):
+        return SimpleNamespace(inserted_id=self.store._insert(collection, data))
+
+    def insert_many(self, collection: str, data: list[dict], ordered: bool = False):
+        return self.store._insert_many(collection, data, ordered)
+
+    def find_one(self, collection: str, query: dict) -> dict:
+        documents = self.store._find(collection, query, limit=1)
+        return documents[0] if documents else None
+
+    def find_many(self, collection: str, query: dict) -> list:
+        return self.store._find(collection, query)
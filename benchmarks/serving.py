@@ -0,0 +1,380 @@
+"""
+Offline end-to-end benchmark of the API and its services.
+
+Builds the real services on local stand-ins: Qdrant's in-memory local mode, an in-memory
+Mongo, and deterministic Cohere, Tavily and OpenAI fakes with configurable latency
+(see `benchmarks.fakes`). A synthetic bilingual catalog and transaction history is
+loaded at every size, then each endpoint is driven through the ASGI app with a fixed
+concurrency. Throughput and p50/p95/p99 are reported per endpoint and per service
+method, and optionally compared with a stored baseline.
+
+Usage:
+    python -m benchmarks.serving --sizes 1000 10000 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.serving --sizes 1000 10000 --baseline benchmarks/baseline.json
+    python -m benchmarks.serving --no-latency --requests 500   # local overhead only
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Optional
+
+# The settings are read on import; nothing below talks to these services
+for _key, _value in {"VECTOR_DB_PORT": "6333", "VECTOR_DB_URI": ":memory:", "MONGO_URI": "mongodb://offline",
+                     "COHERE_API_KEY": "offline", "MONGO_DB_NAME": "benchmark", "TAVILYAPI_KEY": "offline",
+                     "OPEN_AI_API": "offline"}.items():
+    os.environ.setdefault(_key, _value)
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from qdrant_client import models  # noqa: E402
+
+from app import dependencies  # noqa: E402
+from app.core.context import ContextBuilder  # noqa: E402
+from app.core.embedding_cache import EmbeddingCache  # noqa: E402
+from app.core.images import ImageStore  # noqa: E402
+from app.core.tokens import TokenCounter  # noqa: E402
+from app.database.qdrant import AsyncVectorDBClient, VectorDBClient  # noqa: E402
+from app.database.vector_store import LANGUAGES, VectorLayout, point_id_for  # noqa: E402
+from app.models.item import Item  # noqa: E402
+from app.routes import items, llm, similar, transactions  # noqa: E402
+from app.services.co_purchase_index import CoPurchaseIndex  # noqa: E402
+from app.services.conversation_service import ConversationService  # noqa: E402
+from app.services.ingest_service import IngestService  # noqa: E402
+from app.services.item_service import ItemService  # noqa: E402
+from app.services.llm_service import LLMService  # noqa: E402
+from app.services.prompt_registry import USER_FIELDS, PromptRegistry  # noqa: E402
+from app.services.similar import SimilarService  # noqa: E402
+from app.services.transaction_service import TransactionService  # noqa: E402
+from benchmarks.data import queries, synthetic_items, synthetic_transactions  # noqa: E402
+from benchmarks.fakes import (DIMENSIONS, FakeAsyncCohereClient, FakeAsyncMongo, FakeCohereClient,  # noqa: E402
+                              FakeLLM, FakeMongo, FakeWebSearch, HashingEmbedder, InMemoryMongo, Latency)
+
+PROMPT = {
+    "name": "default",
+    "version": 1,
+    "system": "You are a shopping assistant. Answer in {lang}.",
+    "user": "\n".join(f"{field}: {{{field}}}" for field in USER_FIELDS),
+}
+
+
+class Recorder:
+    def __init__(self):
+        """Latency samples in seconds, keyed by endpoint or method name."""
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    def add(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def instrument(self, obj, prefix: str, names: list[str]):
+        """Replace methods of `obj` with timed wrappers; async generators are left alone."""
+        for name in names:
+            method = getattr(obj, name)
+            if inspect.iscoroutinefunction(method):
+                setattr(obj, name, self._timed_async(f"{prefix}.{name}", method))
+            elif not inspect.isasyncgenfunction(method):
+                setattr(obj, name, self._timed(f"{prefix}.{name}", method))
+
+    def _timed_async(self, name: str, method: Callable):
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started)
+        return timed
+
+    def _timed(self, name: str, method: Callable):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started)
+        return timed
+
+
+def summarize(samples: list[float], wall: Optional[float] = None) -> dict:
+    latencies = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "throughput_rps": round(len(samples) / wall, 1) if wall else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+async def _iterate(records: list) -> AsyncIterator:
+    for record in records:
+        yield record
+
+
+class World:
+    def __init__(self, args, size: int):
+        """The services of one worker process, wired like `Container` but on local stand-ins."""
+        self.args = args
+        self.size = size
+        self.rng = np.random.default_rng(args.seed)
+        self.embedder = HashingEmbedder(DIMENSIONS)
+        self.store = InMemoryMongo()
+        self.mongo = FakeAsyncMongo(self.store)
+        self.vectordb = AsyncVectorDBClient(host=":memory:", port=6333)
+        self.layout = benchmark_layout(args)
+        self.cohere = FakeAsyncCohereClient(Latency.parse(args.embed_latency, seed=args.seed), self.embedder,
+                                            cache=EmbeddingCache(memory_size=10000))
+        self.web_search = FakeWebSearch(Latency.parse(args.web_latency, seed=args.seed),
+                                        ttl=args.web_cache_ttl)
+        self.llm = FakeLLM(Latency.parse(args.llm_latency, seed=args.seed))
+        self.images = ImageStore(directory=args.image_dir)
+        self.item_service = ItemService(mongo=self.mongo, cohere=self.cohere, vectordb=self.vectordb,
+                                        images=self.images, layout=self.layout)
+        self.co_purchase = CoPurchaseIndex(mongo=self.mongo)
+        self.transaction_service = TransactionService(mongo=self.mongo, co_purchase=self.co_purchase)
+        self.similar_service = SimilarService(mongo=self.mongo, cohere=self.cohere, vectordb=self.vectordb,
+                                              web_search_service=self.web_search, item_service=self.item_service,
+                                              co_purchase=self.co_purchase, layout=self.layout)
+        self.prompts = PromptRegistry(mongo=self.mongo, default_name=PROMPT["name"])
+        tokens = TokenCounter()
+        self.conversations = ConversationService(self.mongo, tokens=tokens)
+        self.llm_service = LLMService(llm=self.llm, search_service=self.similar_service,
+                                      web_search_service=self.web_search, item_service=self.item_service,
+                                      prompts=self.prompts, conversations=self.conversations,
+                                      context=ContextBuilder(tokens))
+        self.item_ids: list[ObjectId] = []
+        self.items: list[dict] = []
+
+    async def seed(self) -> dict:
+        """Load the catalog, its vectors, the transaction history and the prompt."""
+        self.items = synthetic_items(self.size, self.rng)
+        search = ItemService.search_fields([Item(**item) for item in self.items])
+        documents = [{"_id": ObjectId(), **item, **fields} for item, fields in zip(self.items, search)]
+        self.item_ids = [document["_id"] for document in documents]
+        await self.mongo.insert_many(collection="items", data=documents)
+        await self.mongo.insert(collection="prompts", data=dict(PROMPT))
+
+        vector_params = models.VectorParams(size=DIMENSIONS, distance=models.Distance.COSINE)
+        for collection_name in self.layout.collections():
+            await self.vectordb.client.create_collection(
+                collection_name=collection_name,
+                vectors_config={lang: vector_params for lang in LANGUAGES} if self.layout.named else vector_params)
+        for start in range(0, len(documents), 512):
+            batch = documents[start:start + 512]
+            vectors = {lang: [self.embedder.embed(document[f"search_{lang}"]) for document in batch]
+                       for lang in LANGUAGES}
+            for collection_name, point_vectors in self.layout.points(vectors):
+                await self.vectordb.client.upsert(collection_name=collection_name, points=[
+                    models.PointStruct(id=point_id_for(str(document["_id"])),
+                                       vector=vector,
+                                       payload={"id": str(document["_id"])})
+                    for document, vector in zip(batch, point_vectors)
+                ])
+
+        await self.co_purchase.ensure_indexes()
+        history = synthetic_transactions(self.item_ids, self.size * self.args.transactions_per_item, self.rng)
+        return await self.transaction_service.bulk_create(_iterate(history))
+
+    def instrument(self, recorder: Recorder):
+        recorder.instrument(self.similar_service, "SimilarService",
+                            ["search", "hybrid_search", "similarity_search", "mongo_full_text_search",
+                             "rerank_documents", "get_related_transaction", "web_search"])
+        recorder.instrument(self.item_service, "ItemService", ["get_item", "get_items", "to_items"])
+        recorder.instrument(self.llm_service, "LLMService", ["chat", "search_items"])
+        recorder.instrument(self.co_purchase, "CoPurchaseIndex", ["top_k"])
+        recorder.instrument(self.prompts, "PromptRegistry", ["get"])
+        recorder.instrument(self.cohere, "AsyncCohereClient", ["embed_texts"])
+        recorder.instrument(self.vectordb, "AsyncVectorDBClient", ["search_vector", "search_vector_scored",
+                                                                   "get_vectors"])
+        recorder.instrument(self.web_search, "WebSearch", ["search"])
+        recorder.instrument(self.llm, "LLM", ["generate_response"])
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+        for router in (items.router, transactions.router, similar.router, llm.router):
+            app.include_router(router, prefix="/api")
+        app.dependency_overrides.update({
+            dependencies.item_service: lambda: self.item_service,
+            dependencies.similar_service: lambda: self.similar_service,
+            dependencies.transaction_service: lambda: self.transaction_service,
+            dependencies.get_llm_service: lambda: self.llm_service,
+        })
+        return app
+
+    def scenarios(self) -> dict[str, Callable[[int], tuple[str, str, Optional[dict]]]]:
+        search_queries = queries(self.items, 256, self.rng)
+        # Requests favour popular items, like real traffic
+        popular = [str(item_id) for item_id in self.item_ids[:max(len(self.item_ids) // 20, 1)]]
+
+        def search(mode: str, profile: str = "full"):
+            return lambda i: ("POST", "/api/search", {"query": search_queries[i % len(search_queries)],
+                                                      "limit": 10, "score_threshold": 0.1, "mode": mode,
+                                                      "profile": profile})
+
+        return {
+            "POST /api/search": search("cascade"),
+            "POST /api/search (hybrid)": search("hybrid"),
+            "POST /api/search (listing)": search("cascade", "listing"),
+            "GET /api/items/{id}": lambda i: ("GET", f"/api/items/{popular[i % len(popular)]}", None),
+            "GET /api/related_transaction/{id}":
+                lambda i: ("GET", f"/api/related_transaction/{popular[i % len(popular)]}", None),
+            "GET /api/web_search/{id}": lambda i: ("GET", f"/api/web_search/{popular[i % len(popular)]}", None),
+            "POST /api/chat": lambda i: ("POST", "/api/chat", {"query": search_queries[i % len(search_queries)],
+                                                               "limit": 5, "search": True}),
+        }
+
+    async def close(self):
+        await self.vectordb.close()
+
+
+async def drive(client: httpx.AsyncClient, recorder: Recorder, name: str, request: Callable,
+                count: int, concurrency: int) -> float:
+    """Send `count` requests, at most `concurrency` at a time; return the wall time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int):
+        method, url, body = request(i)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            recorder.add(name, time.perf_counter() - started)
+        response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(count)))
+    return time.perf_counter() - started
+
+
+def benchmark_layout(args) -> VectorLayout:
+    return VectorLayout(collection="items") if args.vector_layout == "named" else VectorLayout()
+
+
+def run_ingestion(args, size: int) -> dict:
+    """Bulk-load a catalog through `IngestService` into a fresh in-memory store."""
+    vectordb = VectorDBClient(host=":memory:", port=6333)
+    layout = benchmark_layout(args)
+    for collection_name in layout.collections():
+        vectordb.create_collection(collection_name=collection_name, size=DIMENSIONS,
+                                   vector_names=LANGUAGES if layout.named else ())
+    cohere = FakeCohereClient(Latency.parse(args.embed_latency, seed=args.seed), HashingEmbedder(DIMENSIONS))
+    service = IngestService(mongo=FakeMongo(InMemoryMongo()), cohere=cohere, vectordb=vectordb, layout=layout)
+    records = synthetic_items(size, np.random.default_rng(args.seed + 1))
+    report = service.ingest(iter(records))
+    vectordb.close()
+    return report
+
+
+async def run_size(args, size: int) -> list[dict]:
+    world = World(args, size)
+    recorder = Recorder()
+    seed_report = await world.seed()
+    world.instrument(recorder)
+    walls = {}
+    transport = httpx.ASGITransport(app=world.app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for name, request in world.scenarios().items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            count = args.chat_requests if "chat" in name else args.requests
+            walls[name] = await drive(client, recorder, name, request, count, args.concurrency)
+    await world.close()
+
+    rows = []
+    for name, samples in recorder.samples.items():
+        kind = "endpoint" if name.split(" ")[0] in ("GET", "POST") else "method"
+        wall = walls.get(name)
+        rows.append({"size": size, "kind": kind, "name": name, **summarize(samples, wall)})
+    rows.append({"size": size, "kind": "ingest", "name": "transactions bulk (seed)", "count": seed_report["accepted"],
+                 "throughput_rps": seed_report["transactions_per_sec"], "p50_ms": None, "p95_ms": None,
+                 "p99_ms": None})
+    if not args.skip_ingest:
+        report = await asyncio.to_thread(run_ingestion, args, size)
+        rows.append({"size": size, "kind": "ingest", "name": "IngestService.ingest", "count": report["accepted"],
+                     "throughput_rps": report["items_per_sec"], "p50_ms": None, "p95_ms": None, "p99_ms": None})
+    return rows
+
+
+def compare(rows: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    """Mark rows whose p95 grew, or whose throughput dropped, by more than `tolerance`."""
+    previous = {(row["size"], row["name"]): row for row in baseline}
+    for row in rows:
+        before = previous.get((row["size"], row["name"]))
+        if before is None:
+            continue
+        row["baseline_p95_ms"] = before.get("p95_ms")
+        row["baseline_throughput_rps"] = before.get("throughput_rps")
+        slower = row["p95_ms"] is not None and before.get("p95_ms") and \
+            row["p95_ms"] > before["p95_ms"] * (1 + tolerance)
+        # Method throughput depends on the request mix, so only endpoints and ingestion are compared
+        fewer = row["kind"] != "method" and row["throughput_rps"] and before.get("throughput_rps") and \
+            row["throughput_rps"] < before["throughput_rps"] * (1 - tolerance)
+        row["regression"] = bool(slower or fewer)
+    return rows
+
+
+def _format(value, width: int, digits: int = 1) -> str:
+    return f"{'-' if value is None else f'{value:.{digits}f}':>{width}}"
+
+
+def print_table(rows: list[dict]):
+    print(f"{'size':>7} {'kind':<8} {'name':<46} {'count':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'base p95':>9}")
+    order = {"endpoint": 0, "ingest": 1, "method": 2}
+    for row in sorted(rows, key=lambda row: (row["size"], order[row["kind"]], row["name"])):
+        flag = "  REGRESSION" if row.get("regression") else ""
+        print(f"{row['size']:>7} {row['kind']:<8} {row['name'][:46]:<46} {row['count']:>6} "
+              f"{_format(row['throughput_rps'], 9)} {_format(row['p50_ms'], 9, 2)} {_format(row['p95_ms'], 9, 2)} "
+              f"{_format(row['p99_ms'], 9, 2)} {_format(row.get('baseline_p95_ms'), 9, 2)}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the API endpoints and services.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Catalog sizes.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint.")
+    parser.add_argument("--chat-requests", type=int, default=50, help="Requests to /chat.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--transactions-per-item", type=int, default=2)
+    parser.add_argument("--embed-latency", default="30:120", help="Embedding latency, MEDIAN[:P99] in ms.")
+    parser.add_argument("--web-latency", default="800:2500", help="Web search latency, MEDIAN[:P99] in ms.")
+    parser.add_argument("--llm-latency", default="1200:3000", help="LLM completion latency, MEDIAN[:P99] in ms.")
+    parser.add_argument("--no-latency", action="store_true", help="Measure local overhead only.")
+    parser.add_argument("--web-cache-ttl", type=float, default=86400.0, help="0 disables the web search cache.")
+    parser.add_argument("--image-dir", default="static")
+    parser.add_argument("--only", nargs="+", default=None, help="Only run endpoints whose name contains these.")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--vector-layout", choices=["split", "named"], default="split",
+                        help="Per-language collections or one collection of named vectors.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=None, help="Compare with the results stored in this file.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    parser.add_argument("--save-baseline", default=None, help="Store the results in this file.")
+    args = parser.parse_args()
+    if args.no_latency:
+        args.embed_latency = args.web_latency = args.llm_latency = "0"
+
+    rows = []
+    for size in args.sizes:
+        rows.extend(asyncio.run(run_size(args, size)))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(rows, json.load(f)["results"], args.tolerance)
+    print_table(rows)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+    if any(row.get("regression") for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
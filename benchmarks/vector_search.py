@@ -0,0 +1,124 @@
+"""
+Recall/latency benchmark for the vector search settings.
+
+Generates a clustered synthetic catalog, loads it into one collection per index
+configuration and compares every ANN configuration against exact search.
+
+Qdrant's local mode (the default, ":memory:") always scans exhaustively and ignores
+HNSW and quantization settings, so it only measures the client/search path. Point
+--url at a real Qdrant (e.g. `docker run -p 6333:6333 qdrant/qdrant`) to measure ANN
+recall and latency.
+
+Usage:
+    python -m benchmarks.vector_search --sizes 10000 100000 --ef 32 64 128 256
+    python -m benchmarks.vector_search --url http://localhost:6333 --quantization int8 --json results.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from qdrant_client import models
+
+from app.database.qdrant import VectorDBClient, VectorIndexSettings
+
+DIMENSIONS = 384
+
+
+def synthetic_vectors(count: int, dimensions: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around random centroids, which is closer to real embeddings than pure noise."""
+    centroids = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    vectors = centroids[rng.integers(0, clusters, count)] + 0.35 * rng.standard_normal((count, dimensions),
+                                                                                           dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load(vectordb: VectorDBClient, collection_name: str, vectors: np.ndarray, batch_size: int = 1000):
+    if vectordb.client.collection_exists(collection_name):
+        vectordb.client.delete_collection(collection_name)
+    vectordb.create_collection(collection_name=collection_name, size=vectors.shape[1])
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        vectordb.insert_vectors(vectors=batch.tolist(),
+                                payloads=[{"id": str(start + i)} for i in range(len(batch))],
+                                collection_name=collection_name,
+                                point_ids=list(range(start, start + len(batch))))
+
+
+def run_queries(vectordb: VectorDBClient, collection_name: str, queries: np.ndarray, k: int):
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        ids = vectordb.search_vector(query_vector=query.tolist(), collection_name=collection_name,
+                                     score_threshold=None, top_k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(ids)
+    return results, np.array(latencies)
+
+
+def recall(truth: list[list[str]], found: list[list[str]]) -> float:
+    hits = sum(len(set(expected) & set(actual)) for expected, actual in zip(truth, found))
+    total = sum(len(expected) for expected in truth)
+    return hits / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exact vs HNSW vector search.")
+    parser.add_argument("--url", default=":memory:", help="Qdrant URL, or :memory: for local mode.")
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construct", type=int, default=100)
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--quantization", choices=["int8"], default=None)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default=None, help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for size in args.sizes:
+        vectors = synthetic_vectors(size, DIMENSIONS, clusters=max(size // 500, 8), rng=rng)
+        queries = synthetic_vectors(args.queries, DIMENSIONS, clusters=8, rng=rng)
+        settings = VectorIndexSettings(exact=True, hnsw_m=args.m, hnsw_ef_construct=args.ef_construct,
+                                       quantization=args.quantization)
+        vectordb = VectorDBClient(host=args.url, port=args.port, timeout=60, index_settings=settings)
+        collection_name = f"bench_{size}"
+        started = time.perf_counter()
+        load(vectordb, collection_name, vectors)
+        if args.url != ":memory:":
+            # Wait for the HNSW graph to be built before measuring
+            while vectordb.client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+                time.sleep(0.5)
+        load_seconds = time.perf_counter() - started
+
+        truth, exact_latencies = run_queries(vectordb, collection_name, queries, args.k)
+        rows.append({"size": size, "mode": "exact", "ef": None, "recall": 1.0,
+                     "p50_ms": float(np.percentile(exact_latencies, 50)),
+                     "p99_ms": float(np.percentile(exact_latencies, 99)),
+                     "load_s": load_seconds})
+        for ef in args.ef:
+            vectordb.index_settings = settings.model_copy(update={"exact": False, "hnsw_ef": ef})
+            found, latencies = run_queries(vectordb, collection_name, queries, args.k)
+            rows.append({"size": size, "mode": "hnsw" + ("+int8" if args.quantization else ""), "ef": ef,
+                         "recall": recall(truth, found),
+                         "p50_ms": float(np.percentile(latencies, 50)),
+                         "p99_ms": float(np.percentile(latencies, 99)),
+                         "load_s": load_seconds})
+        vectordb.client.delete_collection(collection_name)
+        vectordb.close()
+
+    print(f"{'size':>9} {'mode':>10} {'ef':>5} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(f"{row['size']:>9} {row['mode']:>10} {row['ef'] or '-':>5} {row['recall']:>10.3f} "
+              f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()